@@ -0,0 +1,242 @@
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from scipy import ndimage
+
+import M1_TomoHandling as M1TH
+import M2_Alignment as M2A
+import M5_StructureTensor as M5ST
+import M7_OrientTables as M7OT
+import M8_AbqReports as M8AR
+import M10_SyntheticFibers as M10SF
+import M11_Instrumentation as M11IN
+import M12_OrientStore as M12OS
+import M13_InpMesh as M13IM
+
+# Benchmark of the orientation analysis (S1), the mapping (S3), the
+# orientation table writers and the Abaqus table parser on synthetic fiber
+# volumes with known fiber directions. The throughput, peak memory and angle
+# errors of each volume size are appended to RESULT_FILE and compared with
+# the previous run of the same settings. The script exits with status 1 if
+# any regression is found.
+
+# %% Settings
+# Edge lengths of the cubic synthetic volumes [voxels]
+SIZES = [64, 128, 192]
+VOXEL_SIZE = 2.5  # [micro meters]
+FIBER_DIAMETER = 7  # [micro meters]
+# Prescribed misalignment field, see M10_SyntheticFibers.fiber_field
+TILT = (1.0, 0.5)
+AMPLITUDE = 2.0
+# Settings of the structure tensor analysis, see S1_STanalysis.py
+TILE_SIZE = 256
+WORKERS = 1
+PRECISION = 'float64'
+truncate = 4
+# Settings of the orientation store, see S1_STanalysis.py
+STORE_CHUNKS = (64, 64, 64)
+STORE_TOLERANCE = None
+# Number of integration points mapped and written
+N_IP = 100000
+# Relative drop in throughput, relative increase in peak memory of the
+# structure tensor analysis and increase in mean angle error [degrees], which
+# are reported as regressions
+THROUGHPUT_TOLERANCE = 0.2
+MEMORY_TOLERANCE = 0.2
+ERROR_TOLERANCE = 0.01
+
+result_path = '../results/benchmarks/'
+RESULT_FILE = result_path + 'benchmark.jsonl'
+sample_coor_axis = [1, 2, 0]
+
+rho = round(FIBER_DIAMETER / VOXEL_SIZE, 2)
+sigma = rho / 2
+
+
+def timed(step, metrics, func, *args, **kwargs):
+    # Run a step and record its wall time and peak memory, including the
+    # peaks of worker processes
+    M11IN.reset_peak_rss()
+    children = M11IN.ChildrenPeakRss()
+    children.start()
+    t0 = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        children.stop()
+    metrics[step + '_time'] = time.perf_counter() - t0
+    metrics[step + '_children_peak_rss'] = children.peak
+    metrics[step + '_peak_rss'] = M11IN.peak_rss() + children.peak
+    return result
+
+
+def angle_errors(vec, vec_true):
+    # Angles between estimated and true fiber directions [degrees]
+    cross = np.linalg.norm(np.cross(vec, vec_true, axis=0), axis=0)
+    dot = np.abs(np.sum(vec * vec_true, axis=0, dtype=np.float64))
+    return np.degrees(np.arctan2(cross, dot))
+
+
+def benchmark(size, work_dir):
+    """ Benchmark the analysis of a synthetic volume.
+
+    Parameters
+    ----------
+    size : Edge length of the cubic volume [int]\n
+    work_dir : Directory for temporary files [str]
+
+    Returns
+    -------
+    metrics : Timings, peak memory, throughput and angle errors [dict]
+
+    """
+    metrics = {}
+    shape = (size, size, size)
+    volume, vec_true = M10SF.fiber_volume(shape, tilt=TILT,
+                                          amplitude=AMPLITUDE)
+    file_path = os.path.join(work_dir, 'fibers.nii')
+    M10SF.save_nifti(file_path, volume, VOXEL_SIZE, sample_coor_axis)
+    del volume
+
+    # %% Orientation analysis as in S1_STanalysis.py
+    nii_file, data = timed('load', metrics, M1TH.tomo_load, file_path,
+                           sample_coor_axis)
+    vec, theta, phi = timed('structure_tensor', metrics,
+                            M5ST.st_orientation, data, sigma, rho,
+                            truncate=truncate, tile_size=TILE_SIZE,
+                            dtype=PRECISION, workers=WORKERS)
+    metrics['voxels'] = int(np.prod(shape))
+    metrics['voxels_per_s'] = (metrics['voxels']
+                               / metrics['structure_tensor_time'])
+
+    kernel_radius, halo = M5ST.st_kernel_radius(sigma, rho, truncate)
+    inner = (slice(None),) + (slice(kernel_radius, -kernel_radius),) * 3
+    errors = angle_errors(vec, vec_true[inner])
+    metrics['angle_error_mean'] = float(errors.mean())
+    metrics['angle_error_rms'] = float(np.sqrt(np.mean(errors**2)))
+    metrics['angle_error_p95'] = float(np.percentile(errors, 95))
+    metrics['angle_error_max'] = float(errors.max())
+    _, phi_true = M2A.st_misalign(vec_true[inner])
+    metrics['phi_error_mean'] = float(np.abs(phi - phi_true).mean())
+    del errors, phi_true, vec_true
+
+    def align():
+        stats = M2A.orient_stats(phi, vec=vec)
+        R = M2A.orient_rotation(stats.vec_avg)
+        return M2A.orient_angles(vec, R, theta=theta, phi=phi)
+    vec, theta_new, phi_new = timed('alignment', metrics, align)
+
+    # %% Mapping as in S3_mapping.py
+    rng = np.random.default_rng(0)
+    ip_coords = rng.random((N_IP, 3)) * np.array(phi_new.shape) - 0.5
+    ip_ids = np.tile(np.arange(1, 28), -(-N_IP // 27))[:N_IP]
+    ele_ids = np.arange(N_IP) // 27 + 1
+
+    store_file = os.path.join(work_dir, 'fibers_MAP_VAR.ost')
+    timed('write_store', metrics, M12OS.write_store, store_file,
+          {'phi': phi_new, 'theta': theta_new}, chunks=STORE_CHUNKS,
+          tolerance=STORE_TOLERANCE)
+    metrics['store_ratio'] = (os.path.getsize(store_file)
+                              / (phi_new.nbytes + theta_new.nbytes))
+    store = M12OS.OrientStore(store_file)
+    ip_phi, ip_theta = timed('mapping', metrics, store.sample,
+                             ['phi', 'theta'], ip_coords)
+    metrics['store_exact'] = bool(np.array_equal(
+        ip_phi, ndimage.map_coordinates(phi_new, ip_coords.T, order=0,
+                                        cval=np.nan), equal_nan=True))
+    ip_tables = {'PHI': np.radians(ip_phi), 'THETA': np.radians(ip_theta)}
+
+    # %% Orientation tables and Abaqus table parser
+    prefix = os.path.join(work_dir, 'fibers')
+    timed('write_binary', metrics, M7OT.write_binary_table,
+          prefix + '_ORIENT.bin', ele_ids, ip_ids, ip_tables)
+    timed('write_fortran', metrics, M7OT.write_fortran_tables, prefix,
+          ele_ids, ip_ids, ip_tables)
+    _, _, tables = M7OT.read_binary_table(prefix + '_ORIENT.bin')
+    metrics['binary_table_exact'] = bool(
+        np.array_equal(tables['PHI'], ip_tables['PHI'], equal_nan=True))
+
+    M13IM.write_ip_table(prefix + '_IP2.dat', ele_ids, ip_ids, ip_coords)
+    table = timed('parse', metrics, M8AR.abq_table, prefix + '_IP2.dat',
+                  *M8AR.DAT_IP_TABLE)
+    metrics['parse_rows'] = len(table)
+    return metrics
+
+
+def git_commit():
+    # Commit of the code, if available
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# %% Run the benchmarks
+settings = dict(VOXEL_SIZE=VOXEL_SIZE, FIBER_DIAMETER=FIBER_DIAMETER,
+                TILT=TILT, AMPLITUDE=AMPLITUDE, TILE_SIZE=TILE_SIZE,
+                WORKERS=WORKERS, PRECISION=PRECISION, TRUNCATE=truncate,
+                STORE_CHUNKS=STORE_CHUNKS, STORE_TOLERANCE=STORE_TOLERANCE,
+                N_IP=N_IP)
+previous = []
+if os.path.isfile(RESULT_FILE):
+    with open(RESULT_FILE) as f:
+        previous = [json.loads(line) for line in f if line.strip()]
+os.makedirs(result_path, exist_ok=True)
+
+regressions = []
+for size in SIZES:
+    with tempfile.TemporaryDirectory() as work_dir:
+        metrics = benchmark(size, work_dir)
+    record = dict(date=datetime.datetime.now().isoformat(timespec='seconds'),
+                  commit=git_commit(), machine=platform.node(),
+                  size=size, settings=settings, metrics=metrics)
+
+    print('<> Size %d^3: %.3g voxels/s, peak RSS %.0f MB, mean angle error '
+          '%.3f° (95%%: %.3f°)'
+          % (size, metrics['voxels_per_s'],
+             metrics['structure_tensor_peak_rss'] / 2**20,
+             metrics['angle_error_mean'], metrics['angle_error_p95']))
+
+    # Compare with the previous run on the same machine and settings
+    same = [r for r in previous if r['size'] == size
+            and r['settings'] == json.loads(json.dumps(settings))
+            and r['machine'] == record['machine']]
+    if same:
+        prev = same[-1]['metrics']
+        ratio = metrics['voxels_per_s'] / prev['voxels_per_s']
+        print('   Throughput %.2fx and mean angle error %+.4f° relative '
+              'to %s' % (ratio, metrics['angle_error_mean']
+                         - prev['angle_error_mean'], same[-1]['commit']))
+        messages = []
+        if ratio < 1 - THROUGHPUT_TOLERANCE:
+            messages.append('throughput dropped by %.0f%%'
+                            % (100 * (1 - ratio)))
+        # Runs before the peaks of the workers were recorded are skipped
+        rss_ratio = (metrics['structure_tensor_peak_rss']
+                     / prev['structure_tensor_peak_rss'])
+        if ('structure_tensor_children_peak_rss' in prev
+                and rss_ratio > 1 + MEMORY_TOLERANCE):
+            messages.append('peak memory increased by %.0f%%'
+                            % (100 * (rss_ratio - 1)))
+        if (metrics['angle_error_mean']
+                > prev['angle_error_mean'] + ERROR_TOLERANCE):
+            messages.append('mean angle error increased')
+        for message in messages:
+            print('   REGRESSION: ' + message)
+        regressions += ['%d^3: %s' % (size, m) for m in messages]
+
+    with open(RESULT_FILE, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+if regressions:
+    print('<> %d regressions: %s' % (len(regressions), '; '.join(regressions)))
+    sys.exit(1)
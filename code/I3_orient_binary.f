@@ -0,0 +1,89 @@
+**********************************************************************************************
+**                       USER SUBROUTINES UEXTERNALDB AND ORIENT                            **
+**          Orientations are read once from the binary table written by S3_mapping.py       **
+**********************************************************************************************
+
+      MODULE ORIENT_TABLE
+C
+C     Orientation table shared by UEXTERNALDB and ORIENT
+      INTEGER*4 NELE, NVAL
+      INTEGER*4, ALLOCATABLE :: LABEL(:), IPMIN(:), IOFF(:)
+      REAL*8, ALLOCATABLE :: PHI0(:), THETA0(:)
+C
+      END MODULE ORIENT_TABLE
+
+
+      SUBROUTINE UEXTERNALDB(LOP,LRESTART,TIME,DTIME,KSTEP,KINC)
+C
+      USE ORIENT_TABLE
+      INCLUDE 'ABA_PARAM.INC'
+C
+      DIMENSION TIME(2)
+      CHARACTER*256 OUTDIR, FILENAME
+      INTEGER*4 NHEAD(3)
+C
+C     Read the table at the start of the analysis
+      IF (LOP.EQ.0 .AND. .NOT.ALLOCATED(LABEL)) THEN
+        FILENAME = 'InputOrientBinary.bin'
+        CALL GETOUTDIR(OUTDIR, LENOUTDIR)
+        OPEN(UNIT=107, FILE=OUTDIR(1:LENOUTDIR)//'/'//TRIM(FILENAME),
+     1       ACCESS='STREAM', FORM='UNFORMATTED', STATUS='OLD')
+C       Header: number of elements, values and tables
+        READ(107) NHEAD
+        NELE = NHEAD(1)
+        NVAL = NHEAD(2)
+        ALLOCATE(LABEL(NELE), IPMIN(NELE), IOFF(NELE+1))
+        ALLOCATE(PHI0(NVAL), THETA0(NVAL))
+        READ(107) LABEL, IPMIN, IOFF, PHI0, THETA0
+        CLOSE(107)
+      END IF
+C
+      RETURN
+      END
+
+
+      SUBROUTINE ORIENT(T,NOEL,NPT,LAYER,KSPT,COORDS,BASIS,
+     1 ORNAME,NNODES,CNODES,JNNUM)
+C
+      USE ORIENT_TABLE
+      INCLUDE 'ABA_PARAM.INC'
+C
+      CHARACTER*80 ORNAME
+C
+      DIMENSION T(3,3),COORDS(3),BASIS(3,3),CNODES(3,NNODES)
+      DIMENSION JNNUM(NNODES)
+
+C     Binary search for the element label. Integration points without
+C     an orientation in the table keep the global axes.
+      PHI = 0.
+      THETA = 0.
+      ILO = 1
+      IHI = NELE
+      DO WHILE (ILO.LE.IHI)
+        IMID = (ILO+IHI)/2
+        IF (LABEL(IMID).LT.NOEL) THEN
+          ILO = IMID+1
+        ELSE IF (LABEL(IMID).GT.NOEL) THEN
+          IHI = IMID-1
+        ELSE
+          J = IOFF(IMID) + NPT - IPMIN(IMID) + 1
+          IF (NPT.GE.IPMIN(IMID) .AND. J.LE.IOFF(IMID+1)) THEN
+            PHI = PHI0(J)
+            THETA = THETA0(J)
+          END IF
+          EXIT
+        END IF
+      END DO
+
+      T(1,1) =  DCOS(PHI)
+      T(1,2) = -DSIN(PHI)
+      T(1,3) =  0.
+      T(2,1) =  DCOS(THETA)*DSIN(PHI)
+      T(2,2) =  DCOS(THETA)*DCOS(PHI)
+      T(2,3) = -DSIN(THETA)
+      T(3,1) =  DSIN(THETA)*DSIN(PHI)
+      T(3,2) =  DSIN(THETA)*DCOS(PHI)
+      T(3,3) =  DCOS(THETA)
+
+      RETURN
+      END
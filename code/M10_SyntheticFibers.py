@@ -0,0 +1,112 @@
+import nibabel as nib
+import numpy as np
+
+
+def fiber_field(x, z, shape, tilt=(1.0, 0.5), amplitude=2.0,
+                wavelength=None):
+    """ Prescribed fiber paths of a synthetic volume. A fiber entering the
+    volume at (0, y0, z0) passes through (x, y0 + dy, z0 + dz), where the
+    displacements consist of a global tilt and a waviness along the fibers,
+    which varies across the width of the volume.
+
+    Parameters
+    ----------
+    x : Positions along the fiber direction [Array of floats - voxels]\n
+    z : Positions across the width [Array of floats - voxels]\n
+    shape : Shape of the volume in the material coordinate system
+    [tuple of int]\n
+    tilt : Global misalignment in the xy-plane and the xz-plane
+    [tuple of floats - degrees]. Default is (1.0, 0.5)\n
+    amplitude : Amplitude of the waviness [float - voxels]. Default is 2.0\n
+    wavelength : Wavelength of the waviness [float - voxels].
+    Default is None, where the length of the volume is used.
+
+    Returns
+    -------
+    dy : Displacement in the y-direction [Array of floats - voxels]\n
+    dz : Displacement in the z-direction [Array of floats - voxels]\n
+    vec : Fiber direction vectors ordered as [x, y, z] [3 x Array of floats]
+
+    """
+    wavelength = shape[0] if wavelength is None else wavelength
+    ty, tz = np.tan(np.radians(tilt))
+    k, kw = 2 * np.pi / wavelength, 2 * np.pi / shape[2]
+    sx, cx = np.sin(k * x), np.cos(k * x)
+
+    dz = tz * x + amplitude / 2 * sx
+    dz_x = tz + amplitude / 2 * k * cx
+    # The waviness in the y-direction depends on the z-position of the fiber
+    dy = ty * x + amplitude * sx * np.cos(kw * z)
+    dy_x = ty + amplitude * k * cx * np.cos(kw * z)
+    dy_z = -amplitude * kw * sx * np.sin(kw * z)
+
+    # Tangent of the fiber path z = z0 + dz(x), y = y0 + dy(x, z)
+    vec = np.stack(np.broadcast_arrays(np.ones_like(dy_x), dy_x + dy_z * dz_x,
+                                       dz_x))
+    vec = vec / np.linalg.norm(vec, axis=0)
+    return dy, dz, vec
+
+
+def fiber_volume(shape, radius=2.2, spacing=7, tilt=(1.0, 0.5),
+                 amplitude=2.0, wavelength=None, contrast=150, noise=25,
+                 seed=0):
+    """ Generate a synthetic tomogram of unidirectional fibers following the
+    prescribed fiber paths of fiber_field, and the true fiber directions.
+
+    Parameters
+    ----------
+    shape : Shape of the volume in the material coordinate system, with the
+    fibers along the first axis [tuple of int]\n
+    radius : Fiber radius [float - voxels]. Default is 2.2\n
+    spacing : Distance between fiber centres on a square grid
+    [float - voxels]. Default is 7\n
+    tilt, amplitude, wavelength : See fiber_field\n
+    contrast : Gray value difference between fibers and matrix [float].
+    Default is 150\n
+    noise : Standard deviation of Gaussian noise [float]. Default is 25\n
+    seed : Seed of the noise [int]. Default is 0
+
+    Returns
+    -------
+    volume : Synthetic tomogram [Array of uint8]\n
+    vec : True fiber direction vectors ordered as [x, y, z]
+    [3 x Array of float32]
+
+    """
+    rng = np.random.default_rng(seed)
+    volume = np.empty(shape, dtype=np.uint8)
+    vec = np.empty((3,) + tuple(shape), dtype=np.float32)
+    y, z = np.meshgrid(np.arange(shape[1]), np.arange(shape[2]),
+                       indexing='ij')
+    for x in range(shape[0]):
+        dy, dz, vec[:, x] = fiber_field(np.float64(x), z, shape, tilt,
+                                        amplitude, wavelength)
+        # Distance to the centre of the nearest fiber in the cross-section
+        yy = (y - dy) % spacing - spacing / 2
+        zz = (z - dz) % spacing - spacing / 2
+        fibers = (yy**2 + zz**2 < radius**2) * contrast
+        volume[x] = (fibers + rng.normal(50, noise, fibers.shape)
+                     ).clip(0, 255)
+    return volume, vec
+
+
+def save_nifti(file_path, volume, voxel_size, sample_coor_axis=[0, 1, 2]):
+    """ Save a volume in the material coordinate system as a NIfTI file in
+    the tomogram coordinate system read by M1_TomoHandling.tomo_load.
+
+    Parameters
+    ----------
+    file_path : Path to the NIfTI file [str]\n
+    volume : Volume in the material coordinate system [Array]\n
+    voxel_size : Voxel size [float - micro meters]\n
+    sample_coor_axis : Material axes of the tomogram axes [list of int].
+    Default is [0, 1, 2]
+
+    Returns
+    -------
+    None.
+
+    """
+    affine = np.diag([voxel_size, voxel_size, voxel_size, 1.])
+    tomo = np.moveaxis(volume, sample_coor_axis, [0, 1, 2])
+    nib.save(nib.Nifti1Image(tomo, affine), file_path)
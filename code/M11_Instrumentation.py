@@ -0,0 +1,344 @@
+import atexit
+import collections
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+# Steps of the running script. Steps with the same name and parent step are
+# merged, such that steps inside loops are summed.
+_state = {'steps': [], 'stack': [], 'report_file': None, 'meta': {},
+          'start': None, 'profiles': {}}
+
+
+def reset_peak_rss():
+    """ Reset the peak resident set size of the process. Only supported on
+    Linux, elsewhere the peak of the process is kept.
+
+    Returns
+    -------
+    None.
+
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """ Peak resident set size of the process since the last reset.
+
+    Returns
+    -------
+    nbytes : Peak resident set size in bytes [int]
+
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _child_peaks():
+    # Peak resident set size in bytes of each running child process by
+    # process id, read from /proc
+    pid = str(os.getpid())
+    peaks = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % name) as f:
+                # The parent id follows the state after the command name,
+                # which is in parentheses and may contain spaces
+                if f.read().rsplit(')', 1)[1].split()[1] != pid:
+                    continue
+            with open('/proc/%s/status' % name) as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peaks[int(name)] = int(line.split()[1]) * 1024
+        except (OSError, IndexError):
+            # The child exited meanwhile
+            continue
+    return peaks
+
+
+class ChildrenPeakRss:
+    """ Peak resident set size of the child processes, e.g. the workers of a
+    process pool, which is not included in peak_rss. The peak of each running
+    child is read at a fixed interval by a background thread, and the peaks
+    of all children seen are summed, as the children may run at the same
+    time. Pages shared with the parent after a fork are counted in each
+    child, so the sum is an upper bound. Without /proc, the largest peak of
+    the finished children of the process is used.
+
+    Parameters
+    ----------
+    interval : Time between samples [float - seconds]. Default is 0.01
+
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while True:
+            for pid, peak in _child_peaks().items():
+                self.peaks[pid] = max(self.peaks.get(pid, 0), peak)
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        if os.path.isdir('/proc'):
+            self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler.is_alive():
+            self._sampler.join()
+        else:
+            self.peaks = {0: resource.getrusage(
+                resource.RUSAGE_CHILDREN).ru_maxrss * 1024}
+
+    @property
+    def peak(self):
+        """ Sum of the peaks of the child processes in bytes [int] """
+        return sum(self.peaks.values())
+
+
+def _cpu_time():
+    # CPU time of the process and its finished child processes
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _update_peaks():
+    # Pass the current peak to all running steps
+    rss = peak_rss()
+    for record in _state['stack']:
+        record['peak_rss'] = max(record['peak_rss'], rss)
+
+
+@contextlib.contextmanager
+def step(name, **arrays):
+    """ Record the wall time, CPU time and peak memory of a step of the
+    analysis. Steps can be nested, and repeated steps with the same name and
+    parent are summed. If the environment variable XRCT_PROFILE equals the
+    name of the step, the step is profiled by a sampling profiler, where the
+    samples of repeated steps are summed.
+
+    Parameters
+    ----------
+    name : Name of the step, e.g. 'load' [str]\n
+    arrays : Arrays used by the step, whose shapes and sizes are recorded
+    [Arrays]
+
+    Returns
+    -------
+    Context manager recording the step.
+
+    """
+    if _state['start'] is None:
+        _state['start'] = (time.perf_counter(), _cpu_time())
+    parent = _state['stack'][-1] if _state['stack'] else None
+    siblings = parent['steps'] if parent else _state['steps']
+    record = next((r for r in siblings if r['name'] == name), None)
+    if record is None:
+        record = {'name': name, 'calls': 0, 'wall_time': 0., 'cpu_time': 0.,
+                  'peak_rss': 0, 'arrays': {}, 'steps': []}
+        siblings.append(record)
+    record['calls'] += 1
+
+    _update_peaks()
+    reset_peak_rss()
+    _state['stack'].append(record)
+    log_arrays(**arrays)
+    profiler = None
+    if os.environ.get('XRCT_PROFILE') == name:
+        profiler = SamplingProfiler(name, _state['profiles'].setdefault(
+            name, collections.Counter()))
+    if profiler:
+        profiler.start()
+    t0, c0 = time.perf_counter(), _cpu_time()
+    try:
+        yield record
+    finally:
+        record['wall_time'] += time.perf_counter() - t0
+        record['cpu_time'] += _cpu_time() - c0
+        if profiler:
+            profiler.stop()
+            record['profile'] = profiler.save(_report_dir())
+        _update_peaks()
+        _state['stack'].pop()
+
+
+def log_arrays(**arrays):
+    """ Record the shapes and sizes of arrays in the innermost running step.
+
+    Parameters
+    ----------
+    arrays : Arrays by name [Arrays]
+
+    Returns
+    -------
+    None.
+
+    """
+    if not _state['stack']:
+        return
+    for name, array in arrays.items():
+        _state['stack'][-1]['arrays'][name] = {
+            'shape': list(getattr(array, 'shape', ())),
+            'dtype': str(getattr(array, 'dtype', type(array).__name__)),
+            'nbytes': int(getattr(array, 'nbytes', 0))}
+
+
+def start_report(file_path, **meta):
+    """ Write a JSON report of all recorded steps when the script exits,
+    including exits through sys.exit and errors.
+
+    Parameters
+    ----------
+    file_path : Path of the JSON report [str]\n
+    meta : Information added to the report, e.g. the sample name and the
+    settings of the script [JSON serialisable values]
+
+    Returns
+    -------
+    None.
+
+    """
+    if _state['report_file'] is None:
+        atexit.register(write_report)
+    _state['report_file'] = file_path
+    _state['meta'].update(meta)
+    if _state['start'] is None:
+        _state['start'] = (time.perf_counter(), _cpu_time())
+
+
+def report_meta(**meta):
+    """ Add information to the report, e.g. the settings of the script.
+
+    Parameters
+    ----------
+    meta : Information by name [JSON serialisable values]
+
+    Returns
+    -------
+    None.
+
+    """
+    _state['meta'].update(meta)
+
+
+def write_report(file_path=None):
+    """ Write the recorded steps to a JSON report.
+
+    Parameters
+    ----------
+    file_path : Path of the JSON report [str]. Default is None, where the
+    path given to start_report is used.
+
+    Returns
+    -------
+    None.
+
+    """
+    file_path = file_path or _state['report_file']
+    if file_path is None:
+        return
+    wall0, cpu0 = _state['start'] or (time.perf_counter(), _cpu_time())
+    report = dict(_state['meta'],
+                  script=os.path.basename(sys.argv[0]),
+                  wall_time=time.perf_counter() - wall0,
+                  cpu_time=_cpu_time() - cpu0,
+                  max_rss=resource.getrusage(
+                      resource.RUSAGE_SELF).ru_maxrss * 1024,
+                  steps=_state['steps'])
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    with open(file_path, 'w') as f:
+        json.dump(report, f, indent=1, default=str)
+
+
+def _report_dir():
+    if _state['report_file'] is None:
+        return '.'
+    return os.path.dirname(_state['report_file']) or '.'
+
+
+class SamplingProfiler:
+    """ Sampling profiler of the main thread. The call stack is sampled at
+    a fixed interval by a background thread, and the number of samples of
+    each stack is saved in the collapsed format read by flame graph tools.
+    Work in worker processes is not sampled.
+
+    Parameters
+    ----------
+    name : Name of the profiled step [str]\n
+    counts : Number of samples by stack, which is updated [Counter].
+    Default is None, where a new Counter is used\n
+    interval : Time between samples [float - seconds]. Default is 0.005
+
+    """
+
+    def __init__(self, name, counts=None, interval=0.005):
+        self.name = name
+        self.interval = interval
+        self.counts = collections.Counter() if counts is None else counts
+        self._thread_id = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('%s (%s:%d)' % (code.co_name,
+                                             os.path.basename(
+                                                 code.co_filename),
+                                             frame.f_lineno))
+                frame = frame.f_back
+            self.counts[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def save(self, directory):
+        """ Save the sampled stacks to directory/<script>_<name>_profile.txt,
+        most frequent first.
+
+        Parameters
+        ----------
+        directory : Directory of the profile [str]
+
+        Returns
+        -------
+        file_path : Path of the profile [str]
+
+        """
+        os.makedirs(directory, exist_ok=True)
+        script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        file_path = os.path.join(directory, '%s_%s_profile.txt'
+                                 % (script, self.name))
+        with open(file_path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write('%s %d\n' % (stack, count))
+        return file_path
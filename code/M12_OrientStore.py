@@ -0,0 +1,340 @@
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import lzma
+import zlib
+
+import numpy as np
+from scipy import ndimage
+
+# Chunked store of orientation fields. The file is a little-endian stream of
+#     bytes    MAGIC
+#     bytes    compressed chunks of each field in C order of the chunk grid
+#     uint64   index(n_chunks, 2)  offset and size of each chunk of each field
+#     bytes    JSON header with the chunk shape, fields and metadata
+#     uint64   header offset, header size
+#     bytes    MAGIC
+MAGIC = b'XRCTOST1'
+
+_COMPRESSORS = {
+    None: (lambda data, level: data, lambda data: data),
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lambda data, level: lzma.compress(data, preset=level),
+             lzma.decompress)}
+
+
+def _shuffle(chunk):
+    # Group the bytes of equal significance, which compresses better
+    raw = chunk.reshape(-1).view(np.uint8)
+    return raw.reshape(-1, chunk.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, shape):
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(data, np.uint8).reshape(dtype.itemsize, -1).T
+    return np.ascontiguousarray(raw).view(dtype).reshape(shape)
+
+
+def _quantized_dtype(values, tolerance):
+    # Integers of step 2*tolerance, where NaN is the smallest integer
+    step = 2 * tolerance
+    finite = values[np.isfinite(values)]
+    peak = np.abs(finite).max() / step if finite.size else 0
+    for dtype in (np.int16, np.int32):
+        if peak < np.iinfo(dtype).max:
+            break
+    else:
+        raise ValueError('Tolerance %g is too small for values up to %g'
+                         % (tolerance, peak * step))
+    return dtype, step
+
+
+def write_store(file_path, fields=None, meta=None, chunks=(64, 64, 64),
+                compression='zlib', level=6, tolerance=None, workers=1):
+    """ Write orientation fields to a chunked, compressed store, which is
+    read chunk by chunk by OrientStore. The bytes of each chunk are shuffled
+    before compression.
+
+    Parameters
+    ----------
+    file_path : Path of the store [str]\n
+    fields : 3D fields by name, e.g. {'phi': phi} [dict of Array of float].
+    Fields may differ in shape. Default is None, where only the metadata is
+    written\n
+    meta : Metadata, e.g. {'VOXEL_SIZE': 2.5} [dict of JSON serialisable
+    values]. Numpy values are converted. Default is None\n
+    chunks : Chunk shape [tuple of int]. Default is (64, 64, 64)\n
+    compression : 'zlib', 'lzma' or None [str]. Default is 'zlib'\n
+    level : Compression level [int]. Default is 6\n
+    tolerance : Maximum absolute error of the stored values [float]. The
+    values are stored as integers of step 2*tolerance. Default is None, where
+    the values are stored losslessly\n
+    workers : Number of threads compressing chunks [int]. Default is 1
+
+    Returns
+    -------
+    None.
+
+    """
+    fields = fields or {}
+    chunks = tuple(int(c) for c in chunks)
+    compress = _COMPRESSORS[compression][0]
+
+    header = {'chunks': list(chunks), 'compression': compression,
+              'fields': {},
+              'meta': json.loads(json.dumps(meta or {}, default=_to_json))}
+    with open(file_path, 'wb') as f, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        f.write(MAGIC)
+        for name, values in fields.items():
+            info = {'dtype': np.dtype(values.dtype).str,
+                    'shape': list(values.shape)}
+            grid = [range(0, n, c) for n, c in zip(values.shape, chunks)]
+            if tolerance is not None:
+                stored, step = _quantized_dtype(values, tolerance)
+                info.update(stored=np.dtype(stored).str, step=step)
+
+            def encode(origin):
+                region = tuple(slice(o, o + c) for o, c in zip(origin, chunks))
+                chunk = values[region]
+                if tolerance is not None:
+                    nan = np.isnan(chunk)
+                    chunk = np.rint(np.where(nan, 0, chunk) / step
+                                    ).astype(info['stored'])
+                    chunk[nan] = np.iinfo(chunk.dtype).min
+                return compress(_shuffle(np.ascontiguousarray(chunk)), level)
+
+            index = []
+            for data in pool.map(encode, itertools.product(*grid)):
+                index.append([f.tell(), len(data)])
+                f.write(data)
+            info['index'] = f.tell()
+            np.array(index, '<u8').reshape(-1, 2).tofile(f)
+            header['fields'][name] = info
+
+        header_offset = f.tell()
+        f.write(json.dumps(header).encode())
+        np.array([header_offset, f.tell() - header_offset], '<u8').tofile(f)
+        f.write(MAGIC)
+
+
+def _to_json(value):
+    # Numpy arrays and scalars in the metadata
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError('%r is not JSON serialisable' % (value,))
+
+
+def nearest_voxels(coords, shape):
+    """ Nearest voxel of points, found axis by axis with the nearest neighbour
+    interpolation (order=0) of scipy.ndimage.map_coordinates. Points outside
+    the volume are marked as outside.
+
+    Parameters
+    ----------
+    coords : Voxel coordinates of the points [N x 3 Array of floats]\n
+    shape : Shape of the volume [tuple of int]
+
+    Returns
+    -------
+    voxels : Voxel indices of the points inside the volume
+    [M x 3 Array of int]\n
+    inside : Points inside the volume [Array of bool]
+
+    """
+    coords = np.asarray(coords, dtype=float)
+    voxels = np.array([ndimage.map_coordinates(np.arange(n, dtype=float), [c],
+                                               order=0, cval=np.nan)
+                       for n, c in zip(shape, coords.T)]).reshape(
+                           len(shape), -1)
+    inside = ~np.any(np.isnan(voxels), axis=0)
+    return voxels[:, inside].T.astype(int), inside
+
+
+class OrientStore:
+    """ Orientation fields in a store written by write_store. Chunks are
+    read and decompressed only when they are accessed.
+
+    Parameters
+    ----------
+    file_path : Path of the store [str]
+
+    Attributes
+    ----------
+    shapes : Shape of each field [dict of tuple of int]\n
+    chunks : Chunk shape [tuple of int]\n
+    fields : Names of the fields [list of str]\n
+    meta : Metadata of the store [dict]
+
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, 'rb') as f:
+            f.seek(-(16 + len(MAGIC)), 2)
+            header_offset, header_size = np.fromfile(f, '<u8', 2)
+            if f.read() != MAGIC:
+                raise ValueError('%s is not an orientation store' % file_path)
+            f.seek(int(header_offset))
+            header = json.loads(f.read(int(header_size)))
+            self.chunks = tuple(header['chunks'])
+            self.meta = header['meta']
+            self._info = header['fields']
+            for info in self._info.values():
+                info['shape'] = tuple(info['shape'])
+                info['grid'] = tuple(-(-n // c) for n, c in
+                                     zip(info['shape'], self.chunks))
+                f.seek(info['index'])
+                info['index'] = np.fromfile(f, '<u8', 2 * int(
+                    np.prod(info['grid']))).reshape(-1, 2)
+        self.fields = list(self._info)
+        self.shapes = {name: info['shape'] for name, info in
+                       self._info.items()}
+        self._decompress = _COMPRESSORS[header['compression']][1]
+
+    def __contains__(self, name):
+        return name in self._info
+
+    def nbytes(self, name):
+        """ Size of a field in memory and on disk.
+
+        Parameters
+        ----------
+        name : Name of the field [str]
+
+        Returns
+        -------
+        nbytes : Size of the decompressed field in bytes [int]\n
+        stored_nbytes : Size of the compressed chunks in bytes [int]
+
+        """
+        info = self._info[name]
+        return (int(np.prod(info['shape']))
+                * np.dtype(info['dtype']).itemsize,
+                int(info['index'][:, 1].sum()))
+
+    def chunk(self, name, chunk_index, f=None):
+        """ Read and decompress a chunk of a field.
+
+        Parameters
+        ----------
+        name : Name of the field [str]\n
+        chunk_index : Index of the chunk in the chunk grid [tuple of int]\n
+        f : Open binary file of the store [file]. Default is None, where the
+        store is opened
+
+        Returns
+        -------
+        chunk : Values of the chunk [Array]
+
+        """
+        if f is None:
+            with open(self.file_path, 'rb') as f:
+                return self.chunk(name, chunk_index, f)
+        info = self._info[name]
+        offset, size = info['index'][np.ravel_multi_index(chunk_index,
+                                                          info['grid'])]
+        f.seek(int(offset))
+        shape = tuple(min(c, n - i * c) for i, c, n in
+                      zip(chunk_index, self.chunks, info['shape']))
+        chunk = _unshuffle(self._decompress(f.read(int(size))),
+                           info.get('stored', info['dtype']), shape)
+        if 'stored' in info:
+            nan = chunk == np.iinfo(chunk.dtype).min
+            chunk = (chunk * info['step']).astype(info['dtype'])
+            chunk[nan] = np.nan
+        return chunk
+
+    def read(self, name, region=None):
+        """ Read a region of a field, decompressing only the chunks which
+        overlap the region.
+
+        Parameters
+        ----------
+        name : Name of the field [str]\n
+        region : Region of the field [tuple of slice or int]. Axes indexed by
+        an int are removed as in numpy. Default is None, where the whole field
+        is read
+
+        Returns
+        -------
+        values : Values of the region [Array]
+
+        """
+        shape = self.shapes[name]
+        if region is None:
+            region = ()
+        elif not isinstance(region, tuple):
+            region = (region,)
+        region += (slice(None),) * (len(shape) - len(region))
+        # Integer indices are read as slices of one index
+        squeeze = []
+        slices = []
+        for axis, (s, n) in enumerate(zip(region, shape)):
+            if isinstance(s, (int, np.integer)):
+                if not -n <= s < n:
+                    raise IndexError('index %d is out of bounds for axis %d '
+                                     'with size %d' % (s, axis, n))
+                s = slice(s % n, s % n + 1)
+                squeeze.append(axis)
+            slices.append(s)
+        region = tuple(slices)
+        indices = [np.arange(n)[s] for s, n in zip(region, shape)]
+        # Bounding box of the region
+        box = [(i.min(), i.max() + 1) if i.size else (0, 0) for i in indices]
+        out = np.empty([hi - lo for lo, hi in box],
+                       np.dtype(self._info[name]['dtype']))
+        ranges = [range(lo // c, -(-hi // c)) for (lo, hi), c in
+                  zip(box, self.chunks)]
+        with open(self.file_path, 'rb') as f:
+            for index in itertools.product(*ranges):
+                chunk = self.chunk(name, index, f)
+                origin = [i * c for i, c in zip(index, self.chunks)]
+                src, dst = [], []
+                for (lo, hi), o, n in zip(box, origin, chunk.shape):
+                    a, b = max(lo, o), min(hi, o + n)
+                    src.append(slice(a - o, b - o))
+                    dst.append(slice(a - lo, b - lo))
+                out[tuple(dst)] = chunk[tuple(src)]
+        out = out[np.ix_(*[i - lo for i, (lo, _) in zip(indices, box)])]
+        return out.squeeze(axis=tuple(squeeze))
+
+    def sample(self, names, coords):
+        """ Values of fields at points by nearest neighbour interpolation as
+        scipy.ndimage.map_coordinates with order=0. Only the chunks containing
+        points are read, one at a time.
+
+        Parameters
+        ----------
+        names : Names of fields of equal shape [list of str]\n
+        coords : Voxel coordinates of the points [N x 3 Array of floats]
+
+        Returns
+        -------
+        values : Values of each field at the points, NaN outside the fields
+        [list of Array]
+
+        """
+        shape = self.shapes[names[0]]
+        if any(self.shapes[name] != shape for name in names):
+            raise ValueError('Fields %s differ in shape' % ', '.join(names))
+        grid = self._info[names[0]]['grid']
+        voxels, inside = nearest_voxels(coords, shape)
+        values = [np.full(len(inside), np.nan,
+                          np.dtype(self._info[name]['dtype']))
+                  for name in names]
+        points = np.flatnonzero(inside)
+        chunk_ids = np.ravel_multi_index(tuple((voxels // self.chunks).T),
+                                         grid)
+        order = np.argsort(chunk_ids, kind='stable')
+        chunk_ids, starts = np.unique(chunk_ids[order], return_index=True)
+        ends = np.r_[starts[1:], len(order)]
+        with open(self.file_path, 'rb') as f:
+            for chunk_id, start, end in zip(chunk_ids, starts, ends):
+                index = np.unravel_index(chunk_id, grid)
+                group = order[start:end]
+                local = tuple((voxels[group]
+                               - np.multiply(index, self.chunks)).T)
+                for name, out in zip(names, values):
+                    out[points[group]] = self.chunk(name, index, f)[local]
+        return values
@@ -0,0 +1,436 @@
+import numpy as np
+
+# The module is also imported by the Abaqus Python interpreter in S2_Cube.py
+
+# Number of nodes of the supported element types
+ELEMENT_NODES = {'C3D20': 20}
+
+# Natural coordinates of the C3D20 nodes in the Abaqus node order
+C3D20_NODES = np.array([
+    [-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+    [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1],
+    [0, -1, -1], [1, 0, -1], [0, 1, -1], [-1, 0, -1],
+    [0, -1, 1], [1, 0, 1], [0, 1, 1], [-1, 0, 1],
+    [-1, -1, 0], [1, -1, 0], [1, 1, 0], [-1, 1, 0]], dtype=float)
+
+def _keyword(line):
+    # Name and options of a keyword line, e.g. *Element, type=C3D20
+    parts = [p.strip() for p in line.decode('ascii', 'replace').split(',')]
+    options = {}
+    for p in parts[1:]:
+        key, _, value = p.partition('=')
+        options[key.strip().lower()] = value.strip()
+    return parts[0].lower(), options
+
+
+def _parse_numbers(lines, n_cols):
+    # Comma separated data lines, where rows may continue on the next line
+    text = b' '.join(lines).replace(b',', b' ')
+    return np.fromstring(text, sep=' ').reshape(-1, n_cols)
+
+
+def read_inp_part(file_name, part_name='Part-1'):
+    """ Read the nodes and elements of a part from an Abaqus input file. The
+    file is streamed line by line, and the data lines of the part are parsed
+    in bulk.
+
+    Parameters
+    ----------
+    file_name : Name of the Abaqus input file [str]\n
+    part_name : Name of the part [str]. Default is 'Part-1'
+
+    Returns
+    -------
+    node_ids : Node labels [Array of int]\n
+    node_coords : Node coordinates in the part coordinate system
+    [N x 3 Array of float]\n
+    elements : Element labels and node labels by element type, e.g.
+    {'C3D20': (ele_ids, connectivity)} [dict of (Array of int,
+    E x n Array of int)]
+
+    """
+    node_lines = []
+    element_lines = {}
+    block = None
+    in_part = False
+    with open(file_name, 'rb') as f:
+        for line in f:
+            if line.startswith(b'**') or not line.strip():
+                continue
+            if line.startswith(b'*'):
+                name, options = _keyword(line)
+                block = None
+                if name == '*part':
+                    in_part = (options.get('name', '').lower()
+                               == part_name.lower())
+                elif name == '*end part' and in_part:
+                    break
+                elif in_part and name == '*node':
+                    block = node_lines
+                elif in_part and name == '*element':
+                    ele_type = options.get('type', '').upper()
+                    if ele_type not in ELEMENT_NODES:
+                        raise ValueError('Element type %s in %s is not '
+                                         'supported' % (ele_type, file_name))
+                    block = element_lines.setdefault(ele_type, [])
+            elif block is not None:
+                block.append(line)
+
+    if not node_lines:
+        raise ValueError('Part %s not found in %s' % (part_name, file_name))
+    nodes = _parse_numbers(node_lines, 4)
+    elements = {}
+    for ele_type, lines in element_lines.items():
+        table = _parse_numbers(lines, ELEMENT_NODES[ele_type] + 1)
+        table = table.astype(int)
+        elements[ele_type] = (table[:, 0], table[:, 1:])
+    return nodes[:, 0].astype(int), nodes[:, 1:], elements
+
+
+def c3d20_shape_functions(xi):
+    """ Shape functions of the 20 node quadratic brick element C3D20.
+
+    Parameters
+    ----------
+    xi : Natural coordinates of the points [P x 3 Array of float]
+
+    Returns
+    -------
+    N : Shape function of each node at each point [P x 20 Array of float]
+
+    """
+    xi = np.asarray(xi, dtype=float).reshape(-1, 3)
+    # Products xi * xi_i of the points and the nodes along each axis
+    p = xi[:, None, :] * C3D20_NODES[None, :, :]
+    corner = np.all(C3D20_NODES != 0, axis=1)
+    N = np.empty((len(xi), 20))
+    N[:, corner] = (np.prod(1.0 + p[:, corner], axis=2)
+                    * (p[:, corner].sum(axis=2) - 2.0) / 8.0)
+    # Mid-side nodes have one zero natural coordinate
+    for axis in range(3):
+        mid = C3D20_NODES[:, axis] == 0
+        others = [a for a in range(3) if a != axis]
+        N[:, mid] = ((1.0 - xi[:, axis, None]**2)
+                     * np.prod(1.0 + p[:, mid][:, :, others], axis=2) / 4.0)
+    return N
+
+
+def c3d20_gauss_points():
+    """ Natural coordinates of the 27 integration points of C3D20 elements.
+    The points are numbered as in Abaqus, with the first natural coordinate
+    varying fastest.
+
+    Returns
+    -------
+    xi : Natural coordinates of the integration points [27 x 3 Array]
+
+    """
+    g = np.sqrt(0.6) * np.array([-1.0, 0.0, 1.0])
+    zeta, eta, xi = np.meshgrid(g, g, g, indexing='ij')
+    return np.column_stack([xi.ravel(), eta.ravel(), zeta.ravel()])
+
+
+def c3d20_gauss_weights():
+    """ Weights of the 27 integration points of C3D20 elements in the order of
+    c3d20_gauss_points. The weights sum to 8, the volume of the element in
+    natural coordinates.
+
+    Returns
+    -------
+    w : Weight of each integration point [Array of float]
+
+    """
+    g = np.array([5.0, 8.0, 5.0]) / 9.0
+    return (g[:, None, None] * g[None, :, None] * g[None, None, :]).ravel()
+
+
+def ip_volumes(ip_ids, ip_coords, chunk_size=100000):
+    """ Volume represented by each integration point of C3D20 elements, i.e.
+    the integration weight times the Jacobian determinant. The Jacobian of
+    each element is fitted to the positions of its 27 integration points,
+    which is exact for elements with straight edges and mid-side nodes at the
+    middle of the edges, as in the structured meshes of S2_Cube.py and
+    S2_CubeInp.py.
+
+    Parameters
+    ----------
+    ip_ids : Integration point number of each integration point, where the
+    27 points of each element are consecutive and numbered 1-27
+    [Array of int]\n
+    ip_coords : Integration point coordinates [N x 3 Array of float]\n
+    chunk_size : Number of elements evaluated at a time [int].
+    Default is 100000
+
+    Returns
+    -------
+    volumes : Volume of each integration point [Array of float]
+
+    """
+    n_ip = 27
+    ip_ids = np.asarray(ip_ids)
+    if len(ip_ids) % n_ip or np.any(
+            ip_ids.reshape(-1, n_ip) != np.arange(1, n_ip + 1)):
+        raise ValueError('The integration points are not numbered 1-27 '
+                         'element by element')
+    xi = c3d20_gauss_points()
+    w = c3d20_gauss_weights()
+    # Least squares fit of x = x_c + J xi, where the points are centred
+    xi_pinv = np.linalg.pinv(xi)
+    volumes = np.empty(len(ip_ids))
+    n_ele = len(ip_ids) // n_ip
+    for a in range(0, n_ele, chunk_size):
+        b = min(a + chunk_size, n_ele)
+        X = np.asarray(ip_coords[a * n_ip:b * n_ip],
+                       dtype=float).reshape(-1, n_ip, 3)
+        X = X - X.mean(axis=1, keepdims=True)
+        J = np.einsum('kp,epj->ejk', xi_pinv, X)
+        volumes[a * n_ip:b * n_ip] = (np.abs(np.linalg.det(J))[:, None]
+                                      * w).ravel()
+    return volumes
+
+
+def ip_coordinates(node_ids, node_coords, ele_ids, connectivity,
+                   chunk_size=100000):
+    """ Coordinates of the integration points of C3D20 elements. The shape
+    functions are evaluated once and applied to chunks of elements.
+
+    Parameters
+    ----------
+    node_ids : Node labels [Array of int]\n
+    node_coords : Node coordinates [N x 3 Array of float]\n
+    ele_ids : Element labels [Array of int]\n
+    connectivity : Node labels of each element [E x 20 Array of int]\n
+    chunk_size : Number of elements evaluated at a time [int].
+    Default is 100000
+
+    Returns
+    -------
+    ip_ele_ids : Element label of each integration point [Array of int]\n
+    ip_ids : Integration point number within its element [Array of int]\n
+    ip_coords : Integration point coordinates [E*27 x 3 Array of float]
+
+    """
+    N = c3d20_shape_functions(c3d20_gauss_points())
+    # Row of each node label in node_coords
+    node_index = np.full(node_ids.max() + 1, -1, dtype=int)
+    node_index[node_ids] = np.arange(len(node_ids))
+    n_ip = len(N)
+
+    ip_coords = np.empty((len(ele_ids) * n_ip, 3))
+    for a in range(0, len(ele_ids), chunk_size):
+        b = min(a + chunk_size, len(ele_ids))
+        rows = node_index[connectivity[a:b]]
+        if np.any(rows < 0):
+            raise ValueError('Elements refer to undefined nodes')
+        X = node_coords[rows]
+        ip_coords[a * n_ip:b * n_ip] = np.einsum(
+            'pn,enk->epk', N, X).reshape(-1, 3)
+    ip_ele_ids = np.repeat(ele_ids, n_ip)
+    ip_ids = np.tile(np.arange(1, n_ip + 1), len(ele_ids))
+    return ip_ele_ids, ip_ids, ip_coords
+
+
+def write_ip_table(file_name, ele_ids, ip_ids, coords, chunk_size=100000):
+    """ Write integration point coordinates as the table of an Abaqus .dat
+    file with *El Print COORD, which is read by
+    M8_AbqReports.abq_table(file_name, *M8_AbqReports.DAT_IP_TABLE).
+
+    Parameters
+    ----------
+    file_name : Name of the .dat file [str]\n
+    ele_ids : Element label of each integration point [Array of int]\n
+    ip_ids : Integration point number of each integration point
+    [Array of int]\n
+    coords : Integration point coordinates [N x 3 Array of float]\n
+    chunk_size : Number of rows formatted at a time [int].
+    Default is 100000
+
+    Returns
+    -------
+    None.
+
+    """
+    with open(file_name, 'wb') as f:
+        f.write(b' THE FOLLOWING TABLE IS PRINTED AT THE INTEGRATION POINTS '
+                b'FOR ELEMENT TYPE C3D20\n\n ELEMENT  PT FOOT-  COOR1  COOR2'
+                b'  COOR3\n        NOTE\n\n\n')
+        for a in range(0, len(ele_ids), chunk_size):
+            b = min(a + chunk_size, len(ele_ids))
+            args = np.empty((b - a, 5), dtype=object)
+            args[:, 0] = np.asarray(ele_ids[a:b]).tolist()
+            args[:, 1] = np.asarray(ip_ids[a:b]).tolist()
+            args[:, 2:] = np.asarray(coords[a:b], dtype=float).tolist()
+            template = '%10d%4d   %14.7E %14.7E %14.7E\n' * (b - a)
+            f.write((template % tuple(args.ravel().tolist())).encode('ascii'))
+        f.write(b'\n\n          THE ANALYSIS HAS BEEN COMPLETED\n\n')
+
+
+def inp_ip_table(inp_file, dat_file, part_name='Part-1'):
+    """ Write the integration point coordinates of the C3D20 elements of a
+    part in an Abaqus input file to a .dat table, replacing an Abaqus job
+    with *El Print COORD. The coordinates are given in the part coordinate
+    system.
+
+    Parameters
+    ----------
+    inp_file : Name of the Abaqus input file [str]\n
+    dat_file : Name of the .dat file [str]\n
+    part_name : Name of the part [str]. Default is 'Part-1'
+
+    Returns
+    -------
+    n_ip : Number of integration points [int]
+
+    """
+    node_ids, node_coords, elements = read_inp_part(inp_file, part_name)
+    if 'C3D20' not in elements:
+        raise ValueError('No C3D20 elements in part %s of %s'
+                         % (part_name, inp_file))
+    ele_ids, connectivity = elements['C3D20']
+    ip_ele_ids, ip_ids, ip_coords = ip_coordinates(node_ids, node_coords,
+                                                   ele_ids, connectivity)
+    write_ip_table(dat_file, ip_ele_ids, ip_ids, ip_coords)
+    return len(ip_ids)
+
+
+def cube_mesh(x0, x1, y0, y1, w, elem_size):
+    """ Structured mesh of C3D20 elements of the box [x0, x1] x [y0, y1] x
+    [0, w] of M3_AbqFunctions.AbqCube, seeded with elem_size as in
+    M3_AbqFunctions.AbqCubeMesh, and the sets of
+    M3_AbqFunctions.AbqCubeSet. The nodes and elements are generated as
+    arrays without Abaqus.
+
+    Parameters
+    ----------
+    x0, x1 : Limits of the box along x [float]\n
+    y0, y1 : Limits of the box along y [float]\n
+    w : Width of the box along z [float]\n
+    elem_size : Target edge length of the elements [float]
+
+    Returns
+    -------
+    node_ids : Node labels [Array of int]\n
+    node_coords : Node coordinates [N x 3 Array of float]\n
+    ele_ids : Element labels [Array of int]\n
+    connectivity : Node labels of each element in the Abaqus node order
+    [E x 20 Array of int]\n
+    sets : Node and element labels of the sets x0, x1, y0, y1, z0, z1, xz0,
+    xy0, xyz0, Cube and corner_node [dict of (Array of int, Array of int)]
+
+    """
+    lower = np.array([x0, y0, 0.0])
+    upper = np.array([x1, y1, w])
+    n_ele = np.maximum(1, np.rint((upper - lower) / elem_size)).astype(int)
+    # Grid of the corner and mid-side nodes, where grid points with more than
+    # one odd index are face and body centres, which are not nodes
+    n_grid = 2 * n_ele + 1
+    odd = [np.arange(n) % 2 for n in n_grid]
+    is_node = (odd[0][:, None, None] + odd[1][None, :, None]
+               + odd[2][None, None, :]) <= 1
+    labels = np.zeros(n_grid, dtype=np.int64)
+    labels[is_node] = np.arange(1, np.count_nonzero(is_node) + 1)
+    axes = [np.linspace(lo, hi, n) for lo, hi, n in zip(lower, upper, n_grid)]
+    grid_index = np.nonzero(is_node)
+    node_coords = np.column_stack([a[i] for a, i in zip(axes, grid_index)])
+    node_ids = labels[grid_index]
+    del is_node, grid_index
+
+    # Flat grid index of the first corner of each element and of the nodes
+    # relative to it
+    first = np.ravel_multi_index(np.meshgrid(
+        *[np.arange(0, 2 * n, 2) for n in n_ele], indexing='ij'), n_grid)
+    offsets = np.ravel_multi_index((C3D20_NODES + 1).astype(int).T, n_grid)
+    connectivity = labels.ravel()[first.reshape(-1, 1) + offsets]
+    ele_ids = np.arange(1, len(connectivity) + 1)
+    ele_labels = ele_ids.reshape(n_ele)
+
+    # Faces, edges and vertices of the sets as layers of the node and element
+    # grids
+    a, b, every = slice(0, 1), slice(-1, None), slice(None)
+    regions = {'x0': (a, every, every), 'x1': (b, every, every),
+               'y0': (every, a, every), 'y1': (every, b, every),
+               'z0': (every, every, a), 'z1': (every, every, b),
+               'xz0': (a, every, b), 'xy0': (a, a, every), 'xyz0': (a, a, a),
+               'Cube': (every, every, every), 'corner_node': (b, b, b)}
+    sets = {}
+    for name, region in regions.items():
+        nodes = labels[region].ravel()
+        sets[name] = (np.sort(nodes[nodes > 0]),
+                      np.sort(ele_labels[region].ravel()))
+    return node_ids, node_coords, ele_ids, connectivity, sets
+
+
+def _label_lines(labels, per_line=16):
+    # Data lines of a node or element set, 16 labels per line
+    labels = np.asarray(labels).tolist()
+    n = len(labels) - len(labels) % per_line
+    template = (', '.join(['%d'] * per_line) + '\n') * (n // per_line)
+    text = template % tuple(labels[:n])
+    if n < len(labels):
+        text += ', '.join('%d' % v for v in labels[n:]) + '\n'
+    return text.encode('ascii')
+
+
+def _write_set(f, keyword, name, labels):
+    # *Nset or *Elset, where consecutive labels are generated
+    labels = np.asarray(labels)
+    if len(labels) > 1 and np.all(np.diff(labels) == 1):
+        f.write(('%s, %s=%s, generate\n %d, %d, 1\n'
+                 % (keyword, keyword[1:].lower(), name, labels[0],
+                    labels[-1])).encode('ascii'))
+    else:
+        f.write(('%s, %s=%s\n' % (keyword, keyword[1:].lower(), name)
+                 ).encode('ascii'))
+        f.write(_label_lines(labels))
+
+
+def write_mesh(f, node_ids, node_coords, ele_type, ele_ids, connectivity,
+               sets=None, chunk_size=100000):
+    """ Write the *Node, *Element, *Nset and *Elset blocks of a part to an
+    Abaqus input file. The data lines of chunks of nodes and elements are
+    formatted with a single format string.
+
+    Parameters
+    ----------
+    f : Input file opened in binary mode [file]\n
+    node_ids : Node labels [Array of int]\n
+    node_coords : Node coordinates [N x 3 Array of float]\n
+    ele_type : Element type, e.g. 'C3D20' [str]\n
+    ele_ids : Element labels [Array of int]\n
+    connectivity : Node labels of each element [E x n Array of int]\n
+    sets : Node and element labels by set name [dict of (Array of int,
+    Array of int)]. Default is None\n
+    chunk_size : Number of nodes or elements written at a time [int].
+    Default is 100000
+
+    Returns
+    -------
+    None.
+
+    """
+    label = '%' + str(len(str(max(node_ids.max(), ele_ids.max())))) + 'd'
+    f.write(b'*Node\n')
+    for a in range(0, len(node_ids), chunk_size):
+        b = min(a + chunk_size, len(node_ids))
+        args = np.empty((b - a, 4), dtype=object)
+        args[:, 0] = np.asarray(node_ids[a:b]).tolist()
+        args[:, 1:] = np.asarray(node_coords[a:b], dtype=float).tolist()
+        template = (label + ', %.12g, %.12g, %.12g\n') * (b - a)
+        f.write((template % tuple(args.ravel().tolist())).encode('ascii'))
+
+    f.write(('*Element, type=%s\n' % ele_type).encode('ascii'))
+    # Element label and node labels, 16 labels per data line
+    n_nodes = connectivity.shape[1]
+    row = label
+    for i in range(n_nodes):
+        row += (', ' if i % 16 != 15 else ',\n') + label
+    row += '\n'
+    for a in range(0, len(ele_ids), chunk_size):
+        b = min(a + chunk_size, len(ele_ids))
+        args = np.column_stack([ele_ids[a:b], connectivity[a:b]])
+        template = row * (b - a)
+        f.write((template % tuple(args.ravel().tolist())).encode('ascii'))
+
+    for name, (set_nodes, set_elements) in (sets or {}).items():
+        _write_set(f, '*Nset', name, set_nodes)
+        _write_set(f, '*Elset', name, set_elements)
@@ -0,0 +1,118 @@
+import numpy as np
+
+import M7_OrientTables as M7OT
+
+# Components of symmetric tensors in the Abaqus order and their indices
+STRESS_COMPONENTS = ('S11', 'S22', 'S33', 'S12', 'S13', 'S23')
+_INDICES = {'11': (0, 0), '22': (1, 1), '33': (2, 2),
+            '12': (0, 1), '13': (0, 2), '23': (1, 2)}
+
+
+def _component_index(components):
+    # Row and column of each component, e.g. 'S12' or 'E12'
+    try:
+        return np.array([_INDICES[c[-2:]] for c in components]).T
+    except KeyError as err:
+        raise ValueError('Unknown tensor component %s' % err)
+
+
+def orient_matrices(phi, theta):
+    """ Rotation matrices of the ORIENT subroutine in I2_orient.f and
+    I3_orient_binary.f for all integration points. The columns of each
+    matrix are the local material directions in the global system.
+
+    Parameters
+    ----------
+    phi : Misalignment angles of the integration points
+    [Array of float - radians]\n
+    theta : Out-of-plane angles of the integration points
+    [Array of float - radians]
+
+    Returns
+    -------
+    T : Rotation matrix of each integration point [N x 3 x 3 Array]
+
+    """
+    cp, sp = np.cos(phi), np.sin(phi)
+    ct, st = np.cos(theta), np.sin(theta)
+    T = np.empty(np.shape(phi) + (3, 3))
+    T[..., 0, 0], T[..., 0, 1], T[..., 0, 2] = cp, -sp, 0.
+    T[..., 1, 0], T[..., 1, 1], T[..., 1, 2] = ct * sp, ct * cp, -st
+    T[..., 2, 0], T[..., 2, 1], T[..., 2, 2] = st * sp, st * cp, ct
+    return T
+
+
+def orient_table_matrices(file_name, ele_ids, ip_ids):
+    """ Rotation matrices of integration points from the binary orientation
+    table written by S3_mapping.py. As in the ORIENT subroutine, integration
+    points without an orientation in the table keep the global axes.
+
+    Parameters
+    ----------
+    file_name : Name of the binary orientation table, e.g.
+    <sample>_ORIENT.bin [str]\n
+    ele_ids : Element label of each integration point [Array of int]\n
+    ip_ids : Integration point number of each integration point
+    [Array of int]
+
+    Returns
+    -------
+    T : Rotation matrix of each integration point [N x 3 x 3 Array]
+
+    """
+    table_ele, table_ip, tables = M7OT.read_binary_table(file_name)
+    # The table is sorted by element label and integration point number
+    table_keys = table_ele.astype(np.int64) << 32 | table_ip
+    keys = np.asarray(ele_ids, np.int64) << 32 | np.asarray(ip_ids, np.int64)
+    rows = np.searchsorted(table_keys, keys)
+    found = rows < len(table_keys)
+    found[found] = table_keys[rows[found]] == keys[found]
+    phi = np.zeros(len(keys))
+    theta = np.zeros(len(keys))
+    phi[found] = tables['PHI'][rows[found]]
+    theta[found] = tables['THETA'][rows[found]]
+    return orient_matrices(phi, theta)
+
+
+def rotate_tensors(values, T, components=STRESS_COMPONENTS,
+                   out_components=None, inverse=False, chunk_size=1000000):
+    """ Rotate symmetric tensors, e.g. stresses, of all integration points
+    from the local to the global system, sigma_g = T sigma_l T^T, or back
+    with inverse. The rotation is applied to chunks of integration points
+    as one einsum operation.
+
+    Parameters
+    ----------
+    values : Tensor components of each integration point
+    [N x C Array of float]\n
+    T : Rotation matrix of each integration point [N x 3 x 3 Array]\n
+    components : Names of the columns of values, e.g. ('S11', 'S22', 'S12')
+    [tuple of str]. Missing components are zero, so all six components are
+    needed for general rotations. Default is STRESS_COMPONENTS\n
+    out_components : Names of the returned components [tuple of str].
+    Default is None, where components is used\n
+    inverse : Rotate from the global to the local system [bool].
+    Default is False\n
+    chunk_size : Number of integration points rotated at a time [int].
+    Default is 1000000
+
+    Returns
+    -------
+    rotated : Rotated tensor components of each integration point
+    [N x C_out Array of float]
+
+    """
+    values = np.asarray(values)
+    rows, cols = _component_index(components)
+    out_rows, out_cols = _component_index(out_components or components)
+    rotated = np.empty((len(values), len(out_rows)))
+    subscripts = 'nji,njk,nkl->nil' if inverse else 'nij,njk,nlk->nil'
+    for a in range(0, len(values), chunk_size):
+        b = min(a + chunk_size, len(values))
+        tensor = np.zeros((b - a, 3, 3))
+        tensor[:, rows, cols] = values[a:b]
+        tensor[:, cols, rows] = values[a:b]
+        tensor = np.einsum(subscripts, T[a:b], tensor, T[a:b],
+                           optimize=True)
+        rotated[a:b] = tensor[:, out_rows, out_cols]
+    return rotated
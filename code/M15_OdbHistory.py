@@ -0,0 +1,101 @@
+import numpy as np
+
+# The module is imported by the Abaqus Python interpreter in
+# S4_Cube_modified.py and M3_AbqFunctions.py. It only uses the field output
+# API of the step objects passed to it, such that it runs without odbAccess.
+
+# Field output and component of each history variable
+FIELD_COMPONENTS = {'U1': ('U', 0), 'U2': ('U', 1), 'U3': ('U', 2),
+                    'RF1': ('RF', 0), 'RF2': ('RF', 1), 'RF3': ('RF', 2)}
+
+
+def _field_values(frame, name, node_set):
+    # Node labels and values of a field output over a node set, read from the
+    # bulk data blocks of a single getSubset call
+    blocks = frame.fieldOutputs[name].getSubset(region=node_set).bulkDataBlocks
+    if not blocks:
+        return np.empty(0, dtype=int), np.empty((0, 3))
+    labels = np.concatenate([np.asarray(b.nodeLabels, dtype=int).ravel()
+                             for b in blocks])
+    data = np.concatenate([np.asarray(b.data, dtype=float).reshape(
+        len(np.ravel(b.nodeLabels)), -1) for b in blocks])
+    return labels, data
+
+
+def node_set_histories(step, node_set, variables=('U1', 'RF1')):
+    """ Time histories of nodal variables of all nodes of a node set in an ODB
+    step. The field outputs of the set are read at each frame in bulk, with
+    one getSubset call per frame and field output, such that no Python code
+    runs per node. The model requests the field output
+    of the set at every increment, see S2_Cube.py and S2_CubeInp.py. Frames
+    without the field outputs are skipped.
+
+    Parameters
+    ----------
+    step : Step of an open ODB, e.g. odbObj.steps['Step-1'] [OdbStep]\n
+    node_set : Node set of the output, e.g.
+    odbObj.rootAssembly.instances['PART-1-1'].nodeSets['X1'] [OdbSet]\n
+    variables : Names of the variables, see FIELD_COMPONENTS
+    [tuple of str]. Default is ('U1', 'RF1')
+
+    Returns
+    -------
+    times : Time of each frame [Array of float]\n
+    histories : Values of each node (rows) at each time (columns) by
+    variable name [dict of N x F Array of float]\n
+    labels : Node label of each row [Array of int]
+
+    """
+    fields = {}
+    for name in variables:
+        if name not in FIELD_COMPONENTS:
+            raise ValueError('Unknown nodal variable %s' % name)
+        field, component = FIELD_COMPONENTS[name]
+        fields.setdefault(field, []).append((name, component))
+    frames = [frame for frame in step.frames
+              if all(field in frame.fieldOutputs.keys() for field in fields)]
+
+    times = np.array([frame.frameValue for frame in frames], dtype=float)
+    labels = None
+    histories = {}
+    for j, frame in enumerate(frames):
+        for field, names in fields.items():
+            frame_labels, data = _field_values(frame, field, node_set)
+            order = np.argsort(frame_labels, kind='mergesort')
+            if labels is None:
+                labels = frame_labels[order]
+                for name in variables:
+                    histories[name] = np.empty((len(labels), len(frames)))
+            elif not np.array_equal(frame_labels[order], labels):
+                raise ValueError('Field output %s of frame %d is not given '
+                                 'at the nodes of the set' % (field, j))
+            for name, component in names:
+                histories[name][:, j] = data[order, component]
+    if labels is None:
+        labels = np.empty(0, dtype=int)
+        for name in variables:
+            histories[name] = np.empty((0, 0))
+    return times, histories, labels
+
+
+def node_set_sums(step, node_set, variables=('U1', 'RF1')):
+    """ Sum of nodal variables over all nodes of a node set at each time,
+    e.g. the total reaction force of the set.
+
+    Parameters
+    ----------
+    step : Step of an open ODB [OdbStep]\n
+    node_set : Node set of the history output [OdbSet]\n
+    variables : Names of the variables [tuple of str].
+    Default is ('U1', 'RF1')
+
+    Returns
+    -------
+    times : Time of each frame [Array of float]\n
+    sums : Sum over the nodes at each time by variable name
+    [dict of Array of float]
+
+    """
+    times, histories, _ = node_set_histories(step, node_set, variables)
+    return times, dict((name, values.sum(axis=0))
+                       for name, values in histories.items())
@@ -0,0 +1,278 @@
+import numpy as np
+
+
+def grid_edges(lower, upper, bins):
+    """ Bin edges of a regular grid over a box, e.g. slabs along the fiber
+    axis x with bins=(20, 1, 1).
+
+    Parameters
+    ----------
+    lower : Lower corner of the box [Array of 3 floats]\n
+    upper : Upper corner of the box [Array of 3 floats]\n
+    bins : Number of bins along each axis [tuple of 3 int]
+
+    Returns
+    -------
+    edges : Bin edges along each axis [list of Array of float]
+
+    """
+    return [np.linspace(lo, hi, n + 1) for lo, hi, n in
+            zip(lower, upper, bins)]
+
+
+class BinnedStats:
+    """ Streaming statistics of integration point values in spatial bins.
+    Chunks of integration points are added with update, such that the count,
+    volume, mean, volume-weighted mean, minimum, maximum and percentiles of
+    each component in each bin are collected in one pass with bincount
+    reductions.
+
+    Parameters
+    ----------
+    edges : Bin edges along each axis [list of Array of float]. Points
+    outside the edges are skipped\n
+    limits : Range of each component, which is covered by the histograms used
+    for percentiles [C x 2 Array of float]. Values outside the range are
+    counted in the first or last histogram bin\n
+    components : Names of the components, e.g. ['S11', 'S22', 'S12']
+    [list of str]. Default is None, where the components are numbered\n
+    resolution : Number of histogram bins of each component in each spatial
+    bin [int]. Default is 256
+
+    """
+
+    def __init__(self, edges, limits, components=None, resolution=256):
+        self.edges = [np.asarray(e, dtype=float) for e in edges]
+        self.shape = tuple(len(e) - 1 for e in self.edges)
+        self.limits = np.asarray(limits, dtype=float).reshape(-1, 2)
+        n_comp = len(self.limits)
+        self.components = list(components or
+                               ['C%d' % (i + 1) for i in range(n_comp)])
+        self.resolution = resolution
+        n_bins = int(np.prod(self.shape))
+        self.count = np.zeros(n_bins, dtype=np.int64)
+        self.volume = np.zeros(n_bins)
+        self.sum = np.zeros((n_bins, n_comp))
+        self.weighted_sum = np.zeros((n_bins, n_comp))
+        self.min = np.full((n_bins, n_comp), np.inf)
+        self.max = np.full((n_bins, n_comp), -np.inf)
+        self.hist = np.zeros((n_bins, n_comp, resolution), dtype=np.int64)
+
+    def bin_index(self, coords):
+        """ Flat index of the spatial bin of each point, -1 outside the bins.
+        Points on the upper edge belong to the last bin as in np.histogram.
+
+        Parameters
+        ----------
+        coords : Coordinates of the points [N x 3 Array of float]
+
+        Returns
+        -------
+        index : Bin index of each point [Array of int]
+
+        """
+        coords = np.asarray(coords, dtype=float)
+        idx = []
+        inside = np.ones(len(coords), dtype=bool)
+        for axis, e in enumerate(self.edges):
+            i = np.searchsorted(e, coords[:, axis], side='right') - 1
+            i[coords[:, axis] == e[-1]] = len(e) - 2
+            inside &= (i >= 0) & (i < len(e) - 1)
+            idx.append(i)
+        index = np.full(len(coords), -1, dtype=np.int64)
+        index[inside] = np.ravel_multi_index(
+            [i[inside] for i in idx], self.shape)
+        return index
+
+    def update(self, coords, values, weights=None):
+        """ Add a chunk of integration points to the statistics.
+
+        Parameters
+        ----------
+        coords : Coordinates of the points [N x 3 Array of float]\n
+        values : Components at the points [N x C Array of float]. Points with
+        values that are not finite are skipped\n
+        weights : Volume of each point [Array of float]. Default is None,
+        where all points have unit volume
+
+        Returns
+        -------
+        None.
+
+        """
+        values = np.asarray(values, dtype=float).reshape(len(coords), -1)
+        index = self.bin_index(coords)
+        keep = (index >= 0) & np.all(np.isfinite(values), axis=1)
+        index, values = index[keep], values[keep]
+        weights = (np.ones(len(index)) if weights is None
+                   else np.asarray(weights, dtype=float)[keep])
+        n_bins, n_comp = self.sum.shape
+
+        self.count += np.bincount(index, minlength=n_bins)
+        self.volume += np.bincount(index, weights, minlength=n_bins)
+        for c in range(n_comp):
+            self.sum[:, c] += np.bincount(index, values[:, c],
+                                          minlength=n_bins)
+            self.weighted_sum[:, c] += np.bincount(
+                index, values[:, c] * weights, minlength=n_bins)
+
+        # Minimum and maximum of the points grouped by bin
+        if len(index):
+            order = np.argsort(index, kind='stable')
+            sorted_index = index[order]
+            starts = np.flatnonzero(np.r_[True, sorted_index[1:]
+                                          != sorted_index[:-1]])
+            bins = sorted_index[starts]
+            self.min[bins] = np.minimum(self.min[bins], np.minimum.reduceat(
+                values[order], starts, axis=0))
+            self.max[bins] = np.maximum(self.max[bins], np.maximum.reduceat(
+                values[order], starts, axis=0))
+
+        # Histograms of the components in each bin
+        lo, hi = self.limits[:, 0], self.limits[:, 1]
+        scale = self.resolution / np.where(hi > lo, hi - lo, 1.)
+        h = np.clip(np.floor((values - lo) * scale).astype(np.int64), 0,
+                    self.resolution - 1)
+        flat = ((index[:, None] * n_comp + np.arange(n_comp))
+                * self.resolution + h)
+        self.hist += np.bincount(flat.ravel(), minlength=self.hist.size
+                                 ).reshape(self.hist.shape)
+
+    @property
+    def mean(self):
+        """ Mean of each component in each bin, NaN in empty bins
+        [B x C Array of float] """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sum / self.count[:, None]
+
+    @property
+    def weighted_mean(self):
+        """ Volume-weighted mean of each component in each bin, NaN in empty
+        bins [B x C Array of float] """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.weighted_sum / self.volume[:, None]
+
+    @property
+    def centres(self):
+        """ Centre of each bin [B x 3 Array of float] """
+        mids = [(e[1:] + e[:-1]) / 2 for e in self.edges]
+        return np.column_stack([m.ravel() for m in
+                                np.meshgrid(*mids, indexing='ij')])
+
+    def percentile(self, q):
+        """ Percentiles of each component in each bin, interpolated within the
+        bins of the histograms. Empty bins are NaN.
+
+        Parameters
+        ----------
+        q : Percentile in the range 0 to 100 [float]
+
+        Returns
+        -------
+        Percentile of each component in each bin [B x C Array of float]
+
+        """
+        cum = np.concatenate([np.zeros(self.hist.shape[:2] + (1,)),
+                              np.cumsum(self.hist, axis=2)], axis=2)
+        target = q / 100. * cum[:, :, -1]
+        # First histogram edge where the cumulative count reaches the target
+        k = np.clip((cum < target[:, :, None]).sum(axis=2), 1,
+                    self.resolution)
+        c0 = np.take_along_axis(cum, k[:, :, None] - 1, axis=2)[:, :, 0]
+        c1 = np.take_along_axis(cum, k[:, :, None], axis=2)[:, :, 0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = np.where(c1 > c0, (target - c0) / (c1 - c0), 0.)
+        width = (self.limits[:, 1] - self.limits[:, 0]) / self.resolution
+        values = self.limits[:, 0] + (k - 1 + frac) * width
+        values[cum[:, :, -1] == 0] = np.nan
+        return values
+
+    def table(self, q=(5, 50, 95)):
+        """ Statistics of all bins as a table with one row per bin.
+
+        Parameters
+        ----------
+        q : Percentiles in the table [tuple of float]. Default is (5, 50, 95)
+
+        Returns
+        -------
+        names : Name of each column [list of str]\n
+        table : Bin index, centre, count, volume and the statistics of each
+        component [B x K Array of float]
+
+        """
+        names = ['i', 'j', 'k', 'x', 'y', 'z', 'count', 'volume']
+        columns = [np.indices(self.shape).reshape(3, -1).T, self.centres,
+                   self.count[:, None], self.volume[:, None]]
+        empty = self.count == 0
+        stats = [('mean', self.mean), ('vmean', self.weighted_mean),
+                 ('min', np.where(empty[:, None], np.nan, self.min)),
+                 ('max', np.where(empty[:, None], np.nan, self.max))]
+        stats += [('p%g' % p, self.percentile(p)) for p in q]
+        for c, component in enumerate(self.components):
+            for name, values in stats:
+                names.append(component + '_' + name)
+                columns.append(values[:, c:c + 1])
+        return names, np.hstack(columns)
+
+    def save(self, file_name, q=(5, 50, 95)):
+        """ Save the table of the statistics as a CSV file with a header
+        line.
+
+        Parameters
+        ----------
+        file_name : Name of the CSV file [str]\n
+        q : Percentiles in the table [tuple of float]. Default is (5, 50, 95)
+
+        Returns
+        -------
+        None.
+
+        """
+        names, table = self.table(q)
+        np.savetxt(file_name, table, delimiter=',', fmt='%.6g',
+                   header=','.join(names), comments='')
+
+
+def aggregate(coords, values, edges, weights=None, components=None,
+              limits=None, resolution=256, chunk_size=1000000):
+    """ Collect the statistics of integration point values in spatial bins
+    chunk by chunk, e.g. from tables memory-mapped by
+    M8_AbqReports.abq_table(..., cache=True).
+
+    Parameters
+    ----------
+    coords : Coordinates of the points [N x 3 Array of float]\n
+    values : Components at the points [N x C Array of float]\n
+    edges : Bin edges along each axis, see grid_edges [list of Array]\n
+    weights : Volume of each point, e.g. from M13_InpMesh.ip_volumes
+    [Array of float]. Default is None, where all points have unit volume\n
+    components : Names of the components [list of str]. Default is None\n
+    limits : Range of each component for the percentiles
+    [C x 2 Array of float]. Default is None, where the range of the finite
+    rows of values is found in a first pass over the chunks\n
+    resolution : Number of histogram bins for the percentiles [int].
+    Default is 256\n
+    chunk_size : Number of points added at a time [int]. Default is 1000000
+
+    Returns
+    -------
+    stats : Statistics of each bin [BinnedStats]
+
+    """
+    n = len(coords)
+    if limits is None:
+        limits = np.array([[np.inf, -np.inf]] * values.shape[1])
+        for a in range(0, n, chunk_size):
+            chunk = np.asarray(values[a:a + chunk_size], dtype=float)
+            # Rows with values that are not finite are skipped by update
+            chunk = chunk[np.all(np.isfinite(chunk), axis=1)]
+            if len(chunk):
+                limits[:, 0] = np.fmin(limits[:, 0], chunk.min(axis=0))
+                limits[:, 1] = np.fmax(limits[:, 1], chunk.max(axis=0))
+    stats = BinnedStats(edges, limits, components, resolution)
+    for a in range(0, n, chunk_size):
+        b = min(a + chunk_size, n)
+        stats.update(coords[a:b], values[a:b],
+                     None if weights is None else weights[a:b])
+    return stats
@@ -1,4 +1,5 @@
 import matplotlib.pyplot as plt
+import nibabel as nib
 import numpy as np
 import sys
 
@@ -20,9 +21,39 @@ def tomo_crop(data_crop, xcut=0, ycut=0, zcut=0):
     data : Tomography data from ROI [Array]
 
     """
-    # Write tomography data into array
-    no_slicing = slice(None)
     data_shape = data_crop.shape
+    crop_slices = tomo_crop_slices(data_shape, xcut, ycut, zcut)
+
+    # If any cutting parameters are chosen, then crop the volume accordingly
+    # Else return the full data set
+    if crop_slices != (slice(None),) * 3:
+        print('Cropping data')
+        data = data_crop[crop_slices]
+    else:
+        data = data_crop
+        print('No cropping performed')
+    return data
+
+
+def tomo_crop_slices(data_shape, xcut=0, ycut=0, zcut=0):
+    """ Slices for cropping the tomography data according to the cutting
+    parameters
+
+    Parameters
+    ----------
+    data_shape : Shape of the tomography data [tuple of int]\n
+    xcut : Amount of voxels removed from each side of the volume in the
+    x-direction [int]. Default is 0.\n
+    ycut : Amount of voxels removed from each side of the volume in the
+    y-direction [int]. Default is 0.\n
+    zcut : Amount of voxels removed from each side of the volume in the
+    z-direction [int]. Default is 0.
+
+    Returns
+    -------
+    crop_slices : Slices of the ROI [tuple of slices]
+
+    """
     cut_arr = 2 * np.array([xcut, ycut, zcut])
 
     # If the cropping dimensions are bigger than the tomography data set,
@@ -31,28 +62,78 @@ def tomo_crop(data_crop, xcut=0, ycut=0, zcut=0):
         print('Too much data was removed. Adjust cut parameters')
         sys.exit()
 
-    # If any cutting parameters are chosen, then crop the volume accordingly
-    # Else return the full data set
-    if np.any(cut_arr > 0):
-        print('Cropping data')
-        if xcut != 0:
-            x_slice = slice(xcut, -xcut)
-        else:
-            x_slice = no_slicing
-        if ycut != 0:
-            y_slice = slice(ycut, -ycut)
+    crop_slices = []
+    for cut in [xcut, ycut, zcut]:
+        if cut != 0:
+            crop_slices.append(slice(cut, -cut))
         else:
-            y_slice = no_slicing
-        if zcut != 0:
-            z_slice = slice(zcut, -zcut)
-        else:
-            z_slice = no_slicing
+            crop_slices.append(slice(None))
+    return tuple(crop_slices)
+
+
+def tomo_load(file_path, sample_coor_axis=[0, 1, 2], xcut=0, ycut=0, zcut=0,
+              slab_size=64):
+    """ Load the ROI of a NIfTI file in the material coordinate system.
+    Uncompressed files are memory-mapped, and the axis permutation and
+    cropping are applied as views, such that only voxels inside the ROI are
+    read from disk when used. Compressed files are streamed slab by slab into
+    an array holding the ROI only.
+
+    Parameters
+    ----------
+    file_path : Path to the NIfTI file [str]\n
+    sample_coor_axis : Material axes of the tomogram axes [list of int].
+    Default is [0, 1, 2]\n
+    xcut : Amount of voxels removed from each side of the volume in the
+    material x-direction [int]. Default is 0.\n
+    ycut : Amount of voxels removed from each side of the volume in the
+    material y-direction [int]. Default is 0.\n
+    zcut : Amount of voxels removed from each side of the volume in the
+    material z-direction [int]. Default is 0.\n
+    slab_size : Number of tomogram slices read at a time from compressed
+    files [int]. Default is 64
 
-        data = data_crop[x_slice, y_slice, z_slice]
+    Returns
+    -------
+    nii_file : NIfTI image with header and meta data\n
+    data : Tomography data from ROI in the material coordinate system [Array]
+
+    """
+    nii_file = nib.load(file_path, mmap='r')
+    dataobj = nii_file.dataobj
+    file_shape = dataobj.shape[:3]
+
+    # The material axis sample_coor_axis[i] is the tomogram axis i.
+    cuts = np.array([xcut, ycut, zcut])[sample_coor_axis]
+    file_slices = tomo_crop_slices(file_shape, *cuts)
+    if np.any(cuts > 0):
+        print('Cropping data')
     else:
-        data = data_crop
         print('No cropping performed')
-    return data
+
+    compressed = str(file_path).endswith(('.gz', '.bz2', '.zst'))
+    scaled = (getattr(dataobj, 'slope', 1.0) != 1.0
+              or getattr(dataobj, 'inter', 0.0) != 0.0)
+    if not compressed and not scaled:
+        # Memory-map the file. No data is read before it is used.
+        data = np.asanyarray(dataobj)[file_slices]
+    else:
+        # Stream the ROI slab by slab along the last tomogram axis, which is
+        # contiguous on disk.
+        roi_shape = [len(range(*s.indices(n)))
+                     for s, n in zip(file_slices, file_shape)]
+        # Scaled voxels are returned as floats by the proxy
+        dtype = (np.result_type(dataobj.dtype, dataobj.slope, dataobj.inter)
+                 if scaled else dataobj.dtype)
+        data = np.empty(roi_shape, dtype=dtype)
+        z_start = file_slices[2].indices(file_shape[2])[0]
+        for k in range(0, roi_shape[2], slab_size):
+            slab = slice(z_start + k, z_start + min(k + slab_size, roi_shape[2]))
+            data[:, :, k:k + slab_size] = dataobj[file_slices[:2] + (slab,)]
+
+    # Change the tomogram coordinate system to the material coordinate system
+    data = np.moveaxis(data, [0, 1, 2], sample_coor_axis)
+    return nii_file, data
 
 
 def tomo_plot_3(data, x_slice=0, y_slice=0, z_slice=0, title='',
@@ -60,12 +60,164 @@ def rot_mat(phi, theta):
     return R
 
 
-def orient_average(vec):
+class OrientStats:
+    """ Streaming statistics of orientation data. Blocks of angles (and
+    optionally the corresponding vectors) are added with update, such that
+    the histogram, means, percentiles and average vector of a volume are
+    collected in one pass without copies of the volume.
+
+    Parameters
+    ----------
+    bins : Number of bins of the histogram [int]. Default is 180\n
+    limits : Histogram range defined by [-limits, limits] [float].
+    Default is 90\n
+    resolution : Bin width of the histogram used for percentiles over
+    [-90, 90] [float - degrees]. Default is 0.01
+
+    """
+
+    def __init__(self, bins=180, limits=90, resolution=0.01):
+        self.bins = bins
+        self.limits = limits
+        self.resolution = resolution
+        self.count = 0
+        self.sum = 0.
+        self.abs_sum = 0.
+        self.hist = np.zeros(bins, dtype=np.int64)
+        self.fine_hist = np.zeros(int(round(180 / resolution)),
+                                  dtype=np.int64)
+        self.vec_sum = np.zeros(3)
+
+    def update(self, angles, vec=None):
+        """ Add a block of angles to the statistics.
+
+        Parameters
+        ----------
+        angles : Block of angles [Array of floats - degrees]. Values that are
+        not finite are skipped.\n
+        vec : Vectors of the block, with the components along the first axis
+        [Array of floats]. Default is None, where the average vector is not
+        updated.
+
+        Returns
+        -------
+        None.
+
+        """
+        angles = np.asarray(angles).ravel()
+        angles = angles[np.isfinite(angles)]
+        self.count += angles.size
+        self.sum += angles.sum(dtype=np.float64)
+        self.abs_sum += np.abs(angles).sum(dtype=np.float64)
+
+        # Bins of the histogram. Values on the upper limit belong to the last
+        # bin as in np.histogram.
+        idx = np.floor((angles + self.limits)
+                       * (self.bins / (2 * self.limits))).astype(np.int64)
+        idx[angles == self.limits] = self.bins - 1
+        idx = idx[(idx >= 0) & (idx < self.bins)]
+        self.hist += np.bincount(idx, minlength=self.bins)
+
+        n_fine = len(self.fine_hist)
+        idx = np.floor((angles + 90) / self.resolution).astype(np.int64)
+        self.fine_hist += np.bincount(np.clip(idx, 0, n_fine - 1),
+                                      minlength=n_fine)
+
+        if vec is not None:
+            vec = np.asarray(vec)
+            self.vec_sum += vec.sum(axis=tuple(range(1, vec.ndim)),
+                                    dtype=np.float64)
+
+    @property
+    def mean(self):
+        """ Mean angle [float - degrees] """
+        return self.sum / self.count
+
+    @property
+    def abs_mean(self):
+        """ Mean absolute angle [float - degrees] """
+        return self.abs_sum / self.count
+
+    @property
+    def vec_avg(self):
+        """ Normalised average vector [Array of floats] """
+        return self.vec_sum / np.linalg.norm(self.vec_sum)
+
+    @property
+    def edges(self):
+        """ Bin edges of the histogram [Array of floats - degrees] """
+        return np.linspace(-self.limits, self.limits, self.bins + 1)
+
+    @property
+    def density(self):
+        """ Histogram normalised to unit area within the histogram range
+        [Array of floats] """
+        return self.hist / (self.hist.sum() * 2 * self.limits / self.bins)
+
+    def percentile(self, q):
+        """ Percentiles of the angles, linearly interpolated between the
+        closest ranks as np.percentile. Each ranked angle is placed evenly
+        within its bin of the fine histogram, such that the error is below
+        the resolution.
+
+        Parameters
+        ----------
+        q : Percentiles in the range 0 to 100 [float or Array of floats]
+
+        Returns
+        -------
+        Percentiles of the angles [float or Array of floats - degrees]
+
+        """
+        cum = np.cumsum(self.fine_hist)
+        rank = np.asarray(q) / 100 * (self.count - 1)
+        lower = np.floor(rank)
+        upper = np.minimum(lower + 1, self.count - 1)
+
+        def ranked(r):
+            # Angle of rank r, placed evenly within its bin
+            k = np.searchsorted(cum, r, side='right')
+            before = cum[k] - self.fine_hist[k]
+            return (k + (r - before + 0.5) / self.fine_hist[k]) \
+                * self.resolution - 90
+
+        return ranked(lower) + (rank - lower) * (ranked(upper) - ranked(lower))
+
+
+def orient_stats(data, bins=180, limits=90, vec=None, block_size=64):
+    """ Collect the statistics of a volume of angles block by block along
+    the first axis.
+
+    Parameters
+    ----------
+    data : Orientation data [Array of angles]\n
+    bins : Number of bins for histogram. The default is 180 [int]\n
+    limits : Histogram range defined by [-limits, limits].
+    The default is 90 [float]\n
+    vec : Vectors of the orientation data, with the components along the
+    first axis [Array of floats]. Default is None\n
+    block_size : Number of slices per block [int]. Default is 64
+
+    Returns
+    -------
+    stats : Statistics of the orientation data [OrientStats]
+
+    """
+    stats = OrientStats(bins=bins, limits=limits)
+    for i in range(0, data.shape[0], block_size):
+        stats.update(data[i:i + block_size],
+                     None if vec is None else vec[:, i:i + block_size])
+    return stats
+
+
+def orient_average(vec, vec_avg=None):
     """ Calculate the average orientation of the tomograpy data set.
 
     Parameters
     ----------
-    vec : Eigenvectors from structure tensor analysis [Array]
+    vec : Eigenvectors from structure tensor analysis [Array]\n
+    vec_avg : Average eigenvector, e.g. OrientStats.vec_avg [Array].
+    Default is None, where it is calculated from vec.
 
     Returns
     -------
@@ -74,8 +226,31 @@ def orient_average(vec):
 
     """
     # Calculate average vector
-    vec_avg = (np.average(vec.reshape(3, -1), axis=1)
-               / np.linalg.norm(np.average(vec.reshape(3, -1), axis=1)))
+    if vec_avg is None:
+        vec_avg = np.average(vec.reshape(3, -1), axis=1)
+
+    # Calculate rotation matrix
+    R = orient_rotation(vec_avg)
+
+    # Calculate new orientation vectors
+    vec_new = (R@vec.reshape(3, -1)).reshape(vec.shape)
+    return vec_new
+
+
+def orient_rotation(vec_avg):
+    """ Calculate the rotation matrix, which aligns the average orientation
+    of the tomography data set with the x-axis.
+
+    Parameters
+    ----------
+    vec_avg : Average eigenvector [Array]
+
+    Returns
+    -------
+    R : Rotation matrix [3x3 Array]
+
+    """
+    vec_avg = vec_avg / np.linalg.norm(vec_avg)
 
     # Calculate average azimuth and elevation angles
     phi_avg = -(np.arctan(np.sqrt(vec_avg[1]**2 + vec_avg[2]**2) / vec_avg[0])
@@ -87,10 +262,80 @@ def orient_average(vec):
 
     # Calculate rotation matrix
     R = rot_mat(phi_avg, theta_avg)
+    return R
 
-    # Calculate new orientation vectors
-    vec_new = (R@vec.reshape(3, -1)).reshape(vec.shape)
-    return vec_new
+
+def orient_angles(vec, R=None, theta=None, phi=None, stats=None,
+                  chunk_size=2**18):
+    """ Fused calculation of the fiber misalignment angles of eigenvectors
+    rotated to a new reference axis. The vectors are processed chunk by
+    chunk in preallocated buffers, such that the extra memory usage is set by
+    the chunk size. The angles equal st_misalign(R@vec).
+
+    Parameters
+    ----------
+    vec : Eigenvectors from structure tensor analysis [3 x Array]\n
+    R : Rotation matrix, e.g. from orient_rotation [3x3 Array].
+    Default is None, where the vectors are not rotated\n
+    theta : Output array of the azimuth angles [Array]. Default is None,
+    where a float32 array is allocated\n
+    phi : Output array of the elevation angles [Array]. Default is None,
+    where a float32 array is allocated\n
+    stats : Statistics updated with the elevation angles [OrientStats].
+    Default is None\n
+    chunk_size : Number of vectors processed at a time [int].
+    Default is 2**18
+
+    Returns
+    -------
+    vec : Eigenvectors, i.e. the input [3 x Array]\n
+    theta : Azimuth angle [Array]\n
+    phi : Elevation angle [Array]
+
+    """
+    if theta is None:
+        theta = np.empty(vec.shape[1:], dtype=np.float32)
+    if phi is None:
+        phi = np.empty(vec.shape[1:], dtype=np.float32)
+    v = vec.reshape(3, -1)
+    theta_flat = theta.reshape(-1)
+    phi_flat = phi.reshape(-1)
+    n = v.shape[1]
+
+    # Preallocated buffers of a chunk
+    chunk_size = min(chunk_size, n)
+    buf = np.empty((3, chunk_size))
+    tmp = np.empty(chunk_size)
+    for a in range(0, n, chunk_size):
+        b = min(a + chunk_size, n)
+        m = b - a
+        c = v[:, a:b]
+        x, y, z = buf[:, :m]
+        if R is None:
+            np.copyto(buf[:, :m], c)
+        else:
+            np.matmul(R, c, out=buf[:, :m])
+
+        # Azimuth angle
+        t = tmp[:m]
+        np.divide(z, y, out=t)
+        np.arctan(t, out=t)
+        t *= 180 / np.pi
+        theta_flat[a:b] = t
+
+        # Elevation angle
+        np.multiply(y, y, out=t)
+        t += np.multiply(z, z, out=z)
+        np.sqrt(t, out=t)
+        t /= x
+        np.arctan(t, out=t)
+        t *= np.sign(y, out=y)
+        t *= 180 / np.pi
+        phi_flat[a:b] = t
+        if stats is not None:
+            stats.update(phi_flat[a:b])
+
+    return vec, theta, phi
 
 
 def plot_hist(data1, data2, bins=180,
@@ -101,9 +346,10 @@ def plot_hist(data1, data2, bins=180,
 
     Parameters
     ----------
-    data : Orientation data [Array of angles]\n
-    bins : Number of bins for histogram. The default is 180 [int]\n
-    limits : Histogram range defined by [-limits, limits].
+    data1 : Original orientation data [OrientStats or Array of angles]\n
+    data2 : Aligned orientation data [OrientStats or Array of angles]\n
+    bins : Number of bins for histogram of arrays. The default is 180 [int]\n
+    limits : Histogram range of arrays defined by [-limits, limits].
     The default is 90 [float]\n
     title : Plot title [str]\n
     fig_name : Name of saved figure without extension [str].
@@ -116,22 +362,25 @@ def plot_hist(data1, data2, bins=180,
     Histogram of orientations before and after angle correction.
 
     """
-    data1_mean = np.average(data1)
+    stats1, stats2 = [d if isinstance(d, OrientStats)
+                      else orient_stats(d, bins=bins, limits=limits)
+                      for d in (data1, data2)]
+    limits = max(stats1.limits, stats2.limits)
     fig, ax = plt.subplots(1, 1, figsize=(10,6))
     # plot histogram of original vector orientations
-    ax.hist(data1.ravel(), bins=bins, range=[-limits, limits],
-            alpha=alpha, label='Original', color='b', density=True)
-    plt.axvline(data1.mean(), color='b', linestyle='solid',
+    ax.hist(stats1.edges[:-1], bins=stats1.edges, weights=stats1.density,
+            alpha=alpha, label='Original', color='b')
+    plt.axvline(stats1.mean, color='b', linestyle='solid',
                 linewidth=1.5, label=(r'Mean $\phi$'))
-    plt.axvline(np.abs(data1).mean(), color='b', linestyle='dotted',
+    plt.axvline(stats1.abs_mean, color='b', linestyle='dotted',
                 linewidth=2.5, label=(r'Mean $|\phi|$'))
     
     # plot histogram of corrected vector orientations
-    ax.hist(data2.ravel(), bins=bins, range=[-limits, limits],
-            alpha=alpha, label='Aligned', color='r', density=True)
-    plt.axvline(data2.mean(), color='r', linestyle='solid',
+    ax.hist(stats2.edges[:-1], bins=stats2.edges, weights=stats2.density,
+            alpha=alpha, label='Aligned', color='r')
+    plt.axvline(stats2.mean, color='r', linestyle='solid',
                 linewidth=1.5, label=(r'Mean $\phi$'))
-    plt.axvline(np.abs(data2).mean(), color='r', linestyle='dotted',
+    plt.axvline(stats2.abs_mean, color='r', linestyle='dotted',
                 linewidth=2.5, label=(r'Mean $|\phi|$'))
     # add plot formatting
     ax.set_xlabel('Fiber elevation angle, $\phi$ [$^\circ$]')
@@ -144,7 +393,7 @@ def plot_hist(data1, data2, bins=180,
     plt.show()
     
 def fig_with_colorbar(data, misalignment, title='', alpha=0.5, cmap=None,
-                      vmin=None, vmax=None,
+                      vmin=None, vmax=None, factor=1,
                       fig_name='Misalignment_overlay', fig_path=''):
     """ Creates a figure with data, fiber misalignment overlay and color bar.
 
@@ -159,6 +408,8 @@ def fig_with_colorbar(data, misalignment, title='', alpha=0.5, cmap=None,
     The default is None.\n
     vmax : Minimum limit for fiber misalignment overlay plot.
     The default is None.\n
+    factor : Edge length of the overlay pixels in data pixels, e.g. for a
+    coarse pyramid level as preview [int]. The default is 1.\n
     fig_name : Name of saved figure without extension [str].
     Default is Tomo_fig\n
     fig_path : Directory for saving figure [str].
@@ -178,8 +429,15 @@ def fig_with_colorbar(data, misalignment, title='', alpha=0.5, cmap=None,
     ax.imshow(data, cmap='gray')
     ax.set_ylim(ax.get_ylim()[::-1])
 
-    # plot reg overlay of fibermisalignment
-    im = ax.imshow(misalignment, alpha=alpha, cmap=cmap, vmin=vmin, vmax=vmax)
+    # plot reg overlay of fibermisalignment. Coarse overlay pixels cover
+    # factor x factor data pixels.
+    limits = ax.get_xlim(), ax.get_ylim()
+    rows, cols = np.shape(misalignment)
+    extent = (-0.5, cols * factor - 0.5, rows * factor - 0.5, -0.5)
+    im = ax.imshow(misalignment, alpha=alpha, cmap=cmap, vmin=vmin, vmax=vmax,
+                   extent=extent)
+    ax.set_xlim(limits[0])
+    ax.set_ylim(limits[1])
 
     # add colorbar for misalignment range
     clb = fig.colorbar(im, cax=cax, orientation='vertical',
@@ -14,6 +14,7 @@ from sketch import *
 from visualization import *
 from connectorBehavior import *
 import numpy as np
+import M15_OdbHistory as M15OH
 
 def AbqBox(modelObj,x0,x1,y0,y1,PartName='Part-1'):
     modelObj.ConstrainedSketch(name='__profile__', sheetSize=200.0)
@@ -86,13 +87,10 @@ def AbqCubeMesh(partObj,x0,x1,y0,y1,w,ElSize):
     return partObj
 
 def BCout(Nset,step1,BCstr):
-    Ndisp = 0.0
-    Nlen = len(Nset.nodes)
-    for i in range(Nlen):
-        histPointN=HistoryPoint(node=Nset.nodes[i])
-        NHistory=step1.getHistoryRegion(point=histPointN)
-        Ndisp=Ndisp+np.array(NHistory.historyOutputs[BCstr].data)[:,1]
-    return Ndisp
+    # Sum of the history output BCstr over the nodes of Nset, see
+    # M15_OdbHistory.node_set_sums
+    times, sums = M15OH.node_set_sums(step1, Nset, (BCstr,))
+    return sums[BCstr]
 
 ############
 def VfCir(x0,x1,y0,y1,cx,cy,cr):
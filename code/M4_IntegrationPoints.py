@@ -4,7 +4,8 @@ import numpy as np
    
 def Int_point_plotting(ip_coords, ip_data_set, Nplots, vmin=[-10], vmax=[10], unit='unit', 
                             variable='Var', fig_name='Test',
-                            fig_path='',fig_title='', figsize=(9, 6), sp_title=None):
+                            fig_path='',fig_title='', figsize=(9, 6), sp_title=None,
+                            max_points=None):
     print('Start plotting')
     seismic_nan_green = plt.cm.seismic.copy()
     
@@ -24,6 +25,12 @@ def Int_point_plotting(ip_coords, ip_data_set, Nplots, vmin=[-10], vmax=[10], un
                          [y_max, y_min, y_min, y_max, y_max],
                          [z_min, z_min, z_max, z_max, z_min]])
     
+    # Plot a stratified subset of the integration points for large meshes
+    if max_points is not None and len(ip_coords) > max_points:
+        subset = Int_point_decimation(ip_coords, max_points)
+        ip_coords = ip_coords[subset]
+        ip_data_set = ip_data_set[subset]
+    
     fig = plt.figure(figsize=figsize)
     
     for i in range(Nplots):
@@ -88,5 +95,159 @@ def Int_point_plotting(ip_coords, ip_data_set, Nplots, vmin=[-10], vmax=[10], un
     fig.suptitle(fig_title, fontsize=20)
     plt.tight_layout()
     plt.savefig(fig_path + fig_name + '.png', dpi=300)
-    
 
+
+def Int_point_decimation(ip_coords, max_points, cells=20, seed=0):
+    """ Stratified random subset of integration points. The bounding box is
+    divided into cells^3 cells, and the same amount of points is kept from
+    each cell, such that sparse regions of the mesh remain visible.
+
+    Parameters
+    ----------
+    ip_coords : Integration point coordinates [N x 3 Array]\n
+    max_points : Maximum number of points in the subset [int]\n
+    cells : Number of cells along each axis [int]. Default is 20\n
+    seed : Seed of the random selection [int]. Default is 0
+
+    Returns
+    -------
+    subset : Indices of the selected points [Array of int]
+
+    """
+    lo, hi = ip_coords.min(axis=0), ip_coords.max(axis=0)
+    cell_idx = ((ip_coords - lo) / np.where(hi > lo, hi - lo, 1) * cells)
+    cell_idx = np.clip(cell_idx.astype(int), 0, cells - 1)
+    cell = np.ravel_multi_index(cell_idx.T, (cells,) * 3)
+
+    # Random order within each cell
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(cell))
+    order = order[np.argsort(cell[order], kind='stable')]
+    counts = np.bincount(cell, minlength=cells**3)
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(order)) - starts[cell[order]]
+
+    # Largest quota per cell that keeps the subset within max_points
+    quota, quota_max = 0, counts.max()
+    while quota < quota_max:
+        mid = (quota + quota_max + 1) // 2
+        if np.minimum(counts, mid).sum() <= max_points:
+            quota = mid
+        else:
+            quota_max = mid - 1
+
+    # Fill the remaining points with one more point of random cells
+    extra = rank == quota
+    n_extra = max(max_points - np.minimum(counts, quota).sum(), 0)
+    if n_extra < extra.sum():
+        extra[np.flatnonzero(extra)[rng.permutation(extra.sum())[n_extra:]]] \
+            = False
+    return np.sort(order[(rank < quota) | extra])
+
+
+def Int_point_binning(ip_coords, ip_data, axes, bins, ranges):
+    """ Average integration point values in a 2D grid of bins.
+
+    Parameters
+    ----------
+    ip_coords : Integration point coordinates [N x 3 Array]\n
+    ip_data : Integration point values [Array of float]. NaN values are
+    ignored.\n
+    axes : Coordinate axes of the rows and columns of the grid
+    [tuple of 2 int]\n
+    bins : Number of bins along the rows and columns [tuple of 2 int]\n
+    ranges : Coordinate ranges of the rows and columns
+    [tuple of 2 (min, max)]
+
+    Returns
+    -------
+    image : Mean value of each bin. Empty bins are NaN [Array]
+
+    """
+    flat = np.zeros(len(ip_coords), dtype=np.int64)
+    for a, n, (c_min, c_max) in zip(axes, bins, ranges):
+        idx = (ip_coords[:, a] - c_min) / max(c_max - c_min, 1e-12) * n
+        flat = flat * n + np.clip(idx.astype(np.int64), 0, n - 1)
+    valid = ~np.isnan(ip_data)
+    size = bins[0] * bins[1]
+    count = np.bincount(flat[valid], minlength=size)
+    total = np.bincount(flat[valid], weights=ip_data[valid], minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        image = total / count
+    return image.reshape(bins)
+
+
+def Int_point_face_plotting(ip_coords, ip_data_set, Nplots, vmin=[-10], vmax=[10],
+                            unit='unit', variable='Var', fig_name='Test',
+                            fig_path='', fig_title='', figsize=(15, 6),
+                            sp_title=None, resolution=200, planes=None):
+    """ Plot integration point values binned onto planes as images. By default
+    the three visible faces of the bounding box in Int_point_plotting are
+    used. The cost is independent of the number of integration points
+    besides a single binning pass per plane.
+
+    Parameters
+    ----------
+    ip_coords : Integration point coordinates [N x 3 Array]\n
+    ip_data_set : Integration point values [Array or N x Nplots Array]\n
+    Nplots : Number of plotted value columns [int]\n
+    vmin, vmax : Color limits of each value column [list of float]\n
+    unit : Unit of the values [str]\n
+    variable : Name of the variable [str]\n
+    fig_name : Name of saved figure without extension [str]\n
+    fig_path : Directory for saving figure [str]\n
+    fig_title : Figure title [str]\n
+    figsize : Figure size [tuple]\n
+    sp_title : Title of each value column [list of str]\n
+    resolution : Number of pixels along the longest side of the bounding
+    box [int]. Default is 200\n
+    planes : Planes as (normal axis, position, thickness) [list of tuple].
+    Points closer to the plane than the thickness are binned. Default is
+    None, where the faces z=z_min, y=y_max and x=x_max are used with a
+    thickness of one pixel.
+
+    Returns
+    -------
+    None.
+
+    """
+    print('Start plotting')
+    c_min, c_max = ip_coords.min(axis=0), ip_coords.max(axis=0)
+    pixel = np.max(c_max - c_min) / resolution
+    if planes is None:
+        planes = [(2, c_min[2], pixel), (1, c_max[1], pixel),
+                  (0, c_max[0], pixel)]
+    # Image axes (horizontal, vertical) of each plane normal
+    image_axes = {0: (2, 1), 1: (0, 2), 2: (0, 1)}
+    axis_names = ['x', 'y', 'z']
+
+    fig, axs = plt.subplots(len(planes), Nplots, figsize=figsize,
+                            squeeze=False)
+    for j, (normal, position, thickness) in enumerate(planes):
+        h, v = image_axes[normal]
+        in_plane = np.abs(ip_coords[:, normal] - position) <= thickness
+        coords = ip_coords[in_plane]
+        bins = tuple(max(int(np.ceil((c_max[a] - c_min[a]) / pixel)), 1)
+                     for a in (v, h))
+        ranges = ((c_min[v], c_max[v]), (c_min[h], c_max[h]))
+        for i in range(Nplots):
+            if ip_data_set.ndim == 1:
+                ip_data = ip_data_set[in_plane]
+            else:
+                ip_data = ip_data_set[in_plane, i]
+            image = Int_point_binning(coords, ip_data, (v, h), bins, ranges)
+            ax = axs[j, i]
+            im = ax.imshow(image, origin='lower', cmap=plt.cm.seismic,
+                           vmin=vmin[i], vmax=vmax[i], aspect='equal',
+                           extent=(c_min[h], c_max[h], c_min[v], c_max[v]))
+            clb = fig.colorbar(im, ax=ax, shrink=0.8)
+            clb.ax.set_title(variable + ' [' + unit + ']')
+            ax.set(xlabel=axis_names[h] + '-axis [mm]',
+                   ylabel=axis_names[v] + '-axis [mm]')
+            plane_title = '%s = %1.2f mm' % (axis_names[normal], position)
+            if sp_title != None:
+                plane_title = sp_title[i] + ', ' + plane_title
+            ax.set_title(plane_title)
+    fig.suptitle(fig_title, fontsize=20)
+    plt.tight_layout()
+    plt.savefig(fig_path + fig_name + '.png', dpi=300)
@@ -0,0 +1,724 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import itertools
+import multiprocessing
+
+import numpy as np
+from scipy import ndimage
+from structure_tensor import eig_special_3d, structure_tensor_3d
+
+import M2_Alignment as M2A
+import M11_Instrumentation as M11IN
+
+
+def st_kernel_radius(sigma, rho, truncate=4):
+    """ Calculate the radius of the structure tensor filters.
+
+    Parameters
+    ----------
+    sigma : Noise scale of the structure tensor [float]\n
+    rho : Integration scale of the structure tensor [float]\n
+    truncate : Truncate the Gaussian filters at this many standard
+    deviations [float]. Default is 4
+
+    Returns
+    -------
+    kernel_radius : Radius of the widest filter. Used for removing the
+    boundary region of the volume [int]\n
+    halo : Radius of the combined derivative and integration filters, i.e.
+    the number of neighbouring voxels influencing a structure tensor [int]
+
+    """
+    kernel_radius = int(max(sigma, rho) * truncate + 0.5)
+    halo = int(sigma * truncate + 0.5) + int(rho * truncate + 0.5)
+    return kernel_radius, halo
+
+
+def st_tiles(shape, tile_size, kernel_radius, halo, region=None):
+    """ Split the valid interior of a volume into tiles with a halo.
+
+    Parameters
+    ----------
+    shape : Shape of the volume [tuple of int]\n
+    tile_size : Edge length of the tiles in voxels [int or tuple of int].
+    If None the valid interior is handled as one tile\n
+    kernel_radius : Amount of voxels removed from each side of the volume [int]\n
+    halo : Amount of neighbouring voxels read around each tile [int]\n
+    region : First and last plus one voxel index of the part of the valid
+    interior, which is split into tiles [tuple of 2 Arrays of 3 int].
+    Default is None, where the full valid interior is split
+
+    Returns
+    -------
+    Generator of (in_slices, tile_slices, out_slices), where in_slices
+    selects the tile including halo in the volume, tile_slices selects the
+    valid tile in the loaded block, and out_slices selects the tile in the
+    output arrays.
+
+    """
+    out_shape = [n - 2 * kernel_radius for n in shape]
+    if np.any(np.array(out_shape) <= 0):
+        raise ValueError('Volume of shape %s is too small for a kernel '
+                         'radius of %d' % (str(shape), kernel_radius))
+    lo, hi = region if region is not None else ([0] * 3, out_shape)
+    if tile_size is None:
+        tile_size = np.subtract(hi, lo)
+    tile_size = np.broadcast_to(tile_size, (3,))
+
+    starts = [range(int(a), int(n), int(t))
+              for a, n, t in zip(lo, hi, tile_size)]
+    for start in itertools.product(*starts):
+        in_slices, tile_slices, out_slices = [], [], []
+        for s, t, n, N in zip(start, tile_size, hi, shape):
+            stop = min(s + int(t), n)
+            # Tile position in the volume
+            v0, v1 = s + kernel_radius, stop + kernel_radius
+            # Add halo, but stay inside the volume. At the volume boundary
+            # the filters see the same 'nearest' padding as the full volume.
+            h0, h1 = max(v0 - halo, 0), min(v1 + halo, N)
+            in_slices.append(slice(h0, h1))
+            tile_slices.append(slice(v0 - h0, v1 - h0))
+            out_slices.append(slice(s, stop))
+        yield tuple(in_slices), tuple(tile_slices), tuple(out_slices)
+
+
+def block_mean(volume, factor, weights=None):
+    """ Mean of a volume over blocks of factor voxels along each of its last
+    three axes. Blocks are cut at the volume boundary.
+
+    Parameters
+    ----------
+    volume : Volume data, e.g. structure tensor elements [Array]\n
+    factor : Edge length of the blocks in voxels [int]\n
+    weights : Weight of the voxels along each axis, e.g. the number of voxels
+    each voxel represents [list of 3 Arrays]. Default is None, where the
+    voxels are weighted equally
+
+    Returns
+    -------
+    mean : Weighted mean over each block [Array]\n
+    weights : Weight of the blocks along each axis [list of 3 Arrays]
+
+    """
+    ndim = volume.ndim
+    if weights is None:
+        weights = [np.ones(n) for n in volume.shape[-3:]]
+    new_weights = []
+    for a, w in zip(range(ndim - 3, ndim), weights):
+        starts = np.arange(0, volume.shape[a], factor)
+        w_shape = [-1 if b == a else 1 for b in range(ndim)]
+        w_sum = np.add.reduceat(w, starts)
+        volume = (np.add.reduceat(volume * w.reshape(w_shape), starts,
+                                  axis=a) / w_sum.reshape(w_shape)
+                  ).astype(volume.dtype, copy=False)
+        new_weights.append(w_sum)
+    return volume, new_weights
+
+
+def _unit_trace(S):
+    # Scale reduced precision structure tensors to unit trace in place. The
+    # eigenvector components of eig_special_3d are of the eighth power of the
+    # tensor elements, which overflow or underflow in float32 for elements
+    # outside of about 1e-4 to 1e4, e.g. for uint16 data. The eigenvectors do
+    # not depend on the scale.
+    if S.dtype.itemsize < 8:
+        trace = S[0] + S[1] + S[2]
+        S *= np.divide(1, trace, out=np.zeros_like(trace), where=trace > 0)
+    return S
+
+
+def st_block(block, sigma, rho, truncate=4, dtype=np.float64, coarsen=None,
+             valid=None):
+    """ Structure tensor analysis of a single block of tomography data.
+
+    Parameters
+    ----------
+    block : Tomography data [Array]\n
+    sigma : Noise scale of the structure tensor [float]\n
+    rho : Integration scale of the structure tensor [float]\n
+    truncate : Truncate the Gaussian filters at this many standard
+    deviations [float]. Default is 4\n
+    dtype : Floating point precision of the filtering, tensor and eigen
+    calculations [dtype]. Default is np.float64\n
+    coarsen : Edge length of the blocks over which the structure tensors are
+    averaged [int]. Default is None, where no averaged tensors are returned\n
+    valid : Region of the block whose tensors are averaged
+    [tuple of slice]. Default is None, where the full block is averaged
+
+    Returns
+    -------
+    vec : Eigenvectors of the smallest eigenvalue, i.e. the fiber direction,
+    ordered as [x, y, z] and aligned with the positive x-direction
+    [Array of float32]\n
+    S_coarse : Structure tensor elements averaged over blocks of coarsen
+    voxels [6 x Array]. Only returned if coarsen is given.
+
+    """
+    # Copy block and cast it to floating point. The structure tensor and the
+    # eigen solution are calculated in the same precision.
+    with M11IN.step('structure_tensor'):
+        block_f = block.astype(dtype)
+        S = structure_tensor_3d(block_f, sigma, rho, truncate=truncate)
+        del block_f
+    if coarsen:
+        S_coarse, _ = block_mean(S[(slice(None),) + (valid or ())], coarsen)
+    with M11IN.step('eigen'):
+        val, vec = eig_special_3d(_unit_trace(S), full=False)
+        del S, val
+    vec = vec.astype(np.float32, copy=False)
+
+    # Eigenvectors are returned as vec=[z,y,x], this is flipped back to
+    # vec=[x,y,z]
+    vec = np.flip(vec, axis=[0])
+
+    # Eigenvectors share orientation with the opposite vector. All
+    # eigenvectors are aligned in the positive x-direction.
+    vec *= np.sign(vec[0])
+    if coarsen:
+        return vec, S_coarse
+    return vec
+
+
+def st_memory(shape, sigma, rho, truncate=4, tile_size=None,
+              dtype=np.float64, workers=1, data_itemsize=1, coarsen=None):
+    """ Estimate the peak memory usage of st_orientation. The estimate is
+    used for scheduling the analysis of several samples at once.
+
+    Parameters
+    ----------
+    shape : Shape of the tomography data [tuple of int]\n
+    data_itemsize : Number of bytes per voxel of the tomography data [int].
+    Default is 1\n
+    See st_orientation for the other parameters.
+
+    Returns
+    -------
+    nbytes : Estimated peak memory usage in bytes [int]
+
+    """
+    kernel_radius, halo = st_kernel_radius(sigma, rho, truncate)
+    out_shape = [n - 2 * kernel_radius for n in shape]
+    if workers > 1 and tile_size is None:
+        tile_size = [-(-out_shape[0] // workers)] + out_shape[1:]
+    if tile_size is None:
+        tile_size = out_shape
+    tile_shape = [min(min(int(t), o) + 2 * halo, n) for t, o, n
+                  in zip(np.broadcast_to(tile_size, (3,)), out_shape, shape)]
+
+    # Output vectors and angles in float32, and the averaged tensors
+    out_bytes = 20 * int(np.prod(out_shape))
+    if coarsen:
+        out_bytes += 6 * np.dtype(dtype).itemsize * int(
+            np.prod([-(-n // coarsen) for n in out_shape]))
+    # Filtered volumes, tensor elements and eigen solution of a tile, which
+    # are about 14 arrays in the precision of the analysis
+    tile_bytes = 14 * np.dtype(dtype).itemsize * int(np.prod(tile_shape))
+    if workers > 1:
+        # The outputs are copied out of shared memory, and each worker reads
+        # its own tile of the data
+        n_tiles = min(workers, int(np.prod(np.ceil(np.divide(out_shape,
+                                                              tile_size)))))
+        return (2 * out_bytes + n_tiles * (
+            tile_bytes + data_itemsize * int(np.prod(tile_shape))))
+    return out_bytes + tile_bytes
+
+
+def st_orientation(data, sigma, rho, truncate=4, tile_size=None,
+                   dtype=np.float64, workers=1, coarsen=None):
+    """ Tiled structure tensor analysis of tomography data. Only a single
+    tile including its halo is cast to floating point and analysed at a time
+    by each worker, such that the memory usage is set by the tile size. The
+    results are identical to analysing the full volume at once.
+
+    Parameters
+    ----------
+    data : Tomography data [Array]\n
+    sigma : Noise scale of the structure tensor [float]\n
+    rho : Integration scale of the structure tensor [float]\n
+    truncate : Truncate the Gaussian filters at this many standard
+    deviations [float]. Default is 4\n
+    tile_size : Edge length of the tiles in voxels [int or tuple of int].
+    Default is None, where the full volume is analysed at once, or split into
+    one slab along the x-axis per worker.\n
+    dtype : Floating point precision of the structure tensor analysis
+    [dtype]. np.float32 halves the memory usage. Default is np.float64\n
+    workers : Number of processes analysing tiles in parallel [int].
+    Default is 1\n
+    coarsen : Edge length of the blocks over which the structure tensors are
+    averaged, e.g. for st_pyramid [int]. The tile size is rounded up to a
+    multiple of coarsen. Default is None, where no averaged tensors are
+    returned
+
+    Returns
+    -------
+    vec : Fiber direction vectors [3 x Array of float32]\n
+    theta : Azimuth angle [Array of float32]\n
+    phi : Elevation angle [Array of float32]\n
+    S_coarse : Structure tensor elements averaged over blocks of coarsen
+    voxels [6 x Array]. Only returned if coarsen is given.\n
+    The boundary region of kernel_radius voxels is removed from the results.
+
+    """
+    kernel_radius, halo = st_kernel_radius(sigma, rho, truncate)
+    out_shape = tuple(n - 2 * kernel_radius for n in data.shape)
+
+    if workers > 1 and tile_size is None:
+        # Split the volume into slabs along the fiber direction
+        tile_size = (-(-out_shape[0] // workers),) + out_shape[1:]
+    if coarsen and tile_size is not None:
+        # Each block of averaged tensors lies within a single tile
+        tile_size = tuple(-(-int(t) // coarsen) * coarsen
+                          for t in np.broadcast_to(tile_size, (3,)))
+    if workers > 1:
+        return _st_orientation_parallel(data, sigma, rho, truncate,
+                                        tile_size, dtype, workers, coarsen)
+
+    # Preallocate output arrays
+    vec = np.empty((3,) + out_shape, dtype=np.float32)
+    theta = np.empty(out_shape, dtype=np.float32)
+    phi = np.empty(out_shape, dtype=np.float32)
+    S_coarse = None
+    if coarsen:
+        S_coarse = np.empty((6,) + tuple(-(-n // coarsen) for n in out_shape),
+                            dtype=dtype)
+
+    for tile in st_tiles(data.shape, tile_size, kernel_radius, halo):
+        _st_tile(data, vec, theta, phi, tile, sigma, rho, truncate, dtype,
+                 coarsen, S_coarse)
+    if coarsen:
+        return vec, theta, phi, S_coarse
+    return vec, theta, phi
+
+
+def _st_tile(data, vec, theta, phi, tile, sigma, rho, truncate, dtype,
+             coarsen=None, S_coarse=None):
+    # Analyse a single tile and write the valid interior to the outputs
+    in_slices, tile_slices, out_slices = tile
+    if coarsen:
+        vec_tile, S_tile = st_block(data[in_slices], sigma, rho, truncate,
+                                    dtype, coarsen, tile_slices)
+        coarse_slices = tuple(slice(s.start // coarsen, -(-s.stop // coarsen))
+                              for s in out_slices)
+        S_coarse[(slice(None),) + coarse_slices] = S_tile
+    else:
+        vec_tile = st_block(data[in_slices], sigma, rho, truncate, dtype)
+    vec_tile = vec_tile[(slice(None),) + tile_slices]
+    vec[(slice(None),) + out_slices] = vec_tile
+    theta[out_slices], phi[out_slices] = M2A.st_misalign(vec_tile)
+
+
+# Shared arrays and parameters of a worker process
+_worker_state = {}
+
+
+def _shared_array(shm, shape, dtype):
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _st_worker_init(data, names, shapes, dtypes, params):
+    shms = [shared_memory.SharedMemory(name=name) for name in names]
+    _worker_state['data'] = data
+    _worker_state['shms'] = shms
+    _worker_state['arrays'] = [_shared_array(shm, shape, dt) for shm, shape, dt
+                               in zip(shms, shapes, dtypes)]
+    _worker_state['params'] = params
+
+
+def _st_worker(tile):
+    arrays = _worker_state['arrays']
+    _st_tile(_worker_state['data'], *arrays[:3], tile,
+             *_worker_state['params'], *arrays[3:])
+
+
+def _st_orientation_parallel(data, sigma, rho, truncate, tile_size, dtype,
+                             workers, coarsen=None):
+    # Tiles are analysed by a process pool. The outputs are placed in shared
+    # memory, such that only the tile slices are sent to the workers. The
+    # forked workers inherit the tomography data, e.g. the memory-mapped ROI
+    # of M1_TomoHandling.tomo_load, and each reads its own tile and halo.
+    kernel_radius, halo = st_kernel_radius(sigma, rho, truncate)
+    out_shape = tuple(n - 2 * kernel_radius for n in data.shape)
+    shapes = [(3,) + out_shape, out_shape, out_shape]
+    dtypes = [np.float32, np.float32, np.float32]
+    if coarsen:
+        shapes.append((6,) + tuple(-(-n // coarsen) for n in out_shape))
+        dtypes.append(np.dtype(dtype))
+
+    shms = []
+    try:
+        for shape, dt in zip(shapes, dtypes):
+            nbytes = max(int(np.prod(shape)) * np.dtype(dt).itemsize, 1)
+            shms.append(shared_memory.SharedMemory(create=True, size=nbytes))
+        arrays = [_shared_array(shm, shape, dt) for shm, shape, dt
+                  in zip(shms, shapes, dtypes)]
+
+        tiles = list(st_tiles(data.shape, tile_size, kernel_radius, halo))
+        initargs = (data, [shm.name for shm in shms], shapes, dtypes,
+                    (sigma, rho, truncate, dtype, coarsen))
+        # Forked workers do not re-run the calling script, which has no
+        # main guard, and receive the data without pickling.
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        else:
+            mp_context = None
+        with ProcessPoolExecutor(max_workers=min(workers, len(tiles)),
+                                 mp_context=mp_context,
+                                 initializer=_st_worker_init,
+                                 initargs=initargs) as executor:
+            # Consume the results to raise exceptions from the workers
+            list(executor.map(_st_worker, tiles))
+
+        # Copy the outputs out of shared memory
+        outputs = tuple(np.array(a) for a in arrays)
+        del arrays
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+    return outputs
+
+
+def st_pyramid(S_coarse, shape, coarsen, levels):
+    """ Pyramid of fiber directions from structure tensors averaged over
+    blocks of coarsen, 2*coarsen, 4*coarsen, ... voxels. The tensors of each
+    level are the means of the tensors of the previous level, weighted by the
+    number of voxels they represent, such that the tensors of each level are
+    the means over their blocks of the full resolution tensors.
+
+    Parameters
+    ----------
+    S_coarse : Structure tensor elements averaged over blocks of coarsen
+    voxels, e.g. from st_orientation [6 x Array]\n
+    shape : Shape of the full resolution field [tuple of int]\n
+    coarsen : Edge length of the blocks of S_coarse in voxels [int]\n
+    levels : Number of levels [int]
+
+    Returns
+    -------
+    Generator of (factor, vec), where factor is the edge length of the
+    blocks of the level in voxels and vec are the fiber direction vectors of
+    the level ordered as [x, y, z] and aligned with the positive x-direction
+    [3 x Array of float32].
+
+    """
+    S = S_coarse
+    factor = coarsen
+    weights = [np.minimum(coarsen, n - np.arange(0, n, coarsen))
+               for n in shape]
+    for level in range(levels):
+        if level:
+            S, weights = block_mean(S, 2, weights)
+            factor *= 2
+        val, vec = eig_special_3d(_unit_trace(S.copy()), full=False)
+        del val
+        vec = np.flip(vec.astype(np.float32, copy=False), axis=[0])
+        vec *= np.sign(vec[0])
+        yield factor, vec
+
+
+def st_points(data, points, sigma, rho, truncate=4, dtype=np.float64,
+              batch_size=128):
+    """ Structure tensor analysis evaluated at single voxels only. For each
+    voxel the local neighbourhood of the filters is analysed, such that the
+    cost scales with the number of voxels rather than the volume size. The
+    voxels must be at least kernel_radius voxels from the volume boundary,
+    where the results equal the full volume analysis.
+
+    Parameters
+    ----------
+    data : Tomography data [Array]\n
+    points : Voxel indices of the evaluated points [N x 3 Array of int]\n
+    sigma : Noise scale of the structure tensor [float]\n
+    rho : Integration scale of the structure tensor [float]\n
+    truncate : Truncate the Gaussian filters at this many standard
+    deviations [float]. Default is 4\n
+    dtype : Floating point precision of the structure tensor analysis
+    [dtype]. Default is np.float64\n
+    batch_size : Number of neighbourhoods analysed at a time [int].
+    Default is 128
+
+    Returns
+    -------
+    vec : Fiber direction vectors at the points ordered as [x, y, z] and
+    aligned with the positive x-direction [3 x N Array of float32]
+
+    """
+    r_sigma = int(sigma * truncate + 0.5)
+    r_rho = int(rho * truncate + 0.5)
+    R = r_sigma + r_rho
+    points = np.asarray(points, dtype=int).reshape(-1, 3)
+
+    # Integration kernel, equal to the kernel used by scipy.ndimage
+    x = np.arange(-r_rho, r_rho + 1)
+    g_rho = np.exp(-0.5 * x**2 / rho**2)
+    g_rho = (g_rho / g_rho.sum()).astype(dtype)
+
+    # Points sharing a voxel are only evaluated once
+    voxels, inverse = np.unique(points, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    S = np.empty((6, len(voxels)), dtype=dtype)
+    offsets = np.arange(-R, R + 1)
+    inner = slice(r_sigma, r_sigma + 2 * r_rho + 1)
+    for b0 in range(0, len(voxels), batch_size):
+        batch = voxels[b0:b0 + batch_size]
+        # Gather the neighbourhoods with 'nearest' padding at the boundary
+        idx = [np.clip(batch[:, a, None] + offsets, 0, data.shape[a] - 1)
+               for a in range(3)]
+        patches = data[idx[0][:, :, None, None], idx[1][:, None, :, None],
+                       idx[2][:, None, None, :]]
+        patches = patches.astype(dtype)
+
+        # Gradients in the integration window. Vx, Vy and Vz are derivatives
+        # along axis 2, 1 and 0 as in structure_tensor_3d.
+        grads = []
+        for axis in [3, 2, 1]:
+            V = patches
+            for a in [1, 2, 3]:
+                V = ndimage.gaussian_filter1d(V, sigma, axis=a,
+                                              order=int(a == axis),
+                                              mode='nearest',
+                                              truncate=truncate)
+                V = V[tuple(inner if b == a else slice(None)
+                            for b in range(4))]
+            grads.append(V)
+        Vx, Vy, Vz = grads
+
+        # Integrate the tensor elements at the centre voxel
+        for i, (Va, Vb) in enumerate([(Vx, Vx), (Vy, Vy), (Vz, Vz),
+                                      (Vx, Vy), (Vx, Vz), (Vy, Vz)]):
+            S[i, b0:b0 + len(batch)] = np.einsum('nijk,i,j,k->n', Va * Vb,
+                                                 g_rho, g_rho, g_rho)
+
+    val, vec = eig_special_3d(_unit_trace(S), full=False)
+    vec = vec.astype(np.float32, copy=False)
+    vec = np.flip(vec, axis=[0])
+    vec *= np.sign(vec[0])
+    return vec[:, inverse]
+
+
+def st_average_vector(data, sigma, rho, truncate=4, tile_size=64, stride=4,
+                      dtype=np.float64):
+    """ Average fiber direction of a volume estimated from every stride-th
+    tile of the tiled structure tensor analysis along each axis, such that
+    about 1/stride**3 of the volume is analysed. The vectors of the analysed
+    tiles equal those of st_orientation, and with stride=1 the result is the
+    average of all vectors as OrientStats.vec_avg.
+
+    Parameters
+    ----------
+    data : Tomography data [Array]\n
+    sigma : Noise scale of the structure tensor [float]\n
+    rho : Integration scale of the structure tensor [float]\n
+    truncate : Truncate the Gaussian filters at this many standard
+    deviations [float]. Default is 4\n
+    tile_size : Edge length of the tiles in voxels [int or tuple of int].
+    Default is 64\n
+    stride : Distance between the analysed tiles in tiles [int].
+    Default is 4\n
+    dtype : Floating point precision of the structure tensor analysis
+    [dtype]. Default is np.float64
+
+    Returns
+    -------
+    vec_avg : Normalised average vector [Array of 3 floats]
+
+    """
+    kernel_radius, halo = st_kernel_radius(sigma, rho, truncate)
+    tile_size = np.broadcast_to(tile_size, (3,))
+    vec_sum = np.zeros(3)
+    for in_slices, tile_slices, out_slices in st_tiles(
+            data.shape, tile_size, kernel_radius, halo):
+        if any((s.start // t) % stride for s, t in zip(out_slices,
+                                                       tile_size)):
+            continue
+        vec = st_block(data[in_slices], sigma, rho, truncate, dtype)
+        vec_sum += vec[(slice(None),) + tile_slices].sum(axis=(1, 2, 3),
+                                                         dtype=np.float64)
+    return vec_sum / np.linalg.norm(vec_sum)
+
+
+def integral_volume(volume):
+    """ Summed volume table of a volume, padded with a leading plane of zeros
+    along each axis.
+
+    Parameters
+    ----------
+    volume : Volume data [Array]
+
+    Returns
+    -------
+    table : Sums of volume[:i, :j, :k] at index [i, j, k]
+    [Array of float64]
+
+    """
+    table = np.zeros(tuple(n + 1 for n in volume.shape), dtype=np.float64)
+    np.cumsum(volume, axis=0, out=table[1:, 1:, 1:])
+    np.cumsum(table[1:, 1:, 1:], axis=1, out=table[1:, 1:, 1:])
+    np.cumsum(table[1:, 1:, 1:], axis=2, out=table[1:, 1:, 1:])
+    return table
+
+
+def box_sum(table, lo, hi):
+    """ Sums of a volume over boxes from a summed volume table.
+
+    Parameters
+    ----------
+    table : Summed volume table from integral_volume [Array]\n
+    lo : First voxel index of each box [N x 3 Array of int]\n
+    hi : Last voxel index plus one of each box [N x 3 Array of int]
+
+    Returns
+    -------
+    sums : Sum over each box [Array of float64]
+
+    """
+    sums = np.zeros(len(lo), dtype=np.float64)
+    for corner in itertools.product([0, 1], repeat=3):
+        idx = [np.where(c, hi[:, a], lo[:, a]) for a, c in enumerate(corner)]
+        sign = (-1)**(3 - sum(corner))
+        sums += sign * table[idx[0], idx[1], idx[2]]
+    return sums
+
+
+def st_box_points(data, points, box_size, sigma, rho, truncate=4,
+                  tile_size=None, dtype=np.float64):
+    """ Fiber directions from structure tensors averaged over a box around
+    each point. The structure tensor is calculated tile by tile over the
+    bounding box of the boxes only, and the sums over the parts of the boxes
+    inside each tile are taken from summed volume tables of the tile, one
+    tensor element at a time. The memory usage is set by the tile size, and
+    the cost per point is independent of the box size.
+
+    Parameters
+    ----------
+    data : Tomography data [Array]\n
+    points : Voxel indices of the box centres in the analysed volume, i.e.
+    without the boundary region of kernel_radius voxels
+    [N x 3 Array of int]\n
+    box_size : Edge length of the boxes in voxels [int]. Boxes are cut at
+    the volume boundary.\n
+    sigma : Noise scale of the structure tensor [float]\n
+    rho : Integration scale of the structure tensor [float]\n
+    truncate : Truncate the Gaussian filters at this many standard
+    deviations [float]. Default is 4\n
+    tile_size : Edge length of the tiles in voxels [int or tuple of int].
+    Default is None, where the bounding box is analysed at once.\n
+    dtype : Floating point precision of the structure tensor [dtype].
+    Default is np.float64
+
+    Returns
+    -------
+    vec : Fiber direction vectors of the averaged structure tensors ordered
+    as [x, y, z] and aligned with the positive x-direction
+    [3 x N Array of float32]
+
+    """
+    kernel_radius, halo = st_kernel_radius(sigma, rho, truncate)
+    shape = np.array([n - 2 * kernel_radius for n in data.shape])
+    points = np.asarray(points, dtype=int).reshape(-1, 3)
+    lo = np.clip(points - box_size // 2, 0, shape)
+    hi = np.clip(points - box_size // 2 + box_size, 0, shape)
+    count = np.prod(hi - lo, axis=1)
+
+    S_box = np.zeros((6, len(points)), dtype=np.float64)
+    if len(points):
+        region = (lo.min(axis=0), hi.max(axis=0))
+        for in_slices, tile_slices, out_slices in st_tiles(
+                data.shape, tile_size, kernel_radius, halo, region):
+            t0 = np.array([s.start for s in out_slices])
+            t1 = np.array([s.stop for s in out_slices])
+            # Parts of the boxes inside the tile in tile coordinates
+            b0 = np.maximum(lo, t0) - t0
+            b1 = np.minimum(hi, t1) - t0
+            sel = np.flatnonzero(np.all(b1 > b0, axis=1))
+            if len(sel) == 0:
+                continue
+            S_tile = structure_tensor_3d(data[in_slices].astype(dtype), sigma,
+                                         rho, truncate=truncate)
+            for i in range(6):
+                table = integral_volume(S_tile[i][tile_slices])
+                S_box[i, sel] += box_sum(table, b0[sel], b1[sel])
+            del S_tile
+    S_box /= count
+
+    val, vec = eig_special_3d(S_box, full=False)
+    vec = vec.astype(np.float32, copy=False)
+    vec = np.flip(vec, axis=[0])
+    vec *= np.sign(vec[0])
+    return vec
+
+
+def st_box_memory(shape, sigma, rho, truncate=4, tile_size=None,
+                  dtype=np.float64, n_points=0):
+    """ Estimate the peak memory usage of st_box_points.
+
+    Parameters
+    ----------
+    shape : Shape of the tomography data [tuple of int]\n
+    n_points : Number of points [int]. Default is 0\n
+    See st_box_points for the other parameters.
+
+    Returns
+    -------
+    nbytes : Estimated peak memory usage in bytes [int]
+
+    """
+    kernel_radius, halo = st_kernel_radius(sigma, rho, truncate)
+    out_shape = [n - 2 * kernel_radius for n in shape]
+    if tile_size is None:
+        tile_size = out_shape
+    tile_shape = [min(int(t), o) for t, o
+                  in zip(np.broadcast_to(tile_size, (3,)), out_shape)]
+    halo_shape = [min(t + 2 * halo, n) for t, n in zip(tile_shape, shape)]
+    # Filtered volumes and tensor elements of a tile, as in st_memory, and
+    # the summed volume table of one element
+    tile_bytes = (14 * np.dtype(dtype).itemsize * int(np.prod(halo_shape))
+                  + 8 * int(np.prod([t + 1 for t in tile_shape])))
+    # Points, boxes and averaged tensors
+    return tile_bytes + 120 * n_points
+
+
+def st_precision_report(data, sigma, rho, truncate=4, size=128,
+                        dtype=np.float32):
+    """ Compare the orientations of a reduced precision structure tensor
+    analysis with the 64-bit analysis. A central sub-volume is used for the
+    comparison.
+
+    Parameters
+    ----------
+    data : Tomography data [Array]\n
+    sigma : Noise scale of the structure tensor [float]\n
+    rho : Integration scale of the structure tensor [float]\n
+    truncate : Truncate the Gaussian filters at this many standard
+    deviations [float]. Default is 4\n
+    size : Edge length of the compared sub-volume in voxels including the
+    boundary region [int]. Default is 128\n
+    dtype : Reduced floating point precision [dtype]. Default is np.float32
+
+    Returns
+    -------
+    report : Maximum, mean and RMS errors in degrees of phi, theta and the
+    angle between the fiber direction vectors [dict]
+
+    """
+    sub_slices = tuple(slice(max(n // 2 - size // 2, 0), n // 2 + size // 2)
+                       for n in data.shape)
+    sub = np.asarray(data[sub_slices])
+    vec64, theta64, phi64 = st_orientation(sub, sigma, rho, truncate)
+    vec, theta, phi = st_orientation(sub, sigma, rho, truncate, dtype=dtype)
+
+    # Angle between the vectors, insensitive to rounding of the vector norms
+    vec64 = vec64.astype(np.float64)
+    sin_angle = np.linalg.norm(np.cross(vec64, vec, axis=0), axis=0)
+    cos_angle = np.abs(np.sum(vec64 * vec, axis=0))
+    errors = {'phi': np.abs(phi - phi64),
+              'theta': np.abs(theta - theta64),
+              'vector': np.degrees(np.arctan2(sin_angle, cos_angle))}
+
+    report = {'dtype': np.dtype(dtype).name, 'voxels': phi.size}
+    for name, error in errors.items():
+        error = error[np.isfinite(error)]
+        report[name + '_max'] = float(error.max())
+        report[name + '_mean'] = float(error.mean())
+        report[name + '_rms'] = float(np.sqrt(np.mean(error**2)))
+    return report
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import shutil
+
+import M9_Pipeline as M9PL
+
+
+def cache_key(file_path, params, digest_file=None):
+    """ Calculate a content based key of an analysis from the input data file
+    and all parameters of the analysis. The SHA-256 digest of the data file
+    is reused from digest_file while the size and modification time of the
+    file are unchanged, such that the file is only read when it has changed.
+
+    Parameters
+    ----------
+    file_path : Path to the input data file [str]\n
+    params : Parameters of the analysis [dict of JSON serialisable values]\n
+    digest_file : JSON file of known digests, see M9_Pipeline.file_digest
+    [str]. Default is None, where the data file is always read
+
+    Returns
+    -------
+    key : Hexadecimal SHA-256 digest [str]
+
+    """
+    digests = {}
+    if digest_file is not None and os.path.isfile(digest_file):
+        with open(digest_file) as f:
+            digests = json.load(f)
+    digest = M9PL.file_digest(os.path.abspath(file_path), digests)
+    if digest_file is not None:
+        # Replace the file at once, such that concurrent runs never read a
+        # partial file
+        tmp_file = '%s.%d.tmp' % (digest_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump(digests, f)
+        os.replace(tmp_file, digest_file)
+
+    h = hashlib.sha256()
+    h.update(digest.encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def cache_load(cache_dir, key, files):
+    """ Copy the cached result files of a key to their destinations.
+
+    Parameters
+    ----------
+    cache_dir : Directory of the result cache [str]\n
+    key : Key of the analysis [str]\n
+    files : Destination paths of the result files [list of str]. The files
+    are cached by their base names.
+
+    Returns
+    -------
+    hit : True if all files were found in the cache [bool]
+
+    """
+    entry = os.path.join(cache_dir, key)
+    cached = [os.path.join(entry, os.path.basename(f)) for f in files]
+    if not all(os.path.isfile(c) for c in cached):
+        return False
+
+    for c, f in zip(cached, files):
+        shutil.copyfile(c, f)
+    # Mark the entry as recently used
+    os.utime(entry)
+    print('Results loaded from cache entry', key)
+    return True
+
+
+def cache_store(cache_dir, key, files, max_size=None):
+    """ Copy result files into the cache and evict the least recently used
+    entries when the cache exceeds its maximum size.
+
+    Parameters
+    ----------
+    cache_dir : Directory of the result cache [str]\n
+    key : Key of the analysis [str]\n
+    files : Paths of the result files [list of str]. Missing files are
+    skipped.\n
+    max_size : Maximum size of the cache in bytes [int].
+    Default is None, where no entries are evicted.
+
+    Returns
+    -------
+    None.
+
+    """
+    entry = os.path.join(cache_dir, key)
+    # Write to a temporary directory of this process such that an
+    # interrupted run never leaves an incomplete entry, and concurrent runs
+    # storing the same key do not share it
+    tmp_entry = '%s.%d.tmp' % (entry, os.getpid())
+    shutil.rmtree(tmp_entry, ignore_errors=True)
+    os.makedirs(tmp_entry)
+    for f in files:
+        if os.path.isfile(f):
+            shutil.copyfile(f, os.path.join(tmp_entry, os.path.basename(f)))
+    names = os.listdir(tmp_entry)
+    if os.path.isdir(entry) and not _has_files(entry, names):
+        shutil.rmtree(entry, ignore_errors=True)
+    try:
+        os.rename(tmp_entry, entry)
+    except OSError:
+        # The entry was stored meanwhile by a concurrent run of the same
+        # analysis, whose files are equal as the key is content based
+        if not _has_files(entry, names):
+            raise
+        shutil.rmtree(tmp_entry)
+
+    if max_size is not None:
+        cache_evict(cache_dir, max_size, keep=[key])
+
+
+def _has_files(entry, names):
+    # True if the cache entry holds all files of the given names
+    return all(os.path.isfile(os.path.join(entry, n)) for n in names)
+
+
+def cache_evict(cache_dir, max_size, keep=()):
+    """ Remove the least recently used cache entries until the cache is
+    smaller than max_size.
+
+    Parameters
+    ----------
+    cache_dir : Directory of the result cache [str]\n
+    max_size : Maximum size of the cache in bytes [int]\n
+    keep : Keys of entries that are never removed [list of str]
+
+    Returns
+    -------
+    None.
+
+    """
+    entries = []
+    for key in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, key)
+        if not os.path.isdir(entry) or key.endswith('.tmp'):
+            continue
+        size = sum(e.stat().st_size for e in os.scandir(entry) if e.is_file())
+        entries.append((os.stat(entry).st_mtime, size, key))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, key in sorted(entries):
+        if total_size <= max_size:
+            break
+        if key in keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, key))
+        total_size -= size
+        print('Evicted cache entry', key)
@@ -0,0 +1,162 @@
+import numpy as np
+
+
+def _group_elements(ele_ids, ip_ids):
+    # Group the integration points by element, keeping their order
+    order = np.argsort(ele_ids, kind='stable')
+    ele_sorted = ele_ids[order]
+    ip_sorted = ip_ids[order]
+    starts = np.flatnonzero(np.r_[True, ele_sorted[1:] != ele_sorted[:-1]])
+    ends = np.r_[starts[1:], len(ele_sorted)]
+    ip_min = np.minimum.reduceat(ip_sorted, starts)
+    ip_max = np.maximum.reduceat(ip_sorted, starts)
+    return order, starts, ends, ip_min, ip_max
+
+
+def write_fortran_tables(file_prefix, ele_ids, ip_ids, tables,
+                         chunk_size=100000):
+    """ Write orientation tables as Fortran DATA statements, which are
+    included in the ORIENT subroutine. All tables share the element layout,
+    which is calculated once, and the statements are formatted in bulk for
+    chunks of elements.
+
+    Parameters
+    ----------
+    file_prefix : Prefix of the file names. A table is written to
+    file_prefix + '_' + name + '.f' [str]\n
+    ele_ids : Element label of each integration point [Array of int]\n
+    ip_ids : Integration point number of each integration point
+    [Array of int]\n
+    tables : Values of each integration point by table name, e.g.
+    {'PHI': phi, 'THETA': theta} [dict of Array of float]\n
+    chunk_size : Number of elements formatted and written at a time [int].
+    Default is 100000
+
+    Returns
+    -------
+    None.
+
+    """
+    ele_ids = np.asarray(ele_ids)
+    ip_ids = np.asarray(ip_ids)
+    order, starts, ends, ip_min, ip_max = _group_elements(ele_ids, ip_ids)
+    ele_sorted = ele_ids[order]
+
+    # Three values per line. Position of each value within its element
+    pos = np.arange(len(ele_sorted)) - np.repeat(starts, ends - starts)
+    # Value formats: 0 first of element, 1 same line, 2 new line. Add 3 for
+    # the last value of an element.
+    kind = np.where(pos == 0, 0, np.where(pos % 3 == 0, 2, 1))
+    kind[ends - 1] += 3
+
+    # Positions of the values and the element headers in the format arguments
+    n_heads = np.cumsum(pos == 0)
+    val_arg = np.arange(len(ele_sorted)) + 3 * n_heads
+
+    outputs = {name: open('%s_%s.f' % (file_prefix, name), 'w')
+               for name in tables}
+    try:
+        for name, output in outputs.items():
+            # Write header.
+            output.write('      real*8 %s0(%d,%d)\n'
+                         % (name, ip_ids.max(), ele_ids.max()))
+
+        for c0 in range(0, len(starts), chunk_size):
+            c1 = min(c0 + chunk_size, len(starts))
+            v0, v1 = starts[c0], ends[c1 - 1]
+            kinds = kind[v0:v1]
+            n_args = (v1 - v0) + 3 * (c1 - c0)
+            args = np.empty(n_args, dtype=object)
+            offset = val_arg[v0] - 3
+            head_arg = val_arg[starts[c0:c1]] - offset - 3
+            args[head_arg] = ele_sorted[starts[c0:c1]].tolist()
+            args[head_arg + 1] = ip_min[c0:c1].tolist()
+            args[head_arg + 2] = ip_max[c0:c1].tolist()
+
+            for name, output in outputs.items():
+                head = '      DATA (%s0(I,%%d), I=%%d,%%d)/ ' % name
+                formats = np.array([head + '%.6f', ', %.6f',
+                                    ', \n     &  %.6f'], dtype=object)
+                formats = np.r_[formats, formats + '/\n']
+                template = ''.join(formats[kinds].tolist())
+                args[val_arg[v0:v1] - offset] = \
+                    np.asarray(tables[name])[order[v0:v1]].tolist()
+                output.write(template % tuple(args))
+    finally:
+        for output in outputs.values():
+            output.close()
+
+
+def write_binary_table(file_name, ele_ids, ip_ids, tables):
+    """ Write orientation tables to a binary file, which is read once by the
+    ORIENT subroutine in I3_orient_binary.f. The values of an element are
+    located through a sorted index of the element labels, such that the
+    file size scales with the number of integration points.
+
+    The file is a little-endian stream of
+        int32   n_ele, n_val, n_tab
+        int32   label(n_ele)     sorted element labels
+        int32   ip_min(n_ele)    integration point number of first value
+        int32   offset(n_ele+1)  index of first value of each element
+        float64 values(n_val)    for each of the n_tab tables
+
+    Parameters
+    ----------
+    file_name : Name of the binary file [str]\n
+    ele_ids : Element label of each integration point [Array of int]\n
+    ip_ids : Integration point number of each integration point
+    [Array of int]\n
+    tables : Values of each integration point by table name, e.g.
+    {'PHI': phi, 'THETA': theta} [dict of Array of float]. The tables are
+    written in the order of the dict.
+
+    Returns
+    -------
+    None.
+
+    """
+    # Sort the values by element label and integration point number
+    order = np.lexsort((ip_ids, ele_ids))
+    ele_ids = np.asarray(ele_ids)[order]
+    ip_ids = np.asarray(ip_ids)[order]
+    _, starts, ends, ip_min, ip_max = _group_elements(ele_ids, ip_ids)
+
+    with open(file_name, 'wb') as f:
+        np.array([len(starts), len(order), len(tables)], '<i4').tofile(f)
+        ele_ids[starts].astype('<i4').tofile(f)
+        ip_min.astype('<i4').tofile(f)
+        np.r_[starts, len(order)].astype('<i4').tofile(f)
+        for values in tables.values():
+            np.asarray(values)[order].astype('<f8').tofile(f)
+
+
+def read_binary_table(file_name, names=('PHI', 'THETA')):
+    """ Read orientation tables from a binary file written by
+    write_binary_table.
+
+    Parameters
+    ----------
+    file_name : Name of the binary file [str]\n
+    names : Names of the tables in the file [tuple of str].
+    Default is ('PHI', 'THETA')
+
+    Returns
+    -------
+    ele_ids : Element label of each value [Array of int]\n
+    ip_ids : Integration point number of each value [Array of int]\n
+    tables : Values by table name [dict of Array of float]
+
+    """
+    with open(file_name, 'rb') as f:
+        n_ele, n_val, n_tab = np.fromfile(f, '<i4', 3)
+        label = np.fromfile(f, '<i4', n_ele)
+        ip_min = np.fromfile(f, '<i4', n_ele)
+        offset = np.fromfile(f, '<i4', n_ele + 1)
+        tables = {name: np.fromfile(f, '<f8', n_val)
+                  for name in names[:n_tab]}
+
+    counts = np.diff(offset)
+    ele_ids = np.repeat(label, counts)
+    ip_ids = (np.arange(n_val) - np.repeat(offset[:-1], counts)
+              + np.repeat(ip_min, counts))
+    return ele_ids, ip_ids, tables
@@ -0,0 +1,199 @@
+import collections
+import json
+import os
+
+import numpy as np
+
+# Markers of the integration point tables in Abaqus .dat and report files
+# (start_line, end_line, start_offset, end_offset)
+DAT_IP_TABLE = ('THE FOLLOWING TABLE IS PRINTED AT THE INTEGRATION POINTS '
+                'FOR ELEMENT TYPE', 'THE ANALYSIS HAS BEEN COMPLETED', 6, 3)
+REPORT_IP_TABLE = ('Field Output reported at integration points for part',
+                   'Minimum', 5, 3)
+
+
+def abq_table(file_name, start_line, end_line, start_offset, end_offset,
+              encoding='cp1257', chunk_size=2**26, cache=False):
+    """ Load a numeric table from an Abaqus .dat or report file. The table
+    starts start_offset lines after the first line containing start_line and
+    ends end_offset lines before the line after the last line containing
+    end_line. The file is streamed to find the table, and the byte offsets of
+    the table are saved to file_name + '.idx', such that later reads jump
+    straight to the table. With cache, the parsed table is saved to
+    file_name + '.npy', which is memory-mapped instead of parsed as long as
+    the file is unchanged.
+
+    Parameters
+    ----------
+    file_name : Name of the Abaqus output file [str]\n
+    start_line : Text of the line marking the start of the table [str]\n
+    end_line : Text of the line marking the end of the table [str]\n
+    start_offset : Number of lines from the start marker to the first row
+    of the table [int]\n
+    end_offset : Number of lines from the end marker to the line after the
+    last row of the table, plus one [int]\n
+    encoding : Encoding of the marker text [str]. Default is 'cp1257'\n
+    chunk_size : Number of bytes parsed at a time [int]. Default is 64 MB\n
+    cache : Save the table to file_name + '.npy' and memory-map it on later
+    reads [bool]. Default is False
+
+    Returns
+    -------
+    table : Rows of the table [Array of float]. The array is read-only and
+    memory-mapped if it is read from the cache
+
+    """
+    start_byte, end_byte = abq_table_index(file_name, start_line, end_line,
+                                           start_offset, end_offset, encoding)
+    if not cache:
+        return parse_table(file_name, start_byte, end_byte, chunk_size)
+
+    cache_file = file_name + '.npy'
+    markers = [start_line, end_line, start_offset, end_offset]
+    index = _load_index(file_name, markers)
+    if index.get('cache') == os.path.basename(cache_file) and \
+            os.path.isfile(cache_file):
+        return np.load(cache_file, mmap_mode='r')
+    table = parse_table(file_name, start_byte, end_byte, chunk_size)
+    # The cache is written before it is recorded in the index, such that an
+    # interrupted write is not used. In read-only directories the table is
+    # returned without a cache.
+    try:
+        tmp_file = '%s.%d.tmp.npy' % (cache_file, os.getpid())
+        np.save(tmp_file, table)
+        os.replace(tmp_file, cache_file)
+        index['cache'] = os.path.basename(cache_file)
+        with open(file_name + '.idx', 'w') as f:
+            json.dump(index, f)
+    except OSError:
+        pass
+    return table
+
+
+def _load_index(file_name, markers):
+    # Index of a table in file_name + '.idx' if it matches the file and the
+    # markers, otherwise an empty dict
+    stat = os.stat(file_name)
+    index_file = file_name + '.idx'
+    if os.path.isfile(index_file):
+        with open(index_file) as f:
+            index = json.load(f)
+        if (index['size'] == stat.st_size
+                and index['mtime_ns'] == stat.st_mtime_ns
+                and index['markers'] == markers):
+            return index
+    return {}
+
+
+def abq_table_index(file_name, start_line, end_line, start_offset, end_offset,
+                    encoding='cp1257'):
+    """ Byte offsets of a table in an Abaqus output file. The offsets are
+    read from file_name + '.idx' if it matches the file and the markers, and
+    otherwise found by streaming the file and saved to file_name + '.idx'.
+
+    Parameters
+    ----------
+    See abq_table.
+
+    Returns
+    -------
+    start_byte : Byte offset of the first row of the table [int]\n
+    end_byte : Byte offset after the last row of the table [int]
+
+    """
+    stat = os.stat(file_name)
+    markers = [start_line, end_line, start_offset, end_offset]
+    index = _load_index(file_name, markers)
+    if index:
+        return index['start_byte'], index['end_byte']
+
+    start_marker = start_line.encode(encoding)
+    end_marker = end_line.encode(encoding)
+    start_byte = end_byte = None
+    # Byte offsets of the most recent lines, such that the end of the table
+    # can be found relative to the last end marker.
+    line_starts = collections.deque(maxlen=max(end_offset, 1))
+    with open(file_name, 'rb') as f:
+        pos = 0
+        count_down = None
+        for line in f:
+            line_starts.append(pos)
+            if count_down is not None:
+                count_down -= 1
+                if count_down == 0:
+                    start_byte = pos
+                    count_down = None
+            elif start_byte is None and start_marker in line:
+                if start_offset == 0:
+                    start_byte = pos
+                else:
+                    count_down = start_offset
+            pos += len(line)
+            if start_byte is not None and end_marker in line:
+                if end_offset == 0:
+                    end_byte = pos
+                else:
+                    end_byte = line_starts[0]
+
+    if start_byte is None or end_byte is None:
+        raise ValueError('Table markers not found in %s' % file_name)
+
+    # In read-only directories the table is found again on the next read
+    try:
+        with open(file_name + '.idx', 'w') as f:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                       'markers': markers, 'start_byte': start_byte,
+                       'end_byte': end_byte}, f)
+    except OSError:
+        pass
+    return start_byte, end_byte
+
+
+def parse_table(file_name, start_byte, end_byte, chunk_size=2**26):
+    """ Parse whitespace separated numeric rows between two byte offsets of a
+    file. The rows are parsed in bulk, chunk by chunk.
+
+    Parameters
+    ----------
+    file_name : Name of the file [str]\n
+    start_byte : Byte offset of the first row [int]\n
+    end_byte : Byte offset after the last row [int]\n
+    chunk_size : Number of bytes parsed at a time [int]. Default is 64 MB
+
+    Returns
+    -------
+    table : Rows of the table [Array of float]
+
+    """
+    chunks = []
+    n_cols = None
+    with open(file_name, 'rb') as f:
+        f.seek(start_byte)
+        remaining = end_byte - start_byte
+        tail = b''
+        while remaining > 0:
+            block = f.read(min(chunk_size, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            # Byte offset of the first line of the block
+            offset = end_byte - remaining - len(block) - len(tail)
+            block = tail + block
+            # Only parse complete lines
+            cut = block.rfind(b'\n') + 1 if remaining > 0 else len(block)
+            block, tail = block[:cut], block[cut:]
+            if n_cols is None:
+                rows = block.lstrip()
+                if not rows:
+                    continue
+                n_cols = len(rows.split(b'\n', 1)[0].split())
+            try:
+                chunks.append(np.fromstring(block, sep=' '))
+            except ValueError as err:
+                raise ValueError('Rows of %s between bytes %d and %d are not '
+                                 'numeric: %s' % (file_name, offset,
+                                                  offset + len(block), err))
+
+    if n_cols is None:
+        return np.empty((0, 0))
+    return np.concatenate(chunks).reshape(-1, n_cols)
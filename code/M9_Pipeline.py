@@ -0,0 +1,310 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import graphlib
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+
+class Stage:
+    """ Stage of the analysis pipeline. A stage runs a command, which reads
+    its input files and writes its output files. Stages depend on the stages
+    writing their input files.
+
+    Parameters
+    ----------
+    name : Unique name of the stage, e.g. 'A01:S1' [str]\n
+    command : Command and arguments [list of str]\n
+    inputs : Paths of the files read by the stage, including its scripts
+    [list of str]\n
+    outputs : Paths of the files written by the stage [list of str]\n
+    env : Parameters passed to the command as environment variables
+    [dict of str]. Default is None\n
+    cpus : Number of CPUs used by the stage [int]. Passed to the command as
+    the environment variable XRCT_NCPUS. Default is 1\n
+    memory : Peak memory usage of the stage in bytes [int]. Default is 0
+
+    """
+
+    def __init__(self, name, command, inputs, outputs, env=None, cpus=1,
+                 memory=0):
+        self.name = name
+        self.command = list(command)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.env = dict(env or {})
+        self.cpus = cpus
+        self.memory = memory
+
+
+def file_digest(path, digests=None, chunk_size=2**24):
+    """ Calculate the SHA-256 digest of a file. Digests are reused from
+    digests while the size and modification time of the file are unchanged.
+
+    Parameters
+    ----------
+    path : Path of the file [str]\n
+    digests : Known digests by path as [size, mtime_ns, digest], which is
+    updated [dict]. Default is None\n
+    chunk_size : Number of bytes read at a time [int]. Default is 16 MB
+
+    Returns
+    -------
+    digest : Hexadecimal SHA-256 digest [str]
+
+    """
+    stat = os.stat(path)
+    if digests is not None and path in digests:
+        size, mtime_ns, digest = digests[path]
+        if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+            return digest
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    if digests is not None:
+        digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+    return digest
+
+
+def stage_key(stage, digests=None):
+    """ Calculate the key of a stage from its command, parameters and the
+    content of its input files.
+
+    Parameters
+    ----------
+    stage : Stage of the pipeline [Stage]\n
+    digests : Known digests of files, see file_digest [dict].
+    Default is None
+
+    Returns
+    -------
+    key : Hexadecimal SHA-256 digest [str]
+
+    """
+    missing = [f for f in stage.inputs if not os.path.isfile(f)]
+    if missing:
+        raise FileNotFoundError('Inputs of stage %s not found: %s'
+                                % (stage.name, ', '.join(missing)))
+    h = hashlib.sha256()
+    h.update(json.dumps([stage.command, stage.env, stage.outputs,
+                         [[f, file_digest(f, digests)] for f in stage.inputs]],
+                        sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def stage_dependencies(stages):
+    """ Find the stages writing the input files of each stage.
+
+    Parameters
+    ----------
+    stages : Stages of the pipeline [list of Stage]
+
+    Returns
+    -------
+    graph : Names of the stages each stage depends on by stage name
+    [dict of set of str]
+
+    """
+    writers = {}
+    for stage in stages:
+        for f in stage.outputs:
+            if f in writers:
+                raise ValueError('%s is written by both %s and %s'
+                                 % (f, writers[f].name, stage.name))
+            writers[f] = stage
+    return {stage.name: {writers[f].name for f in stage.inputs
+                         if f in writers}
+            for stage in stages}
+
+
+def _log(message):
+    # Single write, such that messages of concurrent stages do not mix
+    sys.stdout.write(message + '\n')
+    sys.stdout.flush()
+
+
+def _state_file(state_dir, stage):
+    return os.path.join(state_dir, stage.name.replace(':', '_') + '.json')
+
+
+def _output_stats(stage):
+    return {f: [os.stat(f).st_size, os.stat(f).st_mtime_ns]
+            for f in stage.outputs}
+
+
+def stage_up_to_date(stage, key, state_dir):
+    """ Check if a stage has run with the same key and its outputs are
+    unchanged since.
+
+    Parameters
+    ----------
+    stage : Stage of the pipeline [Stage]\n
+    key : Current key of the stage, see stage_key [str]\n
+    state_dir : Directory of the pipeline state [str]
+
+    Returns
+    -------
+    up_to_date : True if the stage can be skipped [bool]
+
+    """
+    state_file = _state_file(state_dir, stage)
+    if not os.path.isfile(state_file):
+        return False
+    with open(state_file) as f:
+        state = json.load(f)
+    if state['key'] != key:
+        return False
+    if not all(os.path.isfile(f) for f in stage.outputs):
+        return False
+    return state['outputs'] == _output_stats(stage)
+
+
+def run_stage(stage, state_dir, digests=None, force=False, log_file=None):
+    """ Run a stage unless it is up to date.
+
+    Parameters
+    ----------
+    stage : Stage of the pipeline [Stage]\n
+    state_dir : Directory of the pipeline state [str]\n
+    digests : Known digests of files, see file_digest [dict].
+    Default is None\n
+    force : Run the stage even if it is up to date [bool]. Default is False\n
+    log_file : File receiving the output of the command [str].
+    Default is None, where the output is printed
+
+    Returns
+    -------
+    ran : True if the stage was run [bool]
+
+    """
+    key = stage_key(stage, digests)
+    if not force and stage_up_to_date(stage, key, state_dir):
+        _log('<> %s is up to date' % stage.name)
+        return False
+
+    # Remove the state first, such that a failed run is never up to date
+    state_file = _state_file(state_dir, stage)
+    if os.path.isfile(state_file):
+        os.remove(state_file)
+    # Remove the outputs of the previous run, such that commands appending
+    # to their outputs start from empty files
+    for f in stage.outputs:
+        if os.path.isfile(f):
+            os.remove(f)
+    _log('<> Running %s: %s' % (stage.name, ' '.join(stage.command)))
+    env = dict(os.environ, XRCT_NCPUS=str(stage.cpus), **stage.env)
+    if log_file is None:
+        subprocess.run(stage.command, env=env, check=True)
+    else:
+        with open(log_file, 'w') as log:
+            subprocess.run(stage.command, env=env, check=True, stdout=log,
+                           stderr=subprocess.STDOUT)
+
+    missing = [f for f in stage.outputs if not os.path.isfile(f)]
+    if missing:
+        raise RuntimeError('Stage %s did not write: %s'
+                           % (stage.name, ', '.join(missing)))
+    with open(state_file, 'w') as f:
+        json.dump({'key': key, 'outputs': _output_stats(stage)}, f)
+    return True
+
+
+def run_pipeline(stages, state_dir='.pipeline', force=(), max_cpus=1,
+                 max_memory=None):
+    """ Run the stages of a pipeline in dependency order, skipping the
+    stages whose command, parameters and input files are unchanged since
+    their last successful run. Stages whose inputs are ready run
+    concurrently as long as their CPUs and memory fit within the budgets.
+    Ready stages are started in the order of stages, and later stages fill
+    the remaining budgets. The output of each stage is saved to
+    state_dir/<stage name>.log.
+
+    Parameters
+    ----------
+    stages : Stages of the pipeline [list of Stage]\n
+    state_dir : Directory of the pipeline state [str].
+    Default is '.pipeline'\n
+    force : Names of stages, which are run even if they are up to date
+    [list of str]. Default is ()\n
+    max_cpus : Number of CPUs shared by the running stages [int].
+    Default is 1, where the stages run one at a time\n
+    max_memory : Memory in bytes shared by the running stages [int].
+    Default is None, where the memory is not limited
+
+    Returns
+    -------
+    ran : Names of the stages that were run [list of str]
+
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    digest_file = os.path.join(state_dir, 'digests.json')
+    digests = {}
+    if os.path.isfile(digest_file):
+        with open(digest_file) as f:
+            digests = json.load(f)
+    if max_memory is None:
+        max_memory = float('inf')
+
+    graph = stage_dependencies(stages)
+    graphlib.TopologicalSorter(graph).prepare()  # Raise on cycles
+    pending = list(stages)
+    running = {}
+    done, failed, ran = set(), [], []
+    used_cpus = used_memory = 0
+
+    def budget(stage):
+        # Stages larger than the budgets run alone
+        return min(stage.cpus, max_cpus), min(stage.memory, max_memory)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(stages), 1)) as pool:
+            while pending or running:
+                for stage in list(pending):
+                    deps = graph[stage.name]
+                    if deps & set(failed):
+                        # Inputs of the stage are missing
+                        pending.remove(stage)
+                        failed.append(stage.name)
+                        continue
+                    if not deps <= done:
+                        continue
+                    cpus, memory = budget(stage)
+                    if running and (used_cpus + cpus > max_cpus
+                                    or used_memory + memory > max_memory):
+                        continue
+                    pending.remove(stage)
+                    used_cpus += cpus
+                    used_memory += memory
+                    log_file = os.path.join(
+                        state_dir, stage.name.replace(':', '_') + '.log')
+                    future = pool.submit(run_stage, stage, state_dir, digests,
+                                         stage.name in force, log_file)
+                    running[future] = stage
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    cpus, memory = budget(stage)
+                    used_cpus -= cpus
+                    used_memory -= memory
+                    try:
+                        if future.result():
+                            ran.append(stage.name)
+                        done.add(stage.name)
+                    except Exception as e:
+                        _log('<> %s failed: %s' % (stage.name, e))
+                        failed.append(stage.name)
+    finally:
+        with open(digest_file, 'w') as f:
+            json.dump(digests, f)
+
+    if failed:
+        raise RuntimeError('Failed stages: %s. See the logs in %s'
+                           % (', '.join(failed), state_dir))
+    return ran
@@ -58,7 +58,6 @@ for sample_name in ${sample_names[@]}; do
 	
 	##### Generate FE-model and export integration points
 	module load abaqus/2022a
-	sed -e "s/IP1/$sample_name\_IP1/" I1_CubeIP.in > "${sample_name}_IP2.inp"
 	sed -e "s/shell_sample_name/$sample_name/" S2_Cube.py > "${sample_name}_S2_Cube.py"
 	unset SLURM_GTIDS
 	abq2022 cae noGUI="${sample_name}_S2_Cube.py"
@@ -71,12 +70,11 @@ for sample_name in ${sample_names[@]}; do
 	echo "<> Fiber orientations has been mapped to the integration points"
 	
 	##### Run simulation in Abaqus with orientation information mapped to integration points
-	sed "s/InputOrientFortran1/$sample_name\_PHI/;s/InputOrientFortran2/$sample_name\_THETA/" I2_orient.f > "${sample_name}_orient.f"
+	## The ORIENT subroutine ${sample_name}_orient.f is written by S3_mapping.py
 	sed "s/InputModelCase/$sample_name/" S4_Cube_modified.py > "${sample_name}_S4_Cube_modified.py"
 	abq2022 cae noGUI="${sample_name}_S4_Cube_modified.py"
 	
 	##### Postprocessing
-	mv "${sample_name}_IP2.dat" "Out-${sample_name}_INTCOOR.dat"
 	sed -e "s/shell_sample_name/$sample_name/" S5_PostProcessing.py > "${sample_name}_S5_PostProcessing.py"
 	python3 "${sample_name}_S5_PostProcessing.py"
 	echo "<> Postprocessing of Abaqus data complete."
@@ -0,0 +1,220 @@
+import os
+import sys
+
+import nibabel as nib
+import numpy as np
+
+import M5_StructureTensor as M5ST
+import M9_Pipeline as M9PL
+
+# Pipeline runner of the analysis. The stages S1-S5 are run for each sample
+# in dependency order, and stages whose scripts, parameters and input files
+# are unchanged since their last run are skipped. The sample parameters are
+# passed to the scripts as environment variables, and the scripts are run
+# without rendered copies. Stages of different samples run concurrently
+# within the CPU and memory budgets. Load Abaqus (e.g. module load
+# abaqus/2022a) and the Python environment (see S0_main.sh) before running the
+# script.
+
+## Define data names for analysis
+# sample_names = ['A01', 'A01crop', 'A02', 'A02S']
+sample_names = ['A01crop']
+
+# Declare cropping parameters for all datasets in samples_names
+# crop_samples = [200, 0, 200, 200]
+crop_samples = [0]
+
+## Abaqus and Python commands
+ABAQUS = 'abq2022'
+PYTHON = sys.executable
+
+## Mesh generator of S2: 'python' writes the input file directly with
+## S2_CubeInp.py, 'cae' builds the model in Abaqus CAE with S2_Cube.py
+MESHER = 'python'
+
+## Stand-in commands for the Abaqus stages S2 and S4, e.g. for running the
+## pipeline without Abaqus. {sample} is replaced by the sample name. Stand-ins
+## must write the declared outputs of the stage.
+# STAND_INS = {'S2': ['cp', '../standin/{sample}_IP2.dat',
+#                     '../standin/{sample}_CubeModel.cae', '.']}
+STAND_INS = {}
+
+## Stages which are run even if they are up to date, e.g. ['A01crop:S3']
+FORCE = []
+
+## Steps profiled by a sampling profiler by stage, e.g.
+## {'A01crop:S1': 'structure_tensor'}. The profile is saved next to the run
+## report of the stage in ../results/<sample>_files/. Profiled stages rerun.
+PROFILE = {}
+
+## CPUs and memory [bytes] shared by the stages running at once
+MAX_CPUS = os.cpu_count()
+MAX_MEMORY = 0.8 * os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+## CPUs and memory [bytes] of the Abaqus stages. The simulation in
+## S4_Cube_modified.py runs on ABAQUS_CPUS CPUs.
+ABAQUS_CPUS = 16
+ABAQUS_MEMORY = 16e9
+## CPUs of the structure tensor analysis (WORKERS in S1_STanalysis.py). The
+## memory of S1 is estimated from the tomogram with the settings below, which
+## should match S1_STanalysis.py.
+ST_CPUS = 1
+ST_TILE_SIZE = 256
+ST_PRECISION = 'float64'
+ST_PYRAMID_LEVELS = 0
+FIBER_DIAMETER = 7
+## Box averaging of S3_mapping.py, which should match IP_BOX and
+## IP_BOX_TILE_SIZE there. The memory of S3 is estimated from them.
+IP_BOX = None
+IP_BOX_TILE_SIZE = 256
+## Element size of the mesh [micro meters], which should match ElemSize in
+## S2_Cube.py and S2_CubeInp.py. The memory of S2, S3 and S5 is estimated from
+## the number of integration points of the mesh.
+ELEMENT_SIZE = 70
+## Memory of the Python stages [bytes] as a base and an amount per
+## integration point, measured for meshes of 50k-900k integration points
+IP_MEMORY = {'S2': (50e6, 150), 'S3': (150e6, 300), 'S5': (300e6, 400)}
+
+# Abaqus runs in serial mode if SLURM_GTIDS is set
+os.environ.pop('SLURM_GTIDS', None)
+
+
+def stage_memory(sample_name, crop):
+    """ Estimate the memory usage of the Python stages of a sample from the
+    NIfTI header. The number of integration points is estimated from the
+    model dimensions of S1_STanalysis.py and the element size.
+
+    Parameters
+    ----------
+    sample_name : Name of the data set [str]\n
+    crop : Number of voxels cropped from each edge of the tomogram [int]
+
+    Returns
+    -------
+    memory : Memory usage in bytes by stage, e.g. {'S1': 2e9, ...}
+    [dict of int]
+
+    """
+    # Only the header is read
+    nii_file = nib.load(os.path.join('../data', sample_name + '.nii'))
+    shape = [n - 2 * crop for n in nii_file.shape]
+    itemsize = nii_file.get_data_dtype().itemsize
+    voxel_size = nii_file.affine[0, 0]
+    rho = round(FIBER_DIAMETER / voxel_size, 2)
+    sigma = rho / 2
+    memory = {}
+    memory['S1'] = M5ST.st_memory(shape, sigma, rho, tile_size=ST_TILE_SIZE,
+                                  dtype=ST_PRECISION, workers=ST_CPUS,
+                                  data_itemsize=itemsize,
+                                  coarsen=2 if ST_PYRAMID_LEVELS else None)
+
+    # Model dimensions as in S1_STanalysis.py, with PADDING along x
+    kernel_radius, _ = M5ST.st_kernel_radius(sigma, rho)
+    model_dim = (np.array(shape) - 2 * kernel_radius) * voxel_size
+    model_dim[0] += 2 * 140
+    n_ele = np.maximum(1, np.rint(model_dim / ELEMENT_SIZE))
+    n_ip = 27 * int(np.prod(n_ele))
+    for name, (base, per_ip) in IP_MEMORY.items():
+        memory[name] = int(base + per_ip * n_ip)
+    # With IP_BOX the structure tensors are calculated in tiles
+    if IP_BOX is not None:
+        memory['S3'] += M5ST.st_box_memory(shape, sigma, rho,
+                                           tile_size=IP_BOX_TILE_SIZE,
+                                           dtype=ST_PRECISION, n_points=n_ip)
+    return memory
+
+
+def sample_stages(sample_name, crop):
+    """ Stages of the analysis of a sample.
+
+    Parameters
+    ----------
+    sample_name : Name of the data set [str]\n
+    crop : Number of voxels cropped from each edge of the tomogram [int]
+
+    Returns
+    -------
+    stages : Stages of the pipeline [list of M9PL.Stage]
+
+    """
+    env = {'XRCT_SAMPLE_NAME': sample_name, 'XRCT_CROP': str(crop)}
+    commands = {
+        'S1': [PYTHON, 'S1_STanalysis.py'],
+        'S2': ([PYTHON, 'S2_CubeInp.py'] if MESHER == 'python'
+               else [ABAQUS, 'cae', 'noGUI=S2_Cube.py']),
+        'S3': [PYTHON, 'S3_mapping.py'],
+        'S4': [ABAQUS, 'cae', 'noGUI=S4_Cube_modified.py'],
+        'S5': [PYTHON, 'S5_PostProcessing.py']}
+    for name, command in STAND_INS.items():
+        commands[name] = [c.format(sample=sample_name) for c in command]
+
+    map_var = sample_name + '_MAP_VAR.ost'
+    tomo_dim = sample_name + '_TomoDim.txt'
+    ip_dat = sample_name + '_IP2.dat'
+    if MESHER == 'python':
+        model = sample_name + '_CubeModel.inp'
+        s2_inputs = ['S2_CubeInp.py', 'M13_InpMesh.py']
+    else:
+        model = sample_name + '_CubeModel.cae'
+        s2_inputs = ['S2_Cube.py', 'M3_AbqFunctions.py', 'M13_InpMesh.py',
+                     'M15_OdbHistory.py']
+    orient = [sample_name + '_ORIENT.bin', sample_name + '_orient.f']
+    reports = ['Out-' + sample_name + s
+               for s in ['_S_local.out', '_load-disp.out']]
+    memory = stage_memory(sample_name, crop)
+    resources = {'S1': (ST_CPUS, memory['S1']),
+                 'S2': (1, ABAQUS_MEMORY if MESHER == 'cae' else memory['S2']),
+                 'S3': (1, memory['S3']),
+                 'S4': (ABAQUS_CPUS, ABAQUS_MEMORY),
+                 'S5': (1, memory['S5'])}
+    stages = [
+        ('S1', [os.path.join('../data', sample_name + '.nii'),
+                'S1_STanalysis.py', 'M1_TomoHandling.py', 'M2_Alignment.py',
+                'M5_StructureTensor.py', 'M6_ResultCache.py',
+                'M9_Pipeline.py', 'M11_Instrumentation.py',
+                'M12_OrientStore.py'],
+         [map_var, tomo_dim]),
+        ('S2', [tomo_dim] + s2_inputs,
+         [model, ip_dat]),
+        ('S3', [map_var, ip_dat, 'S3_mapping.py', 'M1_TomoHandling.py',
+                'M2_Alignment.py', 'M4_IntegrationPoints.py',
+                'M5_StructureTensor.py', 'M7_OrientTables.py',
+                'M8_AbqReports.py', 'M11_Instrumentation.py',
+                'M12_OrientStore.py', 'I2_orient.f', 'I3_orient_binary.f'],
+         orient),
+        ('S4', [model] + orient + ['S4_Cube_modified.py',
+                                   'M15_OdbHistory.py'],
+         reports),
+        ('S5', [ip_dat, tomo_dim, orient[0]] + reports + [
+            'S5_PostProcessing.py', 'M4_IntegrationPoints.py',
+            'M7_OrientTables.py', 'M8_AbqReports.py',
+            'M11_Instrumentation.py', 'M13_InpMesh.py',
+            'M14_StressRotation.py', 'M16_FieldAggregation.py'],
+         [])]
+    # S4 builds its model from the .cae or .inp file of S2
+    envs = {'S4': dict(env, XRCT_MODEL_FILE=model)}
+    return [M9PL.Stage(sample_name + ':' + name, commands[name], inputs,
+                       outputs, profile_env(sample_name + ':' + name,
+                                            envs.get(name, env)),
+                       *resources[name])
+            for name, inputs, outputs in stages]
+
+
+def profile_env(stage_name, env):
+    # Add the profiled step of a stage to its environment
+    if stage_name in PROFILE:
+        return dict(env, XRCT_PROFILE=PROFILE[stage_name])
+    return env
+
+
+if __name__ == '__main__':
+    stages = []
+    for sample_name, crop in zip(sample_names, crop_samples):
+        ##### Make results folder
+        os.makedirs('../results/' + sample_name + '_files/figures',
+                    exist_ok=True)
+        stages += sample_stages(sample_name, crop)
+
+    M9PL.run_pipeline(stages, state_dir='.pipeline', force=FORCE,
+                      max_cpus=MAX_CPUS, max_memory=MAX_MEMORY)
+    print('<> Pipeline complete')
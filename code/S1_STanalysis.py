@@ -1,18 +1,21 @@
-import nibabel as nib
 import numpy as np
 import os
-
-from structure_tensor import eig_special_3d, structure_tensor_3d
+import sys
 
 import M1_TomoHandling as M1TH
 import M2_Alignment as M2A
+import M5_StructureTensor as M5ST
+import M6_ResultCache as M6RC
+import M11_Instrumentation as M11IN
+import M12_OrientStore as M12OS
 
 
 
 #%%  File names and directory
 # If you are running the script from a python editor like Spyder, then change
-# the sample name to the name of your data set
-sample_name = 'shell_sample_name'
+# the sample name to the name of your data set. S0_pipeline.py sets the sample
+# name and the cropping through the environment.
+sample_name = os.environ.get('XRCT_SAMPLE_NAME', 'shell_sample_name')
 file_name = sample_name + '.nii'
 
 data_path = '../data'
@@ -20,20 +23,24 @@ result_path = '../results/'+sample_name+'_files/figures/'
 
 data_file_path = os.path.join(data_path, file_name)
 
+# Timing and memory of each step are saved to a JSON report. Set the
+# environment variable XRCT_PROFILE to the name of a step, e.g.
+# 'structure_tensor', to profile it.
+M11IN.start_report('../results/'+sample_name+'_files/'+sample_name
+                   +'_S1_report.json', sample_name=sample_name)
+
 # Assign sample material coordinate system [x, y, z] = [length, thickness, width]
 sample_coor_axis = [1, 2, 0]
 
 #%% Load NIfTI data.
-nii_file = nib.load(data_file_path)
-data_full =np.array(nii_file.dataobj[slice(None),slice(None),slice(None)])
-    
-
-# Change the tomogram coordinate system to the material coordinate system
-data_full = np.moveaxis(data_full, [0, 1, 2], sample_coor_axis)  
-
-# Crop data
-crop_edge = shell_crop
-data = M1TH.tomo_crop(data_full, xcut=crop_edge, ycut=crop_edge, zcut=crop_edge)
+# The tomogram is memory-mapped, changed to the material coordinate system and
+# cropped without reading the voxels outside the ROI.
+crop_edge = int(os.environ.get('XRCT_CROP', 'shell_crop'))
+with M11IN.step('load'):
+    nii_file, data = M1TH.tomo_load(data_file_path, sample_coor_axis,
+                                    xcut=crop_edge, ycut=crop_edge,
+                                    zcut=crop_edge)
+    M11IN.log_arrays(data=data)
     
 # Read meta data.
 data_shape = data.shape
@@ -43,104 +50,226 @@ VOXEL_SIZE = nii_file.affine[0, 0]
 # Set known fiber diameter in micro meters.
 FIBER_DIAMETER = 7
 
-# %% Plot all planes
-M1TH.tomo_plot_3(data,
-                x_slice=int(data_shape[0]/2),
-                y_slice=int(data_shape[1]/2),
-                z_slice=int(data_shape[2]/2), 
-                figsize=(12,10),
-                fig_name=sample_name+'_Tomo_fig',
-                fig_path=result_path)
-
 # %% Calculate ST -> S
 # Jeppesen2021
 rho = FIBER_DIAMETER / VOXEL_SIZE
 rho = round(rho, 2)
 sigma = rho / 2
 
-
-# %% In[11]: Structure tensor analysis
-# Copy volume and cast it to 64-bit floating point.
-data_f = data.astype(np.float64)
-
-# Calculate S.
-S = structure_tensor_3d(data_f, sigma, rho)
-
+# The volume is analysed in tiles of TILE_SIZE voxels, which sets the memory
+# usage. Set TILE_SIZE = None to analyse the full volume at once.
+TILE_SIZE = 256
+# Number of processes analysing tiles in parallel. Each worker holds one tile
+# in memory. With TILE_SIZE = None the volume is split into one slab along
+# the x-axis per worker. S0_pipeline.py sets the number of workers through
+# the environment.
+WORKERS = int(os.environ.get('XRCT_NCPUS', 1))
+# Floating point precision of the structure tensor analysis. 'float32' halves
+# the memory usage and a report of the angle errors relative to 'float64' is
+# saved for a central sub-volume.
+PRECISION = 'float64'
+# If IP_ONLY = True the orientations are only evaluated at the integration
+# points in S3_mapping.py, and S1 saves the model dimensions and the
+# structure tensor parameters. The average fiber direction, which is the
+# reference axis of the angles, is then estimated from every
+# IP_ONLY_STRIDE-th tile of IP_ONLY_TILE_SIZE voxels along each axis.
+IP_ONLY = False
+IP_ONLY_TILE_SIZE = 64
+IP_ONLY_STRIDE = 4
+# The orientation angles are saved in chunks of STORE_CHUNKS voxels, which are
+# compressed and read chunk by chunk in S3_mapping.py. STORE_TOLERANCE is the
+# maximum error of the saved angles [degrees]. Set STORE_TOLERANCE = None to
+# save the angles losslessly.
+STORE_CHUNKS = (64, 64, 64)
+STORE_TOLERANCE = None
+# Pyramid of the orientation field for coarse meshes and previews. The
+# structure tensors are averaged over blocks of 2, 4, ..., 2**PYRAMID_LEVELS
+# voxels before the eigen solution, and the angles of each level are saved
+# with the full resolution angles. S3_mapping.py maps the level matching the
+# element size. Set PYRAMID_LEVELS = 0 to skip the pyramid.
+PYRAMID_LEVELS = 0
+# Block size of the pyramid level shown in the overlay plot [voxels]. The
+# full resolution is shown if the level is not in the pyramid.
+PREVIEW_FACTOR = 4
 truncate = 4 
-kernel_radius = int(max(sigma, rho) * truncate + 0.5)
+kernel_radius, halo = M5ST.st_kernel_radius(sigma, rho, truncate)
 print('kernel_radius:', kernel_radius)
+M11IN.report_meta(crop_edge=crop_edge, sigma=sigma, rho=rho,
+                  truncate=truncate, TILE_SIZE=TILE_SIZE, WORKERS=WORKERS,
+                  PRECISION=PRECISION, IP_ONLY=IP_ONLY,
+                  IP_ONLY_TILE_SIZE=IP_ONLY_TILE_SIZE,
+                  IP_ONLY_STRIDE=IP_ONLY_STRIDE,
+                  STORE_CHUNKS=STORE_CHUNKS, STORE_TOLERANCE=STORE_TOLERANCE,
+                  PYRAMID_LEVELS=PYRAMID_LEVELS, PREVIEW_FACTOR=PREVIEW_FACTOR)
+
+# %% Result cache
+# The results are reused if the data file and all parameters are unchanged.
+# Set CACHE_DIR = None to disable the cache.
+CACHE_DIR = '../cache'
+CACHE_SIZE = 50e9  # Maximum size of the cache [bytes]
+result_files = [sample_name+'_TomoDim.txt',
+                sample_name+'_MAP_VAR.ost',
+                result_path+sample_name+'_Tomo_fig.png',
+                result_path+sample_name+'_Misalignment_hist.png',
+                result_path+sample_name+'_Fiber_misalignment_overlay.png']
+if PRECISION != 'float64':
+    result_files.append(sample_name+'_precision_report.txt')
+
+if CACHE_DIR is not None and not IP_ONLY:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with M11IN.step('cache'):
+        st_key = M6RC.cache_key(data_file_path, {
+            'crop_edge': crop_edge, 'sample_coor_axis': sample_coor_axis,
+            'FIBER_DIAMETER': FIBER_DIAMETER, 'sigma': sigma, 'rho': rho,
+            'truncate': truncate, 'PRECISION': PRECISION,
+            'STORE_CHUNKS': STORE_CHUNKS, 'STORE_TOLERANCE': STORE_TOLERANCE,
+            'PYRAMID_LEVELS': PYRAMID_LEVELS,
+            'PREVIEW_FACTOR': PREVIEW_FACTOR},
+            digest_file=os.path.join(CACHE_DIR, 'digests.json'))
+        cache_hit = M6RC.cache_load(CACHE_DIR, st_key, result_files)
+    if cache_hit:
+        sys.exit()
 
-S = S[:, kernel_radius:-kernel_radius, 
-      kernel_radius:-kernel_radius, 
-      kernel_radius:-kernel_radius]
-S.shape
-
-data_s = data_f[kernel_radius:-kernel_radius,
-                kernel_radius:-kernel_radius,
-                kernel_radius:-kernel_radius]
-# Clear some memory.
-del data_f
+# %% Plot all planes
+with M11IN.step('plotting'):
+    M1TH.tomo_plot_3(data,
+                    x_slice=int(data_shape[0]/2),
+                    y_slice=int(data_shape[1]/2),
+                    z_slice=int(data_shape[2]/2), 
+                    figsize=(12,10),
+                    fig_name=sample_name+'_Tomo_fig',
+                    fig_path=result_path)
 
-# %%
-val, vec = eig_special_3d(S, full=False) # 3D
+# %% FE-Model dimensions
+# The boundary region of kernel_radius voxels is removed by the structure
+# tensor analysis.
+PADDING = 2*70
+L_MODEL = (data_shape[0] - 2*kernel_radius)*VOXEL_SIZE + 2 * PADDING
+T_MODEL = (data_shape[1] - 2*kernel_radius)*VOXEL_SIZE
+W_MODEL = (data_shape[2] - 2*kernel_radius)*VOXEL_SIZE 
+   
+MODEL_DIM = [L_MODEL, T_MODEL, W_MODEL]
+MODEL_DIM_FILE = sample_name+'_TomoDim.txt'
+# Save model dimensions to file. The file is used in S2_Cube.py
+with M11IN.step('writing'):
+    np.savetxt(MODEL_DIM_FILE, MODEL_DIM, delimiter=';')
+
+# %% Integration point mode
+# Variables for evaluating the structure tensors at the integration points in
+# S3_mapping.py
+ST_VAR = dict(MAP_SHAPE=[n - 2*kernel_radius for n in data_shape],
+              DATA_FILE=data_file_path, CROP=crop_edge,
+              SAMPLE_COOR_AXIS=sample_coor_axis, SIGMA=sigma, RHO=rho,
+              TRUNCATE=truncate, PRECISION=PRECISION)
+if IP_ONLY:
+    with M11IN.step('alignment'):
+        vec_avg = M5ST.st_average_vector(data, sigma, rho, truncate,
+                                         tile_size=IP_ONLY_TILE_SIZE,
+                                         stride=IP_ONLY_STRIDE,
+                                         dtype=PRECISION)
+    with M11IN.step('writing'):
+        M12OS.write_store(sample_name+'_MAP_VAR.ost',
+                          meta=dict(VOXEL_SIZE=VOXEL_SIZE,
+                                    MODEL_DIM=MODEL_DIM, VEC_AVG=vec_avg,
+                                    **ST_VAR))
+    sys.exit()
 
-del S
-val = val.astype(np.float32)
-vec = vec.astype(np.float32)
+# %% In[11]: Structure tensor analysis
+if PRECISION != 'float64':
+    with M11IN.step('precision_report'):
+        precision_report = M5ST.st_precision_report(data, sigma, rho,
+                                                    truncate, dtype=PRECISION)
+    with open(sample_name+'_precision_report.txt', 'w') as f:
+        for key, value in precision_report.items():
+            f.write('%s: %s\n' % (key, value))
 
 # Smallest eigenvalue corresponds to predominant direction i.e., fiber direction.
-# Eigenvectors are returned as vec=[z,y,x], this is flipped back to vec=[x,y,z]
-vec = np.flip(vec, axis=[0])
-
 # Eigenvectors desribe the dominant material orientation. This is not a unique 
 # direction as an opposite vector share the same orientation as the eigenvector.
 # This will cause a noise appearance in the visualization of material orientations.
-# All eigenvectors are thus multiplied with the sign og the x-component to align
-# the vectors in the positive x-direction.
-vec_r = vec * np.sign(vec[0])
+# All eigenvectors are thus aligned in the positive x-direction.
+# The structure tensor and eigen solution of each tile are recorded as the
+# steps structure_tensor and eigen. For the pyramid the structure tensors of
+# each tile are also averaged over blocks of 2 voxels (S_coarse).
+with M11IN.step('orientation'):
+    vec_r, theta, phi, *S_coarse = M5ST.st_orientation(
+        data, sigma, rho, truncate=truncate, tile_size=TILE_SIZE,
+        dtype=PRECISION, workers=WORKERS,
+        coarsen=2 if PYRAMID_LEVELS else None)
+    M11IN.log_arrays(vec=vec_r, theta=theta, phi=phi)
+
+data_s = data[kernel_radius:-kernel_radius,
+              kernel_radius:-kernel_radius,
+              kernel_radius:-kernel_radius]
 
 # %% Calculate orientations
-# Calculate fiber mialignment (Azimuth and elevation angles)
-theta, phi = M2A.st_misalign(vec_r)
-
 # The global fiber orientation may not be aligned with the global material 
 # coordinate system. All eigenvectors may thus be rotated to a new reference axis.
 # Rotate all vectors to reference axis 
-vec_new = M2A.orient_average(vec_r)
-
-# Calculate fiber mialignment for new reference axis (Azimuth and elevation angles)
-theta_new, phi_new = M2A.st_misalign(vec_new)
+# The histogram, means and average vector are collected in one pass.
+with M11IN.step('alignment'):
+    phi_stats = M2A.orient_stats(phi, bins=360, limits=5, vec=vec_r)
+    R = M2A.orient_rotation(phi_stats.vec_avg)
+
+    # Calculate fiber mialignment for new reference axis (Azimuth and elevation angles)
+    # The vectors are rotated chunk by chunk, and the angles overwrite the angles
+    # of the original reference axis, which are only used through phi_stats.
+    phi_new_stats = M2A.OrientStats(bins=360, limits=5)
+    vec_r, theta_new, phi_new = M2A.orient_angles(vec_r, R, theta=theta,
+                                                  phi=phi, stats=phi_new_stats)
+
+# %% Orientation pyramid
+# The fiber directions of each level are rotated to the same reference axis
+# as the full resolution field.
+pyramid = {}
+if PYRAMID_LEVELS:
+    with M11IN.step('pyramid'):
+        for factor, vec_level in M5ST.st_pyramid(S_coarse[0], phi_new.shape, 2,
+                                                 PYRAMID_LEVELS):
+            _, pyramid['theta_%d' % factor], pyramid['phi_%d' % factor] = (
+                M2A.orient_angles(vec_level, R))
+    del S_coarse, vec_level
 
 # - Histogram of orientation before and after correcting global alignment
-M2A.plot_hist(phi, phi_new, limits=5, bins=360, alpha=0.5,
-              fig_name=sample_name+'_Misalignment_hist' , fig_path=result_path)
+with M11IN.step('plotting'):
+    M2A.plot_hist(phi_stats, phi_new_stats, alpha=0.5,
+                  fig_name=sample_name+'_Misalignment_hist',
+                  fig_path=result_path)
 
 # %% - Overlay plot of fiber misalignment
 SI = 50  # Slice of interest
-M2A.fig_with_colorbar(
-    data_s[:, :, SI].T,
-    phi_new[:, :, SI].T,
-    'Fiber misalignment relative to global fiber direction',
-    cmap='coolwarm',
-    alpha=0.5,
-    vmin=-10,
-    vmax=10,
-    fig_name=sample_name+'_Fiber_misalignment_overlay',
-    fig_path=result_path)
-
-# %% FE-Model dimensions
-PADDING = 2*70
-L_MODEL = len(data_s[:,0,0])*VOXEL_SIZE + 2 * PADDING
-T_MODEL = len(data_s[0,:,0])*VOXEL_SIZE
-W_MODEL = len(data_s[0,0,:])*VOXEL_SIZE 
-   
-MODEL_DIM = [L_MODEL, T_MODEL, W_MODEL]
-MODEL_DIM_FILE = sample_name+'_TomoDim.txt'
-# Save model dimensions to file. The file is used in S2_Cube.py
-np.savetxt(MODEL_DIM_FILE, MODEL_DIM, delimiter=';')
-
+preview = PREVIEW_FACTOR if 'phi_%d' % PREVIEW_FACTOR in pyramid else 1
+phi_preview = pyramid.get('phi_%d' % preview, phi_new)
+with M11IN.step('plotting'):
+    M2A.fig_with_colorbar(
+        data_s[:, :, SI].T,
+        phi_preview[:, :, SI // preview].T,
+        'Fiber misalignment relative to global fiber direction',
+        cmap='coolwarm',
+        alpha=0.5,
+        vmin=-10,
+        vmax=10,
+        factor=preview,
+        fig_name=sample_name+'_Fiber_misalignment_overlay',
+        fig_path=result_path)
 
 # %% Save variables and constants for mapping orientations to integration 
-# Variables for S3_mapping.py
-np.savez(sample_name+'_MAP_VAR.npz', VOXEL_SIZE=VOXEL_SIZE, 
-         MODEL_DIM=MODEL_DIM, phi=phi_new, theta=theta_new)
\ No newline at end of file
+# Variables for S3_mapping.py. The angles are saved in compressed chunks
+# together with the pyramid levels (phi_2, theta_2, phi_4, ...). The average
+# fiber direction (VEC_AVG) sets the reference axis of the angles, which
+# S3_mapping.py also uses for angles evaluated at the integration points.
+with M11IN.step('writing'):
+    M12OS.write_store(sample_name+'_MAP_VAR.ost',
+                      {'phi': phi_new, 'theta': theta_new, **pyramid},
+                      meta=dict(VOXEL_SIZE=VOXEL_SIZE, MODEL_DIM=MODEL_DIM,
+                                PYRAMID=[2**k for k in
+                                         range(1, PYRAMID_LEVELS + 1)],
+                                VEC_AVG=phi_stats.vec_avg, **ST_VAR),
+                      chunks=STORE_CHUNKS, tolerance=STORE_TOLERANCE,
+                      workers=WORKERS)
+
+# %% Store results in the cache
+if CACHE_DIR is not None:
+    with M11IN.step('cache'):
+        M6RC.cache_store(CACHE_DIR, st_key, result_files,
+                         max_size=CACHE_SIZE)
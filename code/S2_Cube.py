@@ -18,13 +18,15 @@ from sketch import *
 from visualization import *
 from connectorBehavior import *
 ########################################################
+import os
 import numpy as np
 import M3_AbqFunctions as M3AF   
+import M13_InpMesh as M13IM
 ########################################################
 
 ### Parameters
 ### Load parameters from Tomogram
-sample_name = 'shell_sample_name'
+sample_name = os.environ.get('XRCT_SAMPLE_NAME', 'shell_sample_name')
 dim = np.loadtxt(sample_name+'_TomoDim.txt')
 LENGTH = dim[0]*1e-3
 THICKNESS = dim[1]*1e-3
@@ -100,6 +102,10 @@ modelObj.DisplacementBC(amplitude=UNSET, createStepName='Step-1',
 ### Field Output
 modelObj.FieldOutputRequest(createStepName='Step-1', name=
     'F-Output-1', variables=('S', 'U'))
+# Displacements and reaction forces of x1 at every increment, which are read
+# in bulk for the load-displacement curve in S4_Cube_modified.py
+modelObj.FieldOutputRequest(createStepName='Step-1', name=
+    'F-Output-2', region=instanceObj.sets['x1'], variables=('RF', 'U'))
 
 ### History output
 modelObj.HistoryOutputRequest(createStepName='Step-1', name=
@@ -118,30 +124,9 @@ mdb.Job(atTime=None, contactPrint=OFF, description='', echoPrint=OFF,
 mdb.jobs[NameModel].writeInput(consistencyChecking=OFF) 
 mdb.saveAs(pathName=NameModel+'.cae')
 
-with open(NameModel + '.inp') as f:
-    lines = f.readlines()
-
-def find_line(lines, word):
-    for line in lines:
-        if line.find(word) !=-1:
-            return lines.index(line)
-
-W_START = '*Part, name=Part-1'
-I_START = find_line(lines, W_START) + 1
-W_END = '*Orientation, name=Ori-1, system=user'
-I_END = find_line(lines, W_END)
-
-new_lines = lines[I_START : I_END]
-new_lines.append('** Section: Section-1\n')
-new_lines.append('*Solid Section, elset=Cube, material=Default MATERIAL\n')
-new_lines.append(',\n')
-
-with open(sample_name+'_IP1.inp', 'w') as f:
-    for line in new_lines:
-        f.write(line)
-    f.close()
-    
-IP2 = sample_name+'_IP2'
-JOB1 = mdb.JobFromInputFile(name=IP2, inputFileName=IP2+'.inp')
-JOB1.submit()
-JOB1.waitForCompletion()
+# Integration point coordinates of the mesh in the part coordinate system,
+# in the layout of an Abaqus .dat file with *El Print COORD. The coordinates
+# are calculated from the nodes and the C3D20 shape functions of the input
+# file, such that no Abaqus job is needed.
+M13IM.inp_ip_table(NameModel + '.inp', sample_name+'_IP2.dat',
+                   part_name='Part-1')
@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import M13_InpMesh as M13IM
+
+# Pure Python version of S2_Cube.py, which needs no Abaqus CAE. The structured
+# C3D20 mesh of M3_AbqFunctions.AbqCubeMesh, the sets of
+# M3_AbqFunctions.AbqCubeSet and the model of S2_Cube.py are written directly
+# to the input file <sample>_CubeModel.inp, from which S4_Cube_modified.py
+# builds the model when XRCT_MODEL_FILE is the input file.
+
+### Parameters
+### Load parameters from Tomogram
+sample_name = os.environ.get('XRCT_SAMPLE_NAME', 'shell_sample_name')
+dim = np.loadtxt(sample_name+'_TomoDim.txt')
+LENGTH = dim[0]*1e-3
+THICKNESS = dim[1]*1e-3
+WIDTH = dim[2]*1e-3
+ElemSize = 70*1e-3
+
+NameModel = sample_name+'_CubeModel'
+x0 = -LENGTH/2.0; x1 = LENGTH/2.0; y0 = -THICKNESS/2.0 ; y1 = THICKNESS/2.0
+Disp = 0.01
+
+### Material Definition
+E11, E22, E33 = 134353, 15062, 15062
+nu12, nu13, nu23 = 0.313, 0.313, 0.4
+G12, G13, G23 = 2555, 2555, 3617
+
+########################################################
+### Meshing
+node_ids, node_coords, ele_ids, connectivity, sets = M13IM.cube_mesh(
+    x0, x1, y0, y1, WIDTH, ElemSize)
+print('<> %d nodes and %d C3D20 elements' % (len(node_ids), len(ele_ids)))
+
+### Input file with the part, assembly, material, BCs and step of S2_Cube.py.
+### The section uses the user material orientation of the ORIENT subroutine.
+with open(NameModel + '.inp', 'wb') as f:
+    f.write(('*Heading\n'
+             '** Job name: %s Model name: %s\n'
+             '** Generated by: S2_CubeInp.py\n'
+             '*Preprint, echo=NO, model=NO, history=NO, contact=NO\n'
+             '**\n** PARTS\n**\n'
+             '*Part, name=Part-1\n' % (NameModel, NameModel)).encode('ascii'))
+    M13IM.write_mesh(f, node_ids, node_coords, 'C3D20', ele_ids,
+                     connectivity, sets)
+    f.write(('*Orientation, name=Ori-1, system=user\n'
+             '** Section: Section-1\n'
+             '*Solid Section, elset=Cube, orientation=Ori-1, '
+             'material=Material-1\n'
+             ',\n'
+             '*End Part\n'
+             '**\n** ASSEMBLY\n**\n'
+             '*Assembly, name=Assembly\n'
+             '**\n'
+             '*Instance, name=Part-1-1, part=Part-1\n'
+             '0., 0., %.12g\n'
+             '*End Instance\n'
+             '**\n'
+             '*End Assembly\n'
+             '**\n** MATERIALS\n**\n'
+             '*Material, name=Material-1\n'
+             '*Elastic, type=ENGINEERING CONSTANTS\n'
+             '%.12g, %.12g, %.12g, %.12g, %.12g, %.12g, %.12g, %.12g\n'
+             '%.12g,\n'
+             '**\n** BOUNDARY CONDITIONS\n**\n'
+             '** Name: BC-1 Type: Displacement/Rotation\n'
+             '*Boundary\n'
+             'Part-1-1.x0, 1, 1\n'
+             '** Name: BC-2 Type: Displacement/Rotation\n'
+             '*Boundary\n'
+             'Part-1-1.xz0, 3, 3\n'
+             '** Name: BC-3 Type: Displacement/Rotation\n'
+             '*Boundary\n'
+             'Part-1-1.xy0, 2, 2\n'
+             '** ----------------------------------------------------------\n'
+             '**\n** STEP: Step-1\n**\n'
+             '*Step, name=Step-1, nlgeom=NO\n'
+             '*Static\n'
+             '0.01, 1., 1e-05, 0.01\n'
+             '**\n** BOUNDARY CONDITIONS\n**\n'
+             '** Name: BC-5 Type: Displacement/Rotation\n'
+             '*Boundary\n'
+             'Part-1-1.x1, 1, 1, %.12g\n'
+             '**\n** OUTPUT REQUESTS\n**\n'
+             '*Restart, write, frequency=0\n'
+             '**\n** FIELD OUTPUT: F-Output-1\n**\n'
+             '*Output, field\n'
+             '*Node Output\n'
+             'U,\n'
+             '*Element Output, directions=YES\n'
+             'S,\n'
+             '**\n** FIELD OUTPUT: F-Output-2\n**\n'
+             '*Output, field\n'
+             '*Node Output, nset=Part-1-1.x1\n'
+             'RF, U\n'
+             '**\n** HISTORY OUTPUT: H-Output-1\n**\n'
+             '*Output, history\n'
+             '*Node Output, nset=Part-1-1.x1\n'
+             'RF1, U1\n'
+             '*End Step\n'
+             % (-WIDTH/2.0, E11, E22, E33, nu12, nu13, nu23, G12, G13, G23,
+                Disp)).encode('ascii'))
+
+# Integration point coordinates of the mesh in the part coordinate system,
+# in the layout of an Abaqus .dat file with *El Print COORD
+ip_ele_ids, ip_ids, ip_coords = M13IM.ip_coordinates(
+    node_ids, node_coords, ele_ids, connectivity)
+M13IM.write_ip_table(sample_name+'_IP2.dat', ip_ele_ids, ip_ids, ip_coords)
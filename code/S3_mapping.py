@@ -1,36 +1,55 @@
 import numpy as np
-import pandas as pd
-from scipy import ndimage
+import os
 
+import M1_TomoHandling as M1TH
+import M2_Alignment as M2A
 import M4_IntegrationPoints as M4IP
+import M5_StructureTensor as M5ST
+import M7_OrientTables as M7OT
+import M8_AbqReports as M8AR
+import M11_Instrumentation as M11IN
+import M12_OrientStore as M12OS
 
-sample_name = 'shell_sample_name' 
-MAP_VAR = np.load(sample_name+'_MAP_VAR.npz')
+sample_name = os.environ.get('XRCT_SAMPLE_NAME', 'shell_sample_name')
+# Timing and memory of each step are saved to a JSON report
+M11IN.start_report('../results/'+sample_name+'_files/'+sample_name
+                   +'_S3_report.json', sample_name=sample_name)
+# Only the metadata of the orientation store is read here. The chunks of the
+# orientation angles are read when the integration points are mapped.
+MAP_STORE = M12OS.OrientStore(sample_name+'_MAP_VAR.ost')
+MAP_VAR = MAP_STORE.meta
 VOXEL_SIZE = MAP_VAR['VOXEL_SIZE'] 
 MODEL_DIM = MAP_VAR['MODEL_DIM'] # Length, Thickness, Width
 W_MODEL = MODEL_DIM[2]
-phi = MAP_VAR['phi']
-theta = MAP_VAR['theta']
+MAP_SHAPE = MAP_VAR['MAP_SHAPE']
+# If S1_STanalysis.py was run with IP_ONLY = True, then the orientations are
+# evaluated at the integration points only.
+IP_ONLY = 'phi' not in MAP_STORE
+# Edge length in voxels of the box over which the structure tensors are
+# averaged for each integration point. If None the orientation of the nearest
+# voxel is used. The structure tensors are calculated in tiles of
+# IP_BOX_TILE_SIZE voxels, which sets the memory usage.
+IP_BOX = None
+IP_BOX_TILE_SIZE = 256
+# Block size of the pyramid level of the orientation field, which is mapped
+# [voxels]. If None, the coarsest level saved by S1_STanalysis.py
+# (PYRAMID_LEVELS) with blocks no larger than the integration point spacing
+# of elements of ELEMENT_SIZE is used. Set MAP_FACTOR = 1 to map the full
+# resolution field.
+MAP_FACTOR = None
+ELEMENT_SIZE = 70  # [micro meters], see ElemSize in S2_Cube.py
+if MAP_FACTOR is None:
+    # C3D20 elements have 3 integration points along each edge
+    MAP_FACTOR = max([1] + [f for f in MAP_VAR.get('PYRAMID', [])
+                            if f * VOXEL_SIZE <= ELEMENT_SIZE / 3])
 
-result_path = '../results/shell_sample_name_files/figures/'
+result_path = '../results/'+sample_name+'_files/figures/'
 
 # %% Import integration points
-with open(sample_name+'_IP2.dat', 'r', encoding='cp1257') as f:
-    lines = f.readlines()
-
-# Get start of integration point (IP) list.
-# Get number of first line that contains...
-start_ip = next(i for i, line in enumerate(lines) if 'THE FOLLOWING TABLE IS PRINTED AT THE INTEGRATION POINTS FOR ELEMENT TYPE' in line)
-start_ip += 6  # Add offset.
-# Find stop of IPs.
-# Get the first line searching backwards that contains...
-end_ip = len(lines) - next(i for i, line in enumerate(lines[::-1]) if 'THE ANALYSIS HAS BEEN COMPLETED' in line)
-end_ip -= 3  # Subtract offset.
-
-# Get IP lines.
-ip_lines = lines[start_ip:end_ip]
 # Create array with IPs.
-ip_coords = np.array([l.split() for l in ip_lines], dtype=float)
+with M11IN.step('parsing'):
+    ip_coords = M8AR.abq_table(sample_name+'_IP2.dat', *M8AR.DAT_IP_TABLE)
+    M11IN.log_arrays(ip_coords=ip_coords)
 ip_indices = ip_coords[:, :2].astype(int)
 ip_coords = ip_coords[:, 2:]
 
@@ -41,27 +60,70 @@ ip_data_coords = ip_coords / voxel_size_mm
 # Translate so that origo becomes center of slice.
 # If slice is 2x2 the new center is at (0.5, 0.5), halfway between indices 0 and 1.
 ip_data_coords[:,2] -= W_MODEL / VOXEL_SIZE /  2 
-ip_data_coords[:,[0,1,2]] += (np.array([phi.shape]) / 2)
+ip_data_coords[:,[0,1,2]] += (np.array([MAP_SHAPE]) / 2)
 # ip_data_coords[:,[0,1,2]] += (np.array([len(phi[:]),0,len(phi[0,0,:])]) / 2)
 # Get orientation values at the coordinates using nearest neighbor interpolation (order=0).
 # Values outside the data are set to 0.
-ip_theta = ndimage.map_coordinates(theta, ip_data_coords.T, order=0, cval=np.nan)
-ip_phi = ndimage.map_coordinates(phi, ip_data_coords.T, order=0, cval=np.nan)
+# Only the chunks of the store containing integration points are read.
+# Block j of a pyramid level covers the voxels j*MAP_FACTOR to
+# (j+1)*MAP_FACTOR - 1.
+with M11IN.step('mapping'):
+    if not IP_ONLY and IP_BOX is None and MAP_FACTOR > 1:
+        print('Mapping pyramid level of %d voxel blocks' % MAP_FACTOR)
+        ip_phi, ip_theta = MAP_STORE.sample(
+            ['phi_%d' % MAP_FACTOR, 'theta_%d' % MAP_FACTOR],
+            (ip_data_coords + 0.5) / MAP_FACTOR - 0.5)
+    elif not IP_ONLY and IP_BOX is None:
+        ip_phi, ip_theta = MAP_STORE.sample(['phi', 'theta'], ip_data_coords)
+    else:
+        # Nearest voxel of each integration point with the same interpolation
+        # as above. Points outside the data are NaN.
+        ip_voxels, inside = M12OS.nearest_voxels(ip_data_coords, MAP_SHAPE)
 
-# %% 3D scatter
-M4IP.Int_point_plotting(ip_coords, ip_phi, Nplots=1, unit='$^\circ$', 
-                        variable='$\phi$',
-                        fig_name=sample_name+'_IP-3D misalignment',
-                        fig_path=result_path)
+        # Structure tensor analysis at the voxels of the integration points, or
+        # averaged over a box around them.
+        sigma, rho = float(MAP_VAR['SIGMA']), float(MAP_VAR['RHO'])
+        truncate = float(MAP_VAR['TRUNCATE'])
+        crop_edge = int(MAP_VAR['CROP'])
+        kernel_radius, halo = M5ST.st_kernel_radius(sigma, rho, truncate)
+        nii_file, data = M1TH.tomo_load(str(MAP_VAR['DATA_FILE']),
+                                        list(MAP_VAR['SAMPLE_COOR_AXIS']),
+                                        xcut=crop_edge, ycut=crop_edge,
+                                        zcut=crop_edge)
+        if IP_BOX is None:
+            ip_vec = M5ST.st_points(data, ip_voxels + kernel_radius, sigma, rho,
+                                    truncate, dtype=str(MAP_VAR['PRECISION']))
+        else:
+            ip_vec = M5ST.st_box_points(data, ip_voxels, IP_BOX, sigma, rho,
+                                        truncate, tile_size=IP_BOX_TILE_SIZE,
+                                        dtype=str(MAP_VAR['PRECISION']))
 
+        # The vectors are rotated to the reference axis of the average fiber
+        # direction of the volume saved by S1_STanalysis.py, such that the
+        # angles match the angles mapped from the orientation field. With
+        # IP_ONLY the average is estimated by S1 from a subset of the volume.
+        # Without it, the average is estimated from the integration points.
+        vec_avg = MAP_VAR.get('VEC_AVG')
+        if vec_avg is None:
+            print('VEC_AVG not in %s_MAP_VAR.ost, the reference axis is the '
+                  'average fiber direction of the integration points'
+                  % sample_name)
+        else:
+            vec_avg = np.asarray(vec_avg, dtype=float)
+        ip_vec = M2A.orient_average(ip_vec, vec_avg=vec_avg)
+        ip_theta = np.full(len(ip_coords), np.nan)
+        ip_phi = np.full(len(ip_coords), np.nan)
+        ip_theta[inside], ip_phi[inside] = M2A.st_misalign(ip_vec)
 
-# %% Create dataframe for easy group iteration.
-df = pd.DataFrame(ip_indices, columns=['ele_id', 'ip_id'])
+# %% 3D scatter
+with M11IN.step('plotting'):
+    M4IP.Int_point_plotting(ip_coords, ip_phi, Nplots=1, unit='$^\circ$', 
+                            variable='$\phi$',
+                            fig_name=sample_name+'_IP-3D misalignment',
+                            fig_path=result_path, max_points=200000)
 
-# Get max ids.
-element_max_index = df['ele_id'].max()
-ip_max_index = df['ip_id'].max()
 
+# %% Write orientation tables for the ORIENT subroutine.
 # Set NaN values to zero.
 ip_phi_out = ip_phi.copy()
 ip_phi_out[np.isnan(ip_phi_out)] = 0
@@ -69,28 +131,30 @@ ip_phi_out[np.isnan(ip_phi_out)] = 0
 ip_theta_out = ip_theta.copy()
 ip_theta_out[np.isnan(ip_theta_out)] = 0
 
-# Set phi and theta values.
-df['PHI'] = np.radians(ip_phi_out)
-df['THETA'] = np.radians(ip_theta_out)
+ip_tables = {'PHI': np.radians(ip_phi_out), 'THETA': np.radians(ip_theta_out)}
+
+# Binary table read at runtime by the ORIENT subroutine in I3_orient_binary.f
+with M11IN.step('writing'):
+    M7OT.write_binary_table(sample_name+'_ORIENT.bin', ip_indices[:, 0],
+                            ip_indices[:, 1], ip_tables)
+
+# Set FORTRAN_TABLES = True to write <sample_name>_PHI.f and
+# <sample_name>_THETA.f, which are included in I2_orient.f.
+FORTRAN_TABLES = False
+if FORTRAN_TABLES:
+    with M11IN.step('writing'):
+        M7OT.write_fortran_tables(sample_name, ip_indices[:, 0],
+                                  ip_indices[:, 1], ip_tables)
 
-for column in df.columns[2:]:
-    # Open writable file.
-    with open(f'{sample_name}_{column}.f', 'w') as output:
-        # Write header.
-        output.write(f'      real*8 {column}0({ip_max_index},{element_max_index})\n')
-    
-        # For each element...
-        for ele_id, group in df.groupby('ele_id'):
-            ip_ids = group['ip_id']
-            # Create element header.
-            line = f'      DATA ({column}0(I,{ele_id}), I={ip_ids.min()},{ip_ids.max()})/ '
-            # Get phis for the element.
-            angles = [f'{angle:.6f}' for angle in group[column]]
-            for i in range(3, len(angles), 3):
-                # Only have three phis per line.
-                angles[i] = '\n     &  ' + angles[i]
-            # Add commas.
-            line += ', '.join(angles)
-    
-            output.write(line + '/\n')
-            
\ No newline at end of file
+# ORIENT subroutine of the sample, which is compiled by S4_Cube_modified.py
+if FORTRAN_TABLES:
+    with open('I2_orient.f') as f:
+        orient_source = (f.read()
+                         .replace('InputOrientFortran1', sample_name+'_PHI')
+                         .replace('InputOrientFortran2', sample_name+'_THETA'))
+else:
+    with open('I3_orient_binary.f') as f:
+        orient_source = f.read().replace('InputOrientBinary',
+                                         sample_name+'_ORIENT')
+with open(sample_name+'_orient.f', 'w') as f:
+    f.write(orient_source)
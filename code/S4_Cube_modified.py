@@ -17,22 +17,29 @@ from job import *
 from sketch import *
 from visualization import *
 from connectorBehavior import *
+import os
 
 
 ## Model in names
-ModelCase='InputModelCase'
+ModelCase=os.environ.get('XRCT_SAMPLE_NAME', 'InputModelCase')
 NameCAE=ModelCase+'_CubeModel.cae'
 NameModelin=ModelCase+'_CubeModel'
 NameModel='Out-'+ModelCase
 freq = 10
 ## Other run parameters
-Ncpus=16
+Ncpus=int(os.environ.get('XRCT_NCPUS', 16))
 UserRoutine=ModelCase+'_orient.f'
 
-## Import model from other cae-file
-mdb.openAuxMdb(pathName=NameCAE)
-mdb.copyAuxMdbModel(fromName=NameModelin, toName=NameModel)
-mdb.closeAuxMdb()
+## Model of S2_Cube.py (.cae) or S2_CubeInp.py (.inp)
+ModelFile=os.environ.get('XRCT_MODEL_FILE', NameCAE)
+if ModelFile.endswith('.inp'):
+    ## Import model from input file
+    mdb.ModelFromInputFile(inputFileName=ModelFile, name=NameModel)
+else:
+    ## Import model from other cae-file
+    mdb.openAuxMdb(pathName=ModelFile)
+    mdb.copyAuxMdbModel(fromName=NameModelin, toName=NameModel)
+    mdb.closeAuxMdb()
 
 ## Delete default model
 del mdb.models['Model-1']
@@ -58,15 +65,7 @@ modelJob.waitForCompletion()
 import numpy as np
 from odbAccess import *
 from abaqusConstants import *
-
-def BCout(Nset,step1,BCstr):
-    Ndisp = 0.0
-    Nlen = len(Nset.nodes)
-    for i in range(Nlen):
-        histPointN=HistoryPoint(node=Nset.nodes[i])
-        NHistory=step1.getHistoryRegion(point=histPointN)
-        Ndisp=Ndisp+np.array(NHistory.historyOutputs[BCstr].data)[:,1]
-    return Ndisp
+import M15_OdbHistory as M15OH
 
 ################# Postprocessing ODB ##########################
 odbObj = session.openOdb(name=NameModel+'.odb', readOnly=False)
@@ -76,33 +75,28 @@ vps.setValues(displayedObject=odbObj)
 
 ### Calculate u1 and rf1 along x1 and from this the Emod
 x1set = odbObj.rootAssembly.instances['PART-1-1'].nodeSets['X1']
-x1len = len(x1set.nodes)
-x1U1=BCout(x1set,step1,BCstr='U1')/x1len
-x1RF1=BCout(x1set,step1,BCstr='RF1')
+# Field output of all nodes of x1 at each frame [nodes x frames], requested
+# at every increment by F-Output-2 of S2_Cube.py and S2_CubeInp.py
+times, x1hist, x1labels = M15OH.node_set_histories(step1, x1set,
+                                                   ('U1', 'RF1'))
+x1U1=x1hist['U1'].mean(axis=0)
+x1RF1=x1hist['RF1'].sum(axis=0)
 
 ### Save full history output
 histData = np.vstack((x1U1,x1RF1)).T
 np.savetxt(NameModel+'_load-disp.out',histData)
 
 ### Save Field output
-session.writeFieldReport(fileName=NameModel+'_S_local.out', append=ON, 
-    sortItem='Element Label', odb=odbObj, step=0, frame=vps.odbDisplay.fieldFrame[-1], 
-    outputPosition=INTEGRATION_POINT, variable=(('S', INTEGRATION_POINT, ((
-    COMPONENT, 'S11'), (COMPONENT, 'S22'), (COMPONENT, 'S12'), )), ), 
-    stepFrame=SPECIFY)
-
-scratchOdb = session.ScratchOdb(odbObj)
-scratchOdb.rootAssembly.DatumCsysByThreePoints(name='CSYS-1', 
-    coordSysType=CARTESIAN, origin=(0.0, 0.0, 0.0), point1=(1.0, 0.0, 0.0), 
-    point2=(0.0, 1.0, 0.0))
-dtm = scratchOdb.rootAssembly.datumCsyses['CSYS-1']
-session.viewports['Viewport: 1'].odbDisplay.basicOptions.setValues(
-    transformationType=USER_SPECIFIED, datumCsys=dtm)
-
-session.writeFieldReport(fileName=NameModel+'_S_global.out', append=ON, 
+# All stress components in the local material systems. The global stresses
+# are calculated from them and the orientation table in S5_PostProcessing.py.
+# The report of a previous run is replaced, as S5 parses the first table.
+if os.path.isfile(NameModel+'_S_local.out'):
+    os.remove(NameModel+'_S_local.out')
+session.writeFieldReport(fileName=NameModel+'_S_local.out', append=OFF, 
     sortItem='Element Label', odb=odbObj, step=0, frame=vps.odbDisplay.fieldFrame[-1], 
     outputPosition=INTEGRATION_POINT, variable=(('S', INTEGRATION_POINT, ((
-    COMPONENT, 'S11'), (COMPONENT, 'S22'), (COMPONENT, 'S12'), )), ), 
+    COMPONENT, 'S11'), (COMPONENT, 'S22'), (COMPONENT, 'S33'),
+    (COMPONENT, 'S12'), (COMPONENT, 'S13'), (COMPONENT, 'S23'), )), ), 
     stepFrame=SPECIFY)
     
 odbObj.save()
\ No newline at end of file
@@ -1,81 +1,127 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import os
 
 import M4_IntegrationPoints as M4IP
-
-sample_name = 'shell_sample_name'
-result_path = '../results/shell_sample_name_files/figures/'
-
-# %%
-def load_AbqData(file_name, start_line, end_line, start_offset, end_offset):
-    with open(file_name, 'r', encoding='cp1257') as f:
-        lines = f.readlines()
-    
-    # Get start of integration point (IP) list.
-    # Get number of first line that contains...
-    start_ip = next(i for i, line in enumerate(lines) if start_line in line)
-    start_ip += start_offset  # Add offset.
-    # Find stop of IPs.
-    # Get the first line searching backwards that contains...
-    end_ip = len(lines) - next(i for i, line in enumerate(lines[::-1]) if end_line in line)
-    end_ip -= end_offset  # Subtract offset.
-    
-    # Get IP lines.
-    ip_lines = lines[start_ip:end_ip]
-    # Create array with IPs.
-    ip_data = np.array([l.split() for l in ip_lines], dtype=float)
-    # ip_indices = ip_coords[:, :2].astype(int)
-    ip_data = ip_data[:, 2:]
-    return ip_data
-
+import M8_AbqReports as M8AR
+import M11_Instrumentation as M11IN
+import M13_InpMesh as M13IM
+import M14_StressRotation as M14SR
+import M16_FieldAggregation as M16FA
+
+sample_name = os.environ.get('XRCT_SAMPLE_NAME', 'shell_sample_name')
+result_path = '../results/'+sample_name+'_files/figures/'
+# Timing and memory of each step are saved to a JSON report
+M11IN.start_report('../results/'+sample_name+'_files/'+sample_name
+                   +'_S5_report.json', sample_name=sample_name)
+
+# The tables are parsed once and saved as .npy files next to the Abaqus
+# files, which are memory-mapped on later runs while the files are unchanged
+REPORT_CACHE = True
 
 # %% Load integration point coordinates
-ip_coords = load_AbqData(file_name='Out-'+sample_name+'_INTCOOR.dat', 
-                         start_line='THE FOLLOWING TABLE IS PRINTED AT THE INTEGRATION POINTS FOR ELEMENT TYPE',
-                         end_line='THE ANALYSIS HAS BEEN COMPLETED',
-                         start_offset=6,
-                         end_offset=3)
+# The first two columns are element labels and integration point numbers.
+with M11IN.step('parsing'):
+    ip_table = M8AR.abq_table(sample_name+'_IP2.dat',
+                              *M8AR.DAT_IP_TABLE, cache=REPORT_CACHE)
+    ip_coords = ip_table[:, 2:]
 
 # %% Load stress components at integration points
-S_local = load_AbqData(file_name='Out-'+sample_name+'_S_local.out', 
-                         start_line='Field Output reported at integration points for part',
-                         end_line='Minimum',
-                         start_offset=5,
-                         end_offset=3)
-S_global = load_AbqData(file_name='Out-'+sample_name+'_S_global.out', 
-                         start_line='Field Output reported at integration points for part',
-                         end_line='Minimum',
-                         start_offset=5,
-                         end_offset=3)
+# Components of the local stress report of S4_Cube_modified.py
+REPORT_COMPONENTS = ('S11', 'S22', 'S33', 'S12', 'S13', 'S23')
+stresses = ['S11', 'S22', 'S12']
+
+with M11IN.step('parsing'):
+    S_report = M8AR.abq_table('Out-'+sample_name+'_S_local.out',
+                              *M8AR.REPORT_IP_TABLE, cache=REPORT_CACHE)
+    S_local = S_report[:, [2 + REPORT_COMPONENTS.index(s)
+                           for s in stresses]]
+
+# The global stresses are rotated from the local stresses with the rotation
+# matrices of the ORIENT subroutine, rebuilt from the orientation table
+with M11IN.step('rotation'):
+    T = M14SR.orient_table_matrices(sample_name+'_ORIENT.bin',
+                                    S_report[:, 0], S_report[:, 1])
+    S_global = M14SR.rotate_tensors(S_report[:, 2:], T, REPORT_COMPONENTS,
+                                    out_components=stresses)
+    M11IN.log_arrays(ip_coords=ip_coords, S_local=S_local,
+                     S_global=S_global, T=T)
+    del T
+
+# %% Aggregate stresses in spatial bins
+# Number of bins along x (fiber direction), y and z of the model. The default
+# gives slabs normal to the fiber direction; e.g. (20, 4, 4) gives a grid.
+SLAB_BINS = (20, 1, 1)
+# Percentiles of the stresses in each bin
+SLAB_PERCENTILES = (5, 50, 95)
+
+# The statistics of each bin are volume-weighted with the integration point
+# volumes of the mesh and saved as CSV tables with one row per bin
+with M11IN.step('aggregation'):
+    ip_volume = M13IM.ip_volumes(ip_table[:, 1], ip_coords)
+    L, Th, W = np.loadtxt(sample_name+'_TomoDim.txt')*1e-3
+    edges = M16FA.grid_edges((-L/2, -Th/2, 0), (L/2, Th/2, W), SLAB_BINS)
+    for system, S in [('local', S_local), ('global', S_global)]:
+        slabs = M16FA.aggregate(ip_coords, S, edges, weights=ip_volume,
+                                components=stresses)
+        slabs.save('../results/'+sample_name+'_files/'+sample_name+'_'
+                   +system+'_S_slabs.csv', q=SLAB_PERCENTILES)
 
 
 # %% Plot stresses in local and global coordinate systems
-stresses = ['S11', 'S22', 'S12']
+# Maximum number of integration points in the 3D scatter plots. A stratified
+# subset is plotted for larger meshes. Set to None to plot all points.
+IP_MAX_POINTS = 200000
+# Plot the stresses binned onto the faces of the model as images
+FACE_PLOTS = True
+
+with M11IN.step('plotting'):
+    SLmax = S_local.max(axis=0)
+    SLmin = S_local.min(axis=0)
+    M4IP.Int_point_plotting(ip_coords, S_local,
+                           S_local.shape[1],
+                           vmin=SLmin, vmax=SLmax,
+                           unit='MPa', variable='',
+                           fig_name=sample_name+'_local_S',
+                           fig_path=result_path, 
+                           fig_title='Stress in local coordinate system',
+                           figsize=(25,6),
+                           sp_title=stresses,
+                           max_points=IP_MAX_POINTS)
+    if FACE_PLOTS:
+        M4IP.Int_point_face_plotting(ip_coords, S_local,
+                                     S_local.shape[1],
+                                     vmin=SLmin, vmax=SLmax,
+                                     unit='MPa', variable='',
+                                     fig_name=sample_name+'_local_S_faces',
+                                     fig_path=result_path,
+                                     fig_title='Stress in local coordinate system',
+                                     figsize=(25,12),
+                                     sp_title=stresses)
+
+    SGmax = S_global.max(axis=0)
+    SGmin = S_global.min(axis=0)
+    M4IP.Int_point_plotting(ip_coords, S_global,
+                           S_global.shape[1],
+                           vmin=SGmin, vmax=SGmax,
+                           unit='MPa', variable='',
+                           fig_name=sample_name+'_global_S',
+                           fig_path=result_path, 
+                           fig_title='Stress in global coordinate system',
+                           figsize=(25,6),
+                           sp_title=stresses,
+                           max_points=IP_MAX_POINTS)
+    if FACE_PLOTS:
+        M4IP.Int_point_face_plotting(ip_coords, S_global,
+                                     S_global.shape[1],
+                                     vmin=SGmin, vmax=SGmax,
+                                     unit='MPa', variable='',
+                                     fig_name=sample_name+'_global_S_faces',
+                                     fig_path=result_path,
+                                     fig_title='Stress in global coordinate system',
+                                     figsize=(25,12),
+                                     sp_title=stresses)
 
-SLmax = [max(idx) for idx in zip(*S_local)]
-SLmin = [min(idx) for idx in zip(*S_local)]
-M4IP.Int_point_plotting(ip_coords, S_local,
-                       S_local.shape[1],
-                       vmin=SLmin, vmax=SLmax,
-                       unit='MPa', variable='',
-                       fig_name=sample_name+'_local_S',
-                       fig_path=result_path, 
-                       fig_title='Stress in local coordinate system',
-                       figsize=(25,6),
-                       sp_title=stresses)
-
-SGmax = [max(idx) for idx in zip(*S_global)]
-SGmin = [min(idx) for idx in zip(*S_global)]
-M4IP.Int_point_plotting(ip_coords, S_global,
-                       S_global.shape[1],
-                       vmin=SGmin, vmax=SGmax,
-                       unit='MPa', variable='',
-                       fig_name=sample_name+'_global_S',
-                       fig_path=result_path, 
-                       fig_title='Stress in global coordinate system',
-                       figsize=(25,6),
-                       sp_title=stresses)
-    
 # %% Plot stress-strain
 def FuncRange(x,xRange):
     ia=0
@@ -122,5 +168,6 @@ plt.legend()
 plt.xlabel('Strain [$\%$]')
 plt.ylabel('Stress [MPa]')
 
-plt.savefig(result_path + sample_name + '_Stress_strain.png')
+with M11IN.step('plotting'):
+    plt.savefig(result_path + sample_name + '_Stress_strain.png')
 
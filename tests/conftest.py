@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules are imported by name from the code directory, as in the scripts
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'code'))
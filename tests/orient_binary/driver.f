@@ -0,0 +1,35 @@
+**********************************************************************************************
+**           TEST DRIVER OF THE USER SUBROUTINES UEXTERNALDB AND ORIENT                     **
+**   Reads element labels and integration point numbers from standard input and writes     **
+**   the rotation matrix T of each integration point, row by row, to standard output       **
+**********************************************************************************************
+
+      PROGRAM DRIVER
+C
+      INCLUDE 'ABA_PARAM.INC'
+C
+      CHARACTER*80 ORNAME
+      DIMENSION T(3,3),COORDS(3),BASIS(3,3),CNODES(3,20),TIME(2)
+      DIMENSION JNNUM(20)
+C
+C     The table is read from InputOrientBinary.bin in the working directory
+      TIME = 0.
+      CALL UEXTERNALDB(0,0,TIME,0.D0,0,0)
+C
+      READ(*,*) N
+      DO I = 1, N
+        READ(*,*) NOEL, NPT
+        CALL ORIENT(T,NOEL,NPT,0,0,COORDS,BASIS,ORNAME,20,CNODES,JNNUM)
+        WRITE(*,'(9ES25.16)') ((T(J,K), K=1,3), J=1,3)
+      END DO
+      END
+
+
+      SUBROUTINE GETOUTDIR(OUTDIR, LENOUTDIR)
+C
+C     Stand-in of the Abaqus utility returning the working directory
+      CHARACTER*256 OUTDIR
+      OUTDIR = '.'
+      LENOUTDIR = 1
+      RETURN
+      END
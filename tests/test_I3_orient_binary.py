@@ -0,0 +1,68 @@
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+import M7_OrientTables as M7OT
+import M14_StressRotation as M14SR
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CODE = os.path.join(HERE, '..', 'code')
+DRIVER = os.path.join(HERE, 'orient_binary')
+
+
+@pytest.fixture
+def driver(tmp_path):
+    # Build I3_orient_binary.f with the test driver and the stand-ins of
+    # ABA_PARAM.INC and GETOUTDIR
+    gfortran = shutil.which('gfortran')
+    if gfortran is None:
+        pytest.skip('gfortran not found')
+    exe = str(tmp_path / 'driver')
+    subprocess.run([gfortran, '-I', DRIVER, '-J', str(tmp_path), '-o', exe,
+                    os.path.join(CODE, 'I3_orient_binary.f'),
+                    os.path.join(DRIVER, 'driver.f')], check=True)
+    return exe
+
+
+def run_driver(exe, cwd, ele_ids, ip_ids):
+    # Rotation matrices of the ORIENT subroutine for integration points
+    lines = ['%d' % len(ele_ids)] + ['%d %d' % (e, i)
+                                     for e, i in zip(ele_ids, ip_ids)]
+    out = subprocess.run([exe], cwd=str(cwd), check=True,
+                         input='\n'.join(lines) + '\n',
+                         stdout=subprocess.PIPE, universal_newlines=True)
+    return np.array(out.stdout.split(), dtype=float).reshape(-1, 3, 3)
+
+
+def test_orient_binary(driver, tmp_path):
+    rng = np.random.default_rng(9)
+    # Elements with gaps in the labels and partial integration point ranges,
+    # written out of order
+    ele_ids = np.repeat([3, 4, 7, 12, 13], 27)
+    ip_ids = np.tile(np.arange(1, 28), 5)
+    keep = ~((ele_ids == 7) & ((ip_ids < 4) | (ip_ids > 20)))
+    ele_ids, ip_ids = ele_ids[keep], ip_ids[keep]
+    phi = rng.uniform(-0.3, 0.3, len(ele_ids))
+    theta = rng.uniform(-0.3, 0.3, len(ele_ids))
+    order = rng.permutation(len(ele_ids))
+    M7OT.write_binary_table(str(tmp_path / 'InputOrientBinary.bin'),
+                            ele_ids[order], ip_ids[order],
+                            {'PHI': phi[order], 'THETA': theta[order]})
+
+    # Integration points of the table, of unknown elements before, between
+    # and after the labels, and outside the range of element 7
+    query_ele = np.r_[ele_ids, 1, 5, 10, 20, 7, 7, 7]
+    query_ip = np.r_[ip_ids, 1, 1, 27, 5, 1, 3, 21]
+    T = run_driver(driver, tmp_path, query_ele, query_ip)
+
+    expected = M14SR.orient_table_matrices(
+        str(tmp_path / 'InputOrientBinary.bin'), query_ele, query_ip)
+    np.testing.assert_allclose(T, expected, rtol=0, atol=1e-15)
+    np.testing.assert_allclose(T[:len(ele_ids)],
+                               M14SR.orient_matrices(phi, theta),
+                               rtol=0, atol=1e-15)
+    np.testing.assert_array_equal(T[len(ele_ids):],
+                                  np.broadcast_to(np.eye(3), (7, 3, 3)))
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import M11_Instrumentation as M11IN
+
+# Child process holding about 200 MB for a while
+CHILD = 'import time; a = bytearray(200 * 2**20); time.sleep(0.3)'
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc')
+def test_children_peak_rss():
+    children = M11IN.ChildrenPeakRss()
+    children.start()
+    # Two children at the same time are summed
+    procs = [subprocess.Popen([sys.executable, '-c', CHILD])
+             for _ in range(2)]
+    for p in procs:
+        p.wait()
+    children.stop()
+    assert set(children.peaks) == {p.pid for p in procs}
+    assert children.peak > 2 * 200 * 2**20
+    # The peak of the parent does not include the children
+    assert M11IN.peak_rss() < children.peak
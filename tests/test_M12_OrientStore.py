@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+
+import M12_OrientStore as M12OS
+
+
+@pytest.fixture
+def fields():
+    # Angles with NaN outside the data, and a coarser pyramid level
+    rng = np.random.default_rng(0)
+    phi = rng.normal(0, 5, (21, 17, 13)).astype(np.float32)
+    phi[0, :3, :4] = np.nan
+    phi[-1, -1, -1] = np.nan
+    theta = rng.normal(0, 30, phi.shape).astype(np.float32)
+    phi_2 = rng.normal(0, 5, (11, 9, 7)).astype(np.float32)
+    return {'phi': phi, 'theta': theta, 'phi_2': phi_2}
+
+
+def test_lossless(tmp_path, fields):
+    file_path = str(tmp_path / 'A.ost')
+    M12OS.write_store(file_path, fields, chunks=(8, 5, 6), workers=2,
+                      meta={'VEC_AVG': np.array([1., 0., 0.]), 'CROP': 0})
+    store = M12OS.OrientStore(file_path)
+    assert store.meta == {'VEC_AVG': [1., 0., 0.], 'CROP': 0}
+    assert store.fields == ['phi', 'theta', 'phi_2']
+    for name, values in fields.items():
+        assert store.shapes[name] == values.shape
+        np.testing.assert_array_equal(store.read(name), values)
+        assert store.read(name).dtype == values.dtype
+
+    # Regions with steps, negative and integer indices as in numpy
+    phi = fields['phi']
+    for region in [(slice(3, 19, 4), slice(None), slice(2, 12)),
+                   (slice(None, None, -3),), (0,), (slice(1, 9), -1, 5),
+                   (np.int64(20), 2, slice(0, 0))]:
+        np.testing.assert_array_equal(store.read('phi', region), phi[region])
+    np.testing.assert_array_equal(store.read('phi', 4), phi[4])
+    with pytest.raises(IndexError):
+        store.read('phi', (0, 17))
+
+
+def test_quantized(tmp_path, fields):
+    file_path = str(tmp_path / 'A.ost')
+    tolerance = 0.01
+    M12OS.write_store(file_path, fields, chunks=(8, 5, 6),
+                      tolerance=tolerance)
+    store = M12OS.OrientStore(file_path)
+    for name, values in fields.items():
+        stored = store.read(name)
+        np.testing.assert_array_equal(np.isnan(stored), np.isnan(values))
+        # Up to the rounding of the values to the field dtype
+        finite = ~np.isnan(values)
+        error = np.abs(stored - values)[finite]
+        assert np.all(error <= tolerance + np.spacing(np.abs(values[finite])))
+        assert error.max() > tolerance / 2
+        assert store.nbytes(name)[1] < store.nbytes(name)[0]
+
+
+def test_sample(tmp_path, fields):
+    file_path = str(tmp_path / 'A.ost')
+    M12OS.write_store(file_path, fields, chunks=(8, 5, 6))
+    store = M12OS.OrientStore(file_path)
+    rng = np.random.default_rng(1)
+    coords = rng.uniform(-1.5, 22, (500, 3)) * [1, 17 / 21, 13 / 21]
+    phi, theta = store.sample(['phi', 'theta'], coords)
+    for values, name in [(phi, 'phi'), (theta, 'theta')]:
+        expected = ndimage.map_coordinates(fields[name], coords.T, order=0,
+                                           cval=np.nan)
+        np.testing.assert_array_equal(values, expected)
+    assert np.isnan(phi).any()
+    # Fields of the same store differ in shape
+    phi_2, = store.sample(['phi_2'], coords / 2)
+    np.testing.assert_array_equal(phi_2, ndimage.map_coordinates(
+        fields['phi_2'], coords.T / 2, order=0, cval=np.nan))
+    with pytest.raises(ValueError):
+        store.sample(['phi', 'phi_2'], coords)
@@ -0,0 +1,117 @@
+import io
+
+import numpy as np
+
+import M8_AbqReports as M8AR
+import M13_InpMesh as M13IM
+
+# Single C3D20 element of the box [0, 2] x [0, 1] x [0, 1] with the nodes in
+# the Abaqus order: corners of the bottom and top face, mid-side nodes of the
+# bottom and top face, and mid-side nodes of the vertical edges
+DECK = """*Heading
+** Hand written test deck
+*Part, name=Part-1
+*Node
+      1,           0.,           0.,           0.
+      2,           2.,           0.,           0.
+      3,           2.,           1.,           0.
+      4,           0.,           1.,           0.
+      5,           0.,           0.,           1.
+      6,           2.,           0.,           1.
+      7,           2.,           1.,           1.
+      8,           0.,           1.,           1.
+      9,           1.,           0.,           0.
+     10,           2.,          0.5,           0.
+     11,           1.,           1.,           0.
+     12,           0.,          0.5,           0.
+     13,           1.,           0.,           1.
+     14,           2.,          0.5,           1.
+     15,           1.,           1.,           1.
+     16,           0.,          0.5,           1.
+     17,           0.,           0.,          0.5
+     18,           2.,           0.,          0.5
+     19,           2.,           1.,          0.5
+     20,           0.,           1.,          0.5
+*Element, type=C3D20
+1,  1,  2,  3,  4,  5,  6,  7,  8,  9, 10, 11, 12, 13, 14, 15,
+ 16, 17, 18, 19, 20
+*Nset, nset=Set-1, generate
+ 1, 20, 1
+*End Part
+*Assembly, name=Assembly
+*End Assembly
+"""
+
+# Integration points 1, 2, 14 and 27 at the natural coordinates
+# (-g, -g, -g), (0, -g, -g), (0, 0, 0) and (g, g, g) with g = sqrt(0.6),
+# i.e. x = 1 + xi, y = z = 0.5 + eta / 2
+ROWS = {1: '         1   1    2.2540333E-01  1.1270167E-01  1.1270167E-01\n',
+        2: '         1   2    1.0000000E+00  1.1270167E-01  1.1270167E-01\n',
+        14: '         1  14    1.0000000E+00  5.0000000E-01  5.0000000E-01\n',
+        27: '         1  27    1.7745967E+00  8.8729833E-01  8.8729833E-01\n'}
+
+
+def test_inp_ip_table(tmp_path):
+    inp_file = tmp_path / 'deck.inp'
+    dat_file = tmp_path / 'IP2.dat'
+    inp_file.write_text(DECK)
+    assert M13IM.inp_ip_table(str(inp_file), str(dat_file)) == 27
+
+    lines = dat_file.read_text().splitlines(True)
+    rows = [line for line in lines if line.startswith('         1 ')]
+    assert len(rows) == 27
+    for ip, row in ROWS.items():
+        assert rows[ip - 1] == row
+
+    table = M8AR.abq_table(str(dat_file), *M8AR.DAT_IP_TABLE)
+    np.testing.assert_array_equal(table[:, 0], 1)
+    np.testing.assert_array_equal(table[:, 1], np.arange(1, 28))
+    assert table[:, 2].min() > 0 and table[:, 2].max() < 2
+
+
+def test_write_ip_table(tmp_path):
+    # Signs, exponents and label widths of the .dat layout
+    ele_ids = np.array([7, 123456])
+    ip_ids = np.array([1, 27])
+    coords = np.array([[-0.0, 1.5e-12, -35.25], [0.125, -2.0, 1e3]])
+    path = str(tmp_path / 'ip.dat')
+    M13IM.write_ip_table(path, ele_ids, ip_ids, coords)
+    with open(path) as f:
+        text = f.read()
+    assert ('         7   1   -0.0000000E+00  1.5000000E-12 -3.5250000E+01\n'
+            '    123456  27    1.2500000E-01 -2.0000000E+00  1.0000000E+03\n'
+            ) in text
+
+
+def test_write_mesh_round_trip(tmp_path):
+    node_ids, node_coords, ele_ids, connectivity, sets = M13IM.cube_mesh(
+        -0.1, 0.1, -0.05, 0.05, 0.07, 0.035)
+    f = io.BytesIO()
+    M13IM.write_mesh(f, node_ids, node_coords, 'C3D20', ele_ids,
+                     connectivity, sets, chunk_size=3)
+    text = f.getvalue().decode('ascii')
+    inp_file = tmp_path / 'mesh.inp'
+    inp_file.write_text('*Part, name=Part-1\n' + text + '*End Part\n')
+
+    ids, coords, elements = M13IM.read_inp_part(str(inp_file))
+    np.testing.assert_array_equal(ids, node_ids)
+    np.testing.assert_allclose(coords, node_coords, rtol=1e-11)
+    np.testing.assert_array_equal(elements['C3D20'][0], ele_ids)
+    np.testing.assert_array_equal(elements['C3D20'][1], connectivity)
+    # Element label and 15 node labels on the first data line
+    first = text.split('*Element, type=C3D20\n')[1].splitlines()[0]
+    assert len(first.rstrip(',').split(',')) == 16
+
+
+def test_ip_volumes_of_cube_mesh():
+    # Uneven element sizes along each axis
+    node_ids, node_coords, ele_ids, connectivity, _ = M13IM.cube_mesh(
+        -0.45, 0.45, -0.1, 0.1, 0.23, 0.07)
+    _, ip_ids, ip_coords = M13IM.ip_coordinates(node_ids, node_coords,
+                                                ele_ids, connectivity)
+    volumes = M13IM.ip_volumes(ip_ids, ip_coords, chunk_size=7)
+    np.testing.assert_allclose(volumes.sum(), 0.9 * 0.2 * 0.23, rtol=1e-12)
+    # All elements have the same size
+    element_volumes = volumes.reshape(-1, 27).sum(axis=1)
+    np.testing.assert_allclose(element_volumes, 0.9 * 0.2 * 0.23
+                               / len(ele_ids), rtol=1e-12)
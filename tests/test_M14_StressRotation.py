@@ -0,0 +1,62 @@
+import numpy as np
+
+import M7_OrientTables as M7OT
+import M14_StressRotation as M14SR
+
+
+def tensors(values, components=M14SR.STRESS_COMPONENTS):
+    # Symmetric 3 x 3 tensors from their components
+    index = {'11': (0, 0), '22': (1, 1), '33': (2, 2), '12': (0, 1),
+             '13': (0, 2), '23': (1, 2)}
+    S = np.zeros((len(values), 3, 3))
+    for c, name in enumerate(components):
+        i, j = index[name[-2:]]
+        S[:, i, j] = S[:, j, i] = values[:, c]
+    return S
+
+
+def test_rotate_tensors():
+    rng = np.random.default_rng(0)
+    n = 101
+    T = M14SR.orient_matrices(rng.uniform(-0.5, 0.5, n),
+                              rng.uniform(-np.pi, np.pi, n))
+    values = rng.normal(0, 100, (n, 6))
+    S = tensors(values)
+    expected = np.array([t @ s @ t.T for t, s in zip(T, S)])
+
+    rotated = M14SR.rotate_tensors(values, T, chunk_size=17)
+    np.testing.assert_allclose(tensors(rotated), expected, rtol=0,
+                               atol=1e-10)
+    # Rotating back gives the local tensors
+    np.testing.assert_allclose(
+        M14SR.rotate_tensors(rotated, T, inverse=True, chunk_size=40),
+        values, rtol=0, atol=1e-10)
+
+    # Subset of the components, where the missing components are zero
+    plane = ('S11', 'S22', 'S12')
+    S = tensors(values[:, [0, 1, 3]], plane)
+    expected = np.array([t @ s @ t.T for t, s in zip(T, S)])
+    out = M14SR.rotate_tensors(values[:, [0, 1, 3]], T, plane,
+                               out_components=('S12', 'S33'))
+    np.testing.assert_allclose(out, expected[:, [0, 2], [1, 2]], rtol=0,
+                               atol=1e-10)
+
+
+def test_orient_table_matrices(tmp_path):
+    # Elements 2 and 5, where element 5 has integration points 3 to 6
+    ele_ids = np.array([5, 5, 2, 5, 2, 5])
+    ip_ids = np.array([4, 3, 1, 6, 2, 5])
+    phi = np.linspace(-0.3, 0.3, 6)
+    theta = np.linspace(0.1, 1.1, 6)
+    file_name = str(tmp_path / 'ORIENT.bin')
+    M7OT.write_binary_table(file_name, ele_ids, ip_ids,
+                            {'PHI': phi, 'THETA': theta})
+
+    # Points of the table, of unknown elements and outside the range of
+    # element 5
+    query_ele = np.r_[ele_ids, 1, 3, 9, 5, 5]
+    query_ip = np.r_[ip_ids, 1, 1, 1, 2, 7]
+    T = M14SR.orient_table_matrices(file_name, query_ele, query_ip)
+    np.testing.assert_array_equal(T[:6], M14SR.orient_matrices(phi, theta))
+    np.testing.assert_array_equal(T[6:], np.broadcast_to(np.eye(3),
+                                                         (5, 3, 3)))
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import M15_OdbHistory as M15OH
+
+# Stand-ins of the ODB objects used by M15_OdbHistory, following the
+# odbAccess API: step.frames, frame.frameValue, frame.fieldOutputs,
+# fieldOutput.getSubset(region=...).bulkDataBlocks and block.nodeLabels/data
+
+
+class Block:
+    def __init__(self, labels, data):
+        self.nodeLabels = np.asarray(labels, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float32)
+
+
+class FieldOutput:
+    def __init__(self, values, calls):
+        # Values of the field output by node label
+        self.values = values
+        self.calls = calls
+
+    def getSubset(self, region):
+        self.calls.append(region)
+        labels = [n for n in region if n in self.values]
+        # The subset is split into blocks, e.g. by partition, in any order
+        half = len(labels) // 2
+        blocks = [Block(part, [self.values[n] for n in part])
+                  for part in (labels[half:], labels[:half]) if part]
+
+        class Subset:
+            bulkDataBlocks = blocks
+        return Subset()
+
+
+class Frame:
+    def __init__(self, time, fields):
+        self.frameValue = time
+        self.fieldOutputs = fields
+
+
+class Step:
+    def __init__(self, frames):
+        self.frames = frames
+
+
+def _step(labels, times, calls):
+    # U1 = t * label and RF1 = -t for all nodes. The model writes the full
+    # displacement field at a frame without reaction forces, which is skipped.
+    frames = []
+    for t in times:
+        U = dict((n, (t * n, 0.5, 0.25)) for n in labels + [999])
+        RF = dict((n, (-t, 0.0, 0.0)) for n in labels)
+        frames.append(Frame(t, {'U': FieldOutput(U, calls),
+                                'RF': FieldOutput(RF, calls),
+                                'S': FieldOutput({}, calls)}))
+    frames.insert(2, Frame(0.15, {'U': FieldOutput({}, calls)}))
+    return Step(frames)
+
+
+def test_node_set_histories():
+    labels = [7, 3, 12, 5, 9]
+    times = [0.0, 0.1, 0.2, 1.0]
+    calls = []
+    node_set = tuple(labels)
+    step = _step(labels, times, calls)
+
+    t, histories, out_labels = M15OH.node_set_histories(step, node_set)
+    np.testing.assert_allclose(t, times)
+    np.testing.assert_array_equal(out_labels, sorted(labels))
+    np.testing.assert_allclose(histories['U1'],
+                               np.outer(sorted(labels), times), rtol=1e-6)
+    np.testing.assert_allclose(histories['RF1'],
+                               -np.tile(times, (len(labels), 1)), rtol=1e-6)
+    # One getSubset call per frame and field output
+    assert len(calls) == 2 * len(times)
+
+    t, sums = M15OH.node_set_sums(step, node_set, ('RF1',))
+    np.testing.assert_allclose(sums['RF1'], -5 * np.array(times), rtol=1e-6)
+
+
+def test_node_set_histories_unknown_variable():
+    with pytest.raises(ValueError):
+        M15OH.node_set_histories(Step([]), (), ('S11',))
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import M16_FieldAggregation as M16FA
+
+EDGES = M16FA.grid_edges((0, -1, 0), (2, 1, 1), (3, 2, 1))
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(0)
+    n = 20011
+    coords = rng.uniform([0, -1, 0], [2, 1, 1], (n, 3))
+    # Points on the upper edges and outside the bins
+    coords[:4] = [[2, 1, 1], [2, 0, 0.5], [1, 1, 0.5], [0.5, 0, 1]]
+    coords[4:6] = [[2.1, 0, 0.5], [1, 0, -0.1]]
+    values = rng.normal([0, 10, -5], [1, 5, 2], (n, 3))
+    values[6, 1] = np.nan
+    values[7, 0] = np.inf
+    weights = rng.uniform(0.5, 2, n)
+    return coords, values, weights
+
+
+def bin_masks(coords):
+    # Points of each bin, where the upper edges belong to the last bin
+    masks = []
+    for i, j, k in np.ndindex(3, 2, 1):
+        mask = np.ones(len(coords), dtype=bool)
+        for axis, b in zip(range(3), (i, j, k)):
+            e = EDGES[axis]
+            x = coords[:, axis]
+            upper = x <= e[b + 1] if b == len(e) - 2 else x < e[b + 1]
+            mask &= (x >= e[b]) & upper
+        masks.append(mask)
+    return masks
+
+
+def test_aggregate(points):
+    coords, values, weights = points
+    stats = M16FA.aggregate(coords, values, EDGES, weights=weights,
+                            components=['S11', 'S22', 'S12'],
+                            chunk_size=997)
+    finite = np.all(np.isfinite(values), axis=1)
+    for b, mask in enumerate(bin_masks(coords)):
+        mask &= finite
+        v, w = values[mask], weights[mask]
+        assert stats.count[b] == mask.sum()
+        np.testing.assert_allclose(stats.volume[b], w.sum())
+        np.testing.assert_allclose(stats.mean[b], v.mean(axis=0))
+        np.testing.assert_allclose(stats.weighted_mean[b],
+                                   np.average(v, axis=0, weights=w))
+        np.testing.assert_array_equal(stats.min[b], v.min(axis=0))
+        np.testing.assert_array_equal(stats.max[b], v.max(axis=0))
+        # Percentiles within one histogram bin width
+        width = (stats.limits[:, 1] - stats.limits[:, 0]) / stats.resolution
+        for q in (5, 50, 95):
+            assert np.all(np.abs(stats.percentile(q)[b]
+                                 - np.percentile(v, q, axis=0)) <= width)
+    # Points on the upper edges are in the last bins, points outside and
+    # non-finite rows are skipped
+    assert stats.count.sum() == len(coords) - 4
+    np.testing.assert_array_equal(stats.bin_index(coords[:6]),
+                                  [5, 5, 3, 1, -1, -1])
+
+
+def test_empty_bins(points):
+    # Limits of the percentiles from the finite rows only
+    coords, values, _ = points
+    stats = M16FA.aggregate(coords[:20], values[:20],
+                            M16FA.grid_edges((0, -1, 0), (2, 1, 1),
+                                             (40, 1, 1)))
+    names, table = stats.table()
+    empty = table[:, names.index('count')] == 0
+    assert empty.any()
+    assert np.all(np.isnan(table[empty, names.index('C1_mean'):]))
+    assert np.all(np.isfinite(table[~empty, names.index('C1_mean'):]))
@@ -0,0 +1,33 @@
+import nibabel as nib
+import numpy as np
+import pytest
+
+import M1_TomoHandling as M1TH
+
+
+def _write_nifti(path, data, slope=None, inter=None):
+    img = nib.Nifti1Image(data, np.eye(4))
+    if slope is not None:
+        img.header.set_slope_inter(slope, inter)
+    nib.save(img, str(path))
+    return str(path)
+
+
+@pytest.mark.parametrize('suffix', ['.nii', '.nii.gz'])
+def test_tomo_load_scaled(tmp_path, suffix):
+    rng = np.random.default_rng(0)
+    raw = rng.integers(-1000, 1000, (12, 10, 9)).astype(np.int16)
+    path = _write_nifti(tmp_path / ('scaled' + suffix), raw, 0.37, -2.5)
+    expected = nib.load(path).get_fdata()[2:-2, 1:-1, :]
+    _, data = M1TH.tomo_load(path, xcut=2, ycut=1, slab_size=4)
+    assert data.dtype.kind == 'f'
+    np.testing.assert_allclose(data, expected, rtol=1e-6)
+
+
+def test_tomo_load_unscaled_is_view(tmp_path):
+    raw = np.arange(8 * 6 * 5, dtype=np.uint8).reshape(8, 6, 5)
+    path = _write_nifti(tmp_path / 'raw.nii', raw)
+    _, data = M1TH.tomo_load(path, sample_coor_axis=[1, 0, 2], xcut=1)
+    assert data.dtype == np.uint8
+    np.testing.assert_array_equal(data, np.moveaxis(raw[:, 1:-1],
+                                                    [0, 1, 2], [1, 0, 2]))
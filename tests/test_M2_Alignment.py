@@ -0,0 +1,42 @@
+import numpy as np
+
+import M2_Alignment as M2A
+
+
+def test_orient_angles_equal_st_misalign():
+    rng = np.random.default_rng(0)
+    vec = rng.normal(size=(3, 7, 5, 6)).astype(np.float32)
+    vec[0] = np.abs(vec[0]) + 0.5
+    vec /= np.linalg.norm(vec, axis=0)
+    R = M2A.rot_mat(0.1, -0.2)
+    theta_ref, phi_ref = M2A.st_misalign(np.einsum('ij,j...->i...', R, vec))
+
+    out, theta, phi = M2A.orient_angles(vec, R, chunk_size=17)
+    assert out is vec
+    np.testing.assert_allclose(theta, theta_ref, atol=1e-4)
+    np.testing.assert_allclose(phi, phi_ref, atol=1e-4)
+
+
+def test_orient_stats_match_baseline():
+    rng = np.random.default_rng(1)
+    data = rng.normal(0, 20, size=(23, 9, 11)).astype(np.float32)
+    data[data.shape[0] // 2] = np.clip(data[data.shape[0] // 2], -30, 30)
+    vec = rng.normal(size=(3,) + data.shape).astype(np.float32)
+    vec[0] = np.abs(vec[0]) + 0.5
+
+    # Chunked updates against the baseline over the raveled volume
+    stats = M2A.orient_stats(data, bins=37, limits=30, vec=vec, block_size=5)
+    hist, _ = np.histogram(data, bins=37, range=(-30, 30))
+    np.testing.assert_array_equal(stats.hist, hist)
+    assert np.isclose(stats.mean, np.average(data.astype(np.float64)),
+                      rtol=0, atol=1e-12)
+    assert np.isclose(stats.abs_mean,
+                      np.average(np.abs(data.astype(np.float64))),
+                      rtol=0, atol=1e-12)
+    vec_avg = np.average(vec.reshape(3, -1).astype(np.float64), axis=1)
+    np.testing.assert_allclose(stats.vec_avg,
+                               vec_avg / np.linalg.norm(vec_avg),
+                               rtol=0, atol=1e-12)
+    q = [0, 2.5, 25, 50, 75, 97.5, 100]
+    np.testing.assert_allclose(stats.percentile(q), np.percentile(data, q),
+                               rtol=0, atol=0.01)
@@ -0,0 +1,40 @@
+import numpy as np
+
+import M4_IntegrationPoints as M4IP
+
+
+def test_decimation_keeps_sparse_cells():
+    rng = np.random.default_rng(0)
+    # Dense cluster and a few isolated points in the corners
+    dense = rng.uniform(0, 0.1, size=(5000, 3))
+    sparse = np.array([[1., 1., 1.], [1., 0., 0.], [0., 1., 0.]])
+    ip_coords = np.vstack([dense, sparse])
+
+    for max_points in [2, 3, 50, 1000, 10000]:
+        subset = M4IP.Int_point_decimation(ip_coords, max_points, cells=10)
+        assert len(subset) <= max_points
+        assert len(subset) == min(max_points, len(ip_coords))
+        np.testing.assert_array_equal(subset, np.unique(subset))
+        if max_points >= 50:
+            assert set(range(5000, 5003)) <= set(subset)
+
+
+def test_binning_equals_per_bin_mean():
+    rng = np.random.default_rng(1)
+    ip_coords = rng.uniform(0, 1, size=(400, 3))
+    ip_coords[:, 2] *= 0.5  # No points in the upper half along z
+    ip_data = rng.normal(size=400)
+    ip_data[::7] = np.nan
+    bins, ranges = (4, 5), ((0, 1), (0, 1))
+
+    image = M4IP.Int_point_binning(ip_coords, ip_data, (0, 2), bins, ranges)
+    expected = np.full(bins, np.nan)
+    for i in range(bins[0]):
+        for j in range(bins[1]):
+            inside = ((np.floor(ip_coords[:, 0] * bins[0]) == i)
+                      & (np.floor(ip_coords[:, 2] * bins[1]) == j)
+                      & ~np.isnan(ip_data))
+            if inside.any():
+                expected[i, j] = ip_data[inside].mean()
+    assert np.isnan(expected[:, 3:]).all()
+    np.testing.assert_allclose(image, expected, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,173 @@
+import numpy as np
+import pytest
+
+import M2_Alignment as M2A
+import M5_StructureTensor as M5ST
+import M10_SyntheticFibers as M10SF
+
+
+@pytest.fixture
+def volume(tmp_path):
+    rng = np.random.default_rng(0)
+    data = np.lib.format.open_memmap(str(tmp_path / 'volume.npy'), mode='w+',
+                                     dtype=np.uint8, shape=(40, 30, 28))
+    data[...] = rng.integers(0, 255, data.shape)
+    data.flush()
+    return np.load(str(tmp_path / 'volume.npy'), mmap_mode='r')
+
+
+def test_parallel_reads_tiles_from_data(volume, monkeypatch):
+    # Only the outputs are placed in shared memory
+    sizes = []
+    shared_memory = M5ST.shared_memory.SharedMemory
+
+    def record(*args, **kwargs):
+        if kwargs.get('create'):
+            sizes.append(kwargs['size'])
+        return shared_memory(*args, **kwargs)
+
+    monkeypatch.setattr(M5ST.shared_memory, 'SharedMemory', record)
+    serial = M5ST.st_orientation(volume, 1, 2, coarsen=2)
+    parallel = M5ST.st_orientation(volume, 1, 2, tile_size=10, workers=3,
+                                   coarsen=2)
+    for a, b in zip(serial, parallel):
+        np.testing.assert_array_equal(a, b)
+    out_size = parallel[1].size
+    assert sorted(sizes) == sorted([3 * 4 * out_size, 4 * out_size,
+                                    4 * out_size, parallel[3].nbytes])
+
+
+def test_tiles_match_full_volume(volume):
+    # Untiled analysis of the full volume with the boundary region removed
+    sigma, rho = 1, 2
+    kernel_radius, _ = M5ST.st_kernel_radius(sigma, rho)
+    S = M5ST.structure_tensor_3d(np.asarray(volume, dtype=np.float64), sigma,
+                                 rho, truncate=4)
+    S = S[(slice(None),) + (slice(kernel_radius, -kernel_radius),) * 3]
+    _, expected = M5ST.eig_special_3d(S, full=False)
+    expected = np.flip(expected.astype(np.float32), axis=0)
+    expected *= np.sign(expected[0])
+
+    for tile_size in [None, 7, (5, 9, 4), (30, 1, 13)]:
+        vec, theta, phi = M5ST.st_orientation(volume, sigma, rho,
+                                              tile_size=tile_size)
+        np.testing.assert_array_equal(vec, expected)
+        expected_theta, expected_phi = M2A.st_misalign(expected)
+        np.testing.assert_array_equal(theta, expected_theta)
+        np.testing.assert_array_equal(phi, expected_phi)
+
+
+def test_box_points_matches_full_volume(volume):
+    sigma, rho = 1, 2
+    kernel_radius, _ = M5ST.st_kernel_radius(sigma, rho)
+    S = M5ST.structure_tensor_3d(np.asarray(volume, dtype=np.float64), sigma,
+                                 rho, truncate=4)
+    S = S[(slice(None),) + (slice(kernel_radius, -kernel_radius),) * 3]
+    points = np.array([[5, 6, 4], [0, 0, 0], [15, 9, 11], [23, 13, 11]])
+    box_size = 5
+    # Mean over the boxes cut at the boundary of the analysed volume
+    S_box = np.empty((6, len(points)))
+    for n, p in enumerate(points):
+        lo = np.maximum(p - box_size // 2, 0)
+        hi = p - box_size // 2 + box_size
+        S_box[:, n] = S[:, lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]].mean(
+            axis=(1, 2, 3))
+    _, expected = M5ST.eig_special_3d(S_box, full=False)
+    expected = np.flip(expected, axis=0)
+    expected *= np.sign(expected[0])
+
+    for tile_size in [None, 4, (7, 5, 6)]:
+        vec = M5ST.st_box_points(volume, points, box_size, sigma, rho,
+                                 tile_size=tile_size)
+        np.testing.assert_allclose(vec, expected, atol=1e-5)
+
+
+def test_box_memory_is_set_by_tile_size():
+    full = M5ST.st_box_memory((1000, 800, 600), 1, 2)
+    tiled = M5ST.st_box_memory((1000, 800, 600), 1, 2, tile_size=64,
+                               n_points=1000)
+    assert tiled < full / 100
+
+
+@pytest.fixture
+def fibers():
+    # Synthetic fibers along the first axis with a global tilt
+    return M10SF.fiber_volume((48, 36, 36), tilt=(3.0, 2.0))[0]
+
+
+def test_points_match_orientation(fibers):
+    sigma, rho = 1, 2
+    kernel_radius, _ = M5ST.st_kernel_radius(sigma, rho)
+    vec, _, _ = M5ST.st_orientation(fibers, sigma, rho)
+    rng = np.random.default_rng(1)
+    points = rng.integers(0, vec.shape[1:], (50, 3))
+    points[:2] = 0
+    points[2] = np.array(vec.shape[1:]) - 1
+    expected = vec[:, points[:, 0], points[:, 1], points[:, 2]]
+    np.testing.assert_allclose(
+        M5ST.st_points(fibers, points + kernel_radius, sigma, rho),
+        expected, rtol=0, atol=1e-6)
+
+
+def test_average_vector(fibers):
+    sigma, rho = 1, 2
+    vec, theta, _ = M5ST.st_orientation(fibers, sigma, rho)
+    vec_avg = M2A.orient_stats(theta, vec=vec).vec_avg
+    np.testing.assert_allclose(
+        M5ST.st_average_vector(fibers, sigma, rho, tile_size=(7, 5, 6),
+                               stride=1), vec_avg, rtol=0, atol=1e-12)
+    # Every second tile of 8 voxels along each axis
+    mask = np.ix_(*[(np.arange(n) // 8) % 2 == 0 for n in vec.shape[1:]])
+    vec_sum = vec[(slice(None),) + mask].sum(axis=(1, 2, 3), dtype=np.float64)
+    np.testing.assert_allclose(
+        M5ST.st_average_vector(fibers, sigma, rho, tile_size=8, stride=2),
+        vec_sum / np.linalg.norm(vec_sum), rtol=0, atol=1e-12)
+
+
+def test_pyramid_matches_block_means():
+    # Shape of the field with partial blocks at the upper edges
+    data = M10SF.fiber_volume((47, 35, 37), tilt=(3.0, 2.0))[0]
+    sigma, rho = 1, 2
+    kernel_radius, _ = M5ST.st_kernel_radius(sigma, rho)
+    S = M5ST.structure_tensor_3d(data.astype(np.float64), sigma, rho,
+                                 truncate=4)
+    S = S[(slice(None),) + (slice(kernel_radius, -kernel_radius),) * 3]
+    vec, _, _, S_coarse = M5ST.st_orientation(data, sigma, rho,
+                                              tile_size=(7, 5, 6), coarsen=2)
+    assert vec.shape[1:] == (31, 19, 21)
+
+    levels = list(M5ST.st_pyramid(S_coarse, vec.shape[1:], 2, 3))
+    assert [factor for factor, _ in levels] == [2, 4, 8]
+    for factor, vec_level in levels:
+        # Mean of the full resolution tensors over each block
+        grid = [range(0, n, factor) for n in vec.shape[1:]]
+        S_block = np.empty((6,) + tuple(len(g) for g in grid))
+        for index in np.ndindex(S_block.shape[1:]):
+            block = tuple(slice(i * factor, (i + 1) * factor) for i in index)
+            S_block[(slice(None),) + index] = S[(slice(None),) + block].mean(
+                axis=(1, 2, 3))
+        _, expected = M5ST.eig_special_3d(S_block, full=False)
+        expected = np.flip(expected, axis=0)
+        expected *= np.sign(expected[0])
+        np.testing.assert_allclose(vec_level, expected, rtol=0, atol=1e-5)
+
+
+def test_precision_report(fibers):
+    report = M5ST.st_precision_report(fibers, 1, 2, size=40,
+                                      dtype=np.float64)
+    assert report['voxels'] == 24 * 20 * 20
+    assert all(value == 0 for key, value in report.items()
+               if key not in ('dtype', 'voxels'))
+
+    # uint16 data with a large intensity range, whose tensors exceed the
+    # range of the float32 eigen solution without scaling
+    for data in [fibers, fibers.astype(np.uint16) * 257]:
+        report = M5ST.st_precision_report(data, 1, 2, size=40)
+        assert report['dtype'] == 'float32'
+        errors = [report['%s_%s' % (name, stat)]
+                  for name in ('phi', 'theta', 'vector')
+                  for stat in ('max', 'mean', 'rms')]
+        assert np.all(np.isfinite(errors))
+        for name in ('phi', 'theta', 'vector'):
+            assert report[name + '_max'] < 0.1
+            assert report[name + '_rms'] < 1e-3
@@ -0,0 +1,59 @@
+import os
+
+import M6_ResultCache as M6RC
+
+
+def test_cache_key_reuses_digest(tmp_path):
+    data_file = tmp_path / 'A01.nii'
+    digest_file = str(tmp_path / 'digests.json')
+    data_file.write_bytes(b'a' * 1000)
+    params = {'sigma': 1.5}
+    key = M6RC.cache_key(str(data_file), params, digest_file)
+    assert key == M6RC.cache_key(str(data_file), params)
+    assert key != M6RC.cache_key(str(data_file), {'sigma': 2}, digest_file)
+
+    # The file is not read while its size and modification time match
+    stat = os.stat(data_file)
+    data_file.write_bytes(b'b' * 1000)
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert M6RC.cache_key(str(data_file), params, digest_file) == key
+
+    # and read again when they change
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    new_key = M6RC.cache_key(str(data_file), params, digest_file)
+    assert new_key != key
+    assert new_key == M6RC.cache_key(str(data_file), params)
+
+
+def test_cache_store_concurrent_key(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    result = tmp_path / 'A01_vec.npy'
+    result.write_bytes(b'v' * 100)
+    files = [str(result)]
+    os.makedirs(cache_dir)
+    # Partial copy of another run storing the same key
+    other_tmp = os.path.join(cache_dir, 'k.%d.tmp' % (os.getpid() + 1))
+    os.makedirs(other_tmp)
+
+    # An entry stored by the other run before the rename is kept
+    rename = os.rename
+
+    def rename_after_other(src, dst):
+        os.makedirs(dst)
+        (tmp_path / 'cache' / 'k' / result.name).write_bytes(b'v' * 100)
+        rename(src, dst)
+
+    monkeypatch.setattr(M6RC.os, 'rename', rename_after_other)
+    M6RC.cache_store(cache_dir, 'k', files)
+    monkeypatch.undo()
+    assert sorted(os.listdir(cache_dir)) == sorted(
+        ['k', os.path.basename(other_tmp)])
+
+    # Stores of an existing key succeed, and incomplete entries are replaced
+    M6RC.cache_store(cache_dir, 'k', files)
+    os.remove(os.path.join(cache_dir, 'k', result.name))
+    M6RC.cache_store(cache_dir, 'k', files, max_size=0)
+    assert os.path.isdir(other_tmp)
+    result.unlink()
+    assert M6RC.cache_load(cache_dir, 'k', files)
+    assert result.read_bytes() == b'v' * 100
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import M7_OrientTables as M7OT
+
+
+def integration_points(seed=0):
+    # Elements with uneven numbers of integration points, in random order
+    rng = np.random.default_rng(seed)
+    counts = {3: 27, 11: 1, 5: 8, 40: 4, 8: 27, 2: 3}
+    ele_ids = np.concatenate([[e] * n for e, n in counts.items()])
+    ip_ids = np.concatenate([rng.permutation(n) + 1 + (e % 3)
+                             for e, n in counts.items()])
+    order = rng.permutation(len(ele_ids))
+    tables = {'PHI': rng.normal(0, 0.1, len(ele_ids)),
+              'THETA': rng.normal(0, 1, len(ele_ids))}
+    tables['PHI'][:4] = [-0.0, 0.0, -1e-9, 123.4567895]
+    return (ele_ids[order], ip_ids[order],
+            {name: values[order] for name, values in tables.items()})
+
+
+def write_pandas_tables(file_prefix, ele_ids, ip_ids, tables):
+    # Writer of S3_mapping.py before write_fortran_tables
+    pd = pytest.importorskip('pandas')
+    df = pd.DataFrame({'ele_id': ele_ids, 'ip_id': ip_ids})
+    element_max_index = df['ele_id'].max()
+    ip_max_index = df['ip_id'].max()
+    for name, values in tables.items():
+        df[name] = values
+    for column in df.columns[2:]:
+        with open(f'{file_prefix}_{column}.f', 'w') as output:
+            output.write(f'      real*8 {column}0({ip_max_index},'
+                         f'{element_max_index})\n')
+            for ele_id, group in df.groupby('ele_id'):
+                ip_ids = group['ip_id']
+                line = (f'      DATA ({column}0(I,{ele_id}), '
+                        f'I={ip_ids.min()},{ip_ids.max()})/ ')
+                angles = [f'{angle:.6f}' for angle in group[column]]
+                for i in range(3, len(angles), 3):
+                    angles[i] = '\n     &  ' + angles[i]
+                line += ', '.join(angles)
+                output.write(line + '/\n')
+
+
+@pytest.mark.parametrize('chunk_size', [100000, 2])
+def test_fortran_tables_match_pandas_writer(tmp_path, chunk_size):
+    ele_ids, ip_ids, tables = integration_points()
+    write_pandas_tables(str(tmp_path / 'old'), ele_ids, ip_ids, tables)
+    M7OT.write_fortran_tables(str(tmp_path / 'new'), ele_ids, ip_ids, tables,
+                              chunk_size=chunk_size)
+    for name in tables:
+        old = (tmp_path / ('old_%s.f' % name)).read_bytes()
+        assert (tmp_path / ('new_%s.f' % name)).read_bytes() == old
+    assert b'-0.000000' in (tmp_path / 'new_PHI.f').read_bytes()
+
+
+def test_binary_table_round_trip(tmp_path):
+    ele_ids, ip_ids, tables = integration_points(1)
+    tables['EXTRA'] = np.arange(len(ele_ids), dtype=float)
+    file_name = str(tmp_path / 'ORIENT.bin')
+    M7OT.write_binary_table(file_name, ele_ids, ip_ids, tables)
+
+    # The table is sorted by element label and integration point number
+    order = np.lexsort((ip_ids, ele_ids))
+    read_ele, read_ip, read_tables = M7OT.read_binary_table(
+        file_name, names=('PHI', 'THETA', 'EXTRA'))
+    np.testing.assert_array_equal(read_ele, ele_ids[order])
+    np.testing.assert_array_equal(read_ip, ip_ids[order])
+    for name, values in tables.items():
+        np.testing.assert_array_equal(read_tables[name], values[order])
+        np.testing.assert_array_equal(np.signbit(read_tables[name]),
+                                      np.signbit(values[order]))
+    # Only the named tables are read
+    assert set(M7OT.read_binary_table(file_name)[2]) == {'PHI', 'THETA'}
@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+import pytest
+
+import M8_AbqReports as M8AR
+
+ROWS = np.arange(1, 37, dtype=float).reshape(12, 3) * [1, 0.5, -0.25]
+# Table with an end marker before the start marker and two after the rows
+LINES = (['END of nothing', 'START of table', 'X  Y  Z']
+         + ['%6d %12.4f %12.4E' % tuple(r) for r in ROWS]
+         + ['', 'END', 'more', 'END', 'tail'])
+
+
+def offset(i):
+    # Byte offset of line i of LINES
+    return sum(len(line) + 1 for line in LINES[:i])
+
+
+@pytest.fixture
+def table_file(tmp_path):
+    file_name = str(tmp_path / 'table.dat')
+    with open(file_name, 'w') as f:
+        f.write('\n'.join(LINES) + '\n')
+    return file_name
+
+
+@pytest.mark.parametrize('start_offset, end_offset, start, end', [
+    (2, 4, 3, 15), (0, 4, 1, 15), (2, 0, 3, 19), (3, 1, 4, 18)])
+def test_table_index_markers(table_file, start_offset, end_offset, start,
+                             end):
+    # The table starts start_offset lines after the first start marker and
+    # ends end_offset lines before the line after the last end marker
+    assert M8AR.abq_table_index(table_file, 'START', 'END', start_offset,
+                                end_offset) == (offset(start), offset(end))
+
+
+@pytest.mark.parametrize('chunk_size', [7, 16, 2**26])
+def test_rows_split_by_chunks(table_file, chunk_size):
+    table = M8AR.abq_table(table_file, 'START', 'END', 2, 4,
+                           chunk_size=chunk_size)
+    np.testing.assert_array_equal(table, ROWS)
+
+
+def test_index_reuse(table_file):
+    M8AR.abq_table(table_file, 'START', 'END', 2, 4)
+    index = M8AR._load_index(table_file, ['START', 'END', 2, 4])
+    assert index['start_byte'] == offset(3)
+    # The index is reused while the file and markers are unchanged
+    M8AR.abq_table(table_file, 'START', 'END', 2, 4)
+    assert M8AR._load_index(table_file, ['START', 'END', 2, 4]) == index
+    assert M8AR._load_index(table_file, ['START', 'END', 3, 4]) == {}
+    assert M8AR.abq_table_index(table_file, 'START', 'END', 3,
+                                4)[0] == offset(4)
+
+    # Changed files are indexed again
+    with open(table_file, 'w') as f:
+        f.write('\n'.join(['header'] + LINES) + '\n')
+    start, end = M8AR.abq_table_index(table_file, 'START', 'END', 2, 4)
+    assert (start, end) == (offset(3) + 7, offset(15) + 7)
+    np.testing.assert_array_equal(
+        M8AR.abq_table(table_file, 'START', 'END', 2, 4), ROWS)
+
+
+def test_read_only_directory(table_file, monkeypatch):
+    # The table is read without writing the index and the cache
+    def read_only(file_name, mode='r', *args, **kwargs):
+        if 'w' in mode:
+            raise PermissionError(13, 'Permission denied', file_name)
+        return open(file_name, mode, *args, **kwargs)
+
+    def save(*args, **kwargs):
+        raise PermissionError(13, 'Permission denied')
+
+    monkeypatch.setattr(M8AR, 'open', read_only, raising=False)
+    monkeypatch.setattr(M8AR.np, 'save', save)
+    for cache in [False, True]:
+        np.testing.assert_array_equal(
+            M8AR.abq_table(table_file, 'START', 'END', 2, 4, cache=cache),
+            ROWS)
+    assert not os.path.exists(table_file + '.idx')
+    assert not os.path.exists(table_file + '.npy')
+
+
+def test_parse_error_names_file(table_file):
+    with pytest.raises(ValueError, match=r'table\.dat between bytes'):
+        M8AR.abq_table(table_file, 'START', 'END', 1, 4)
+
+
+def test_cache(table_file):
+    table = M8AR.abq_table(table_file, 'START', 'END', 2, 4, cache=True)
+    assert not isinstance(table, np.memmap)
+    # Later reads memory-map the cache
+    cached = M8AR.abq_table(table_file, 'START', 'END', 2, 4, cache=True)
+    assert isinstance(cached, np.memmap) and not cached.flags.writeable
+    np.testing.assert_array_equal(cached, table)
+    del cached
+
+    # Rewritten files of the same size are parsed again
+    stat = os.stat(table_file)
+    with open(table_file, 'w') as f:
+        f.write('\n'.join(LINES).replace('     1 ', '     7 ') + '\n')
+    os.utime(table_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert os.stat(table_file).st_size == stat.st_size
+    rows = ROWS.copy()
+    rows[0, 0] = 7
+    table = M8AR.abq_table(table_file, 'START', 'END', 2, 4, cache=True)
+    assert not isinstance(table, np.memmap)
+    np.testing.assert_array_equal(table, rows)
+    np.testing.assert_array_equal(
+        M8AR.abq_table(table_file, 'START', 'END', 2, 4, cache=True), rows)
+
+    # Files of another size are parsed again
+    with open(table_file, 'a') as f:
+        f.write('appended\n')
+    table = M8AR.abq_table(table_file, 'START', 'END', 2, 4, cache=True)
+    assert not isinstance(table, np.memmap)
+    np.testing.assert_array_equal(table, rows)
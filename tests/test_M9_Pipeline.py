@@ -0,0 +1,48 @@
+import sys
+
+import numpy as np
+
+import M8_AbqReports as M8AR
+import M9_Pipeline as M9PL
+
+# Stand-in of S4_Cube_modified.py, which appends a field report of the stress
+# in the model file to the report, as writeFieldReport with append=ON
+STAND_IN = '''
+import sys
+stress = float(open(sys.argv[1]).read())
+with open(sys.argv[2], 'a') as f:
+    f.write('  Field Output reported at integration points for part: '
+            'PART-1-1\\n\\n')
+    f.write('    Element Label  Int Pt   S.S11   S.S22   S.S33   S.S12   '
+            'S.S13   S.S23\\n')
+    f.write('                      @Loc 1\\n')
+    f.write('-' * 80 + '\\n')
+    for ele in (1, 2):
+        for ip in (1, 2):
+            f.write('%d %d %g 0. 0. 0. 0. 0.\\n' % (ele, ip, stress))
+    f.write('\\n\\n  Minimum %g\\n\\n  Maximum %g\\n' % (stress, stress))
+'''
+
+
+def test_rerun_replaces_appended_report(tmp_path):
+    standin = tmp_path / 'standin_S4.py'
+    standin.write_text(STAND_IN)
+    model = tmp_path / 'A_CubeModel.inp'
+    report = tmp_path / 'Out-A_S_local.out'
+    state_dir = str(tmp_path / '.pipeline')
+
+    def stage():
+        return M9PL.Stage('A:S4', [sys.executable, str(standin), str(model),
+                                   str(report)],
+                          [str(model), str(standin)], [str(report)])
+
+    model.write_text('1.0')
+    assert M9PL.run_pipeline([stage()], state_dir) == ['A:S4']
+    model.write_text('2.0')
+    assert M9PL.run_pipeline([stage()], state_dir) == ['A:S4']
+    assert M9PL.run_pipeline([stage()], state_dir) == []
+
+    # The report holds the table of the last run only
+    assert report.read_text().count('Field Output reported') == 1
+    table = M8AR.abq_table(str(report), *M8AR.REPORT_IP_TABLE)
+    np.testing.assert_array_equal(table[:, 2], 2.0)
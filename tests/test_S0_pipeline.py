@@ -0,0 +1,29 @@
+import nibabel as nib
+import numpy as np
+
+import S0_pipeline as S0
+
+
+def _write_sample(tmp_path, shape, voxel_size=2.0):
+    (tmp_path / 'data').mkdir(exist_ok=True)
+    (tmp_path / 'code').mkdir(exist_ok=True)
+    affine = np.diag([voxel_size] * 3 + [1.0])
+    nib.save(nib.Nifti1Image(np.zeros(shape, np.uint8), affine),
+             str(tmp_path / 'data' / 'A.nii'))
+
+
+def test_stage_memory_scales_with_mesh(tmp_path, monkeypatch):
+    _write_sample(tmp_path, (200, 60, 60))
+    monkeypatch.chdir(tmp_path / 'code')
+    small = S0.stage_memory('A', 0)
+    _write_sample(tmp_path, (400, 120, 120))
+    large = S0.stage_memory('A', 0)
+    for name in ['S1', 'S2', 'S3', 'S5']:
+        assert 0 < small[name] < large[name]
+    # The Python stages are budgeted from the number of integration points
+    base, per_ip = S0.IP_MEMORY['S5']
+    n_ip = (large['S5'] - base) / per_ip
+    assert n_ip % 27 == 0 and n_ip > 27
+
+    monkeypatch.setattr(S0, 'IP_BOX', 9)
+    assert S0.stage_memory('A', 0)['S3'] > large['S3']
@@ -0,0 +1,157 @@
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import M13_InpMesh as M13IM
+
+CODE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code')
+# Model dimensions of the tomogram [micro meters], 6 x 3 x 2 elements
+TOMO_DIM = (420., 210., 140.)
+
+
+def read_keywords(file_name):
+    # Keyword lines of an input file as (name, options, data lines)
+    blocks = []
+    with open(file_name, 'rb') as f:
+        for line in f:
+            if line.startswith(b'**') or not line.strip():
+                continue
+            if line.startswith(b'*'):
+                name, options = M13IM._keyword(line.rstrip())
+                blocks.append((name, options, []))
+            else:
+                blocks[-1][2].append(line.decode('ascii').strip())
+    return blocks
+
+
+def set_labels(options, lines):
+    # Labels of an *Nset or *Elset block
+    values = [int(v) for v in ','.join(lines).split(',') if v.strip()]
+    if 'generate' in options:
+        return np.arange(values[0], values[1] + 1, values[2])
+    return np.array(values)
+
+
+@pytest.fixture(scope='module')
+def deck(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp('S2')
+    np.savetxt(str(tmp_path / 'A_TomoDim.txt'), TOMO_DIM)
+    env = dict(os.environ, XRCT_SAMPLE_NAME='A', PYTHONPATH=CODE)
+    subprocess.run([sys.executable, os.path.join(CODE, 'S2_CubeInp.py')],
+                   cwd=str(tmp_path), env=env, check=True)
+    return str(tmp_path / 'A_CubeModel.inp')
+
+
+def test_keywords(deck):
+    blocks = read_keywords(deck)
+    names = [name for name, _, _ in blocks
+             if name not in ('*nset', '*elset')]
+    assert names == [
+        '*heading', '*preprint', '*part', '*node', '*element',
+        '*orientation', '*solid section', '*end part', '*assembly',
+        '*instance', '*end instance', '*end assembly', '*material',
+        '*elastic', '*boundary', '*boundary', '*boundary', '*step',
+        '*static', '*boundary', '*restart', '*output', '*node output',
+        '*element output', '*output', '*node output', '*output',
+        '*node output', '*end step']
+    options = {name: opts for name, opts, _ in blocks}
+    assert options['*part'] == {'name': 'Part-1'}
+    assert options['*element'] == {'type': 'C3D20'}
+    assert options['*orientation'] == {'name': 'Ori-1', 'system': 'user'}
+    assert options['*solid section'] == {'elset': 'Cube',
+                                         'orientation': 'Ori-1',
+                                         'material': 'Material-1'}
+    assert options['*instance'] == {'name': 'Part-1-1', 'part': 'Part-1'}
+    assert options['*material'] == {'name': 'Material-1'}
+    assert options['*elastic'] == {'type': 'ENGINEERING CONSTANTS'}
+    assert options['*step'] == {'name': 'Step-1', 'nlgeom': 'NO'}
+
+    elastic = [lines for name, _, lines in blocks if name == '*elastic'][0]
+    constants = [v for v in ','.join(elastic).split(',') if v.strip()]
+    assert len(constants) == 9
+    # Fixed x0, xz0 and xy0 before the step, displaced x1 in the step
+    boundaries = [lines[0] for name, _, lines in blocks
+                  if name == '*boundary']
+    assert boundaries == ['Part-1-1.x0, 1, 1', 'Part-1-1.xz0, 3, 3',
+                          'Part-1-1.xy0, 2, 2', 'Part-1-1.x1, 1, 1, 0.01']
+    # Field output of all nodes and elements, and of the nodes of x1
+    outputs = [block for block in blocks
+               if block[0] in ('*output', '*node output', '*element output')]
+    assert outputs == [
+        ('*output', {'field': ''}, []),
+        ('*node output', {}, ['U,']),
+        ('*element output', {'directions': 'YES'}, ['S,']),
+        ('*output', {'field': ''}, []),
+        ('*node output', {'nset': 'Part-1-1.x1'}, ['RF, U']),
+        ('*output', {'history': ''}, []),
+        ('*node output', {'nset': 'Part-1-1.x1'}, ['RF1, U1'])]
+
+
+def test_sets(deck):
+    node_ids, node_coords, elements = M13IM.read_inp_part(deck)
+    ele_ids, _ = elements['C3D20']
+    assert len(ele_ids) == 6 * 3 * 2
+    sets = {}
+    for name, options, lines in read_keywords(deck):
+        if name in ('*nset', '*elset'):
+            sets[name, options[name[1:]]] = set_labels(options, lines)
+
+    # Node sets of the faces and edges of AbqCubeSet in the part system
+    L, T, W = np.array(TOMO_DIM) * 1e-3
+    x, y, z = node_coords.T
+    faces = {'x0': np.isclose(x, -L / 2), 'x1': np.isclose(x, L / 2),
+             'y0': np.isclose(y, -T / 2), 'y1': np.isclose(y, T / 2),
+             'z0': np.isclose(z, 0), 'z1': np.isclose(z, W)}
+    expected = dict(faces, xz0=faces['x0'] & faces['z1'],
+                    xy0=faces['x0'] & faces['y0'],
+                    xyz0=faces['x0'] & faces['y0'] & faces['z0'],
+                    corner_node=faces['x1'] & faces['y1'] & faces['z1'])
+    for name, inside in expected.items():
+        np.testing.assert_array_equal(np.sort(sets['*nset', name]),
+                                      np.sort(node_ids[inside]), name)
+    np.testing.assert_array_equal(sets['*elset', 'Cube'], np.sort(ele_ids))
+
+    # Sets referenced by the section, boundary conditions and outputs exist
+    for name, options, lines in read_keywords(deck):
+        if 'elset' in options and name != '*elset':
+            assert ('*elset', options['elset']) in sets
+        if 'nset' in options and name != '*nset':
+            instance, _, nset = options['nset'].partition('.')
+            assert instance == 'Part-1-1' and ('*nset', nset) in sets
+        if name == '*boundary':
+            instance, _, nset = lines[0].split(',')[0].partition('.')
+            assert instance == 'Part-1-1' and ('*nset', nset) in sets
+
+
+def test_odb_names(deck):
+    # Names of the instance, node set, step and output request looked up by
+    # S4_Cube_modified.py and M15_OdbHistory.py. Abaqus upper-cases the
+    # instance and set names of input files in the output database.
+    with open(os.path.join(CODE, 'S4_Cube_modified.py')) as f:
+        s4 = f.read()
+    instance, nset = re.search(
+        r"instances\['([^']+)'\]\.nodeSets\['([^']+)'\]", s4).groups()
+    step = re.search(r"odbObj\.steps\['([^']+)'\]", s4).group(1)
+    request = re.search(r"fieldOutputRequests\['([^']+)'\]", s4).group(1)
+    assert (instance, nset, step, request) == ('PART-1-1', 'X1', 'Step-1',
+                                               'F-Output-1')
+
+    with open(deck) as f:
+        text = f.read()
+    blocks = read_keywords(deck)
+    instances = [opts['name'] for name, opts, _ in blocks
+                 if name == '*instance']
+    nsets = [opts['nset'] for name, opts, _ in blocks if name == '*nset']
+    steps = [opts['name'] for name, opts, _ in blocks if name == '*step']
+    assert [name.upper() for name in instances] == [instance]
+    assert nset in [name.upper() for name in nsets]
+    assert steps == [step]
+    # Output requests are named in comments as in input files of Abaqus/CAE
+    assert '** FIELD OUTPUT: %s\n' % request in text
+    # The node output of x1 by F-Output-2 is read by node_set_histories
+    x1 = [name for name in nsets if name.upper() == nset][0]
+    assert '*Node Output, nset=%s.%s\nRF, U\n' % (instances[0], x1) in text